@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Approximate nearest-neighbour index for the Spotify MCP Server
+An inverted-file (IVF) index in pure NumPy: vectors are clustered with
+k-means and stored grouped by cluster, and a query scans only the ``nprobe``
+clusters closest to it. Raising ``nprobe`` trades latency for recall.
+"""
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+
+def _squared_distances(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    diff = vectors - query
+    return np.einsum('ij,ij->i', diff, diff)
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 16384) -> np.ndarray:
+    """Index of the closest centroid for each vector, in batches to bound memory"""
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2; ||x||^2 does not change the argmin
+        scores = centroid_norms - 2.0 * (batch @ centroids.T)
+        assignments[start:start + batch_size] = np.argmin(scores, axis=1)
+    return assignments
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10,
+           sample_size: Optional[int] = None, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means on a random sample (64 points per cluster by default); returns float32 centroids"""
+    rng = np.random.default_rng(seed)
+    sample_size = sample_size or 64 * n_clusters
+    if len(vectors) > sample_size:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _nearest_centroids(vectors, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.stack([
+            np.bincount(assignments, weights=vectors[:, dim], minlength=n_clusters)
+            for dim in range(vectors.shape[1])
+        ], axis=1).astype(np.float32)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters with random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over float32 vectors with integer ids
+
+    Vectors live in one array sorted by cluster, with ``offsets[c]`` to
+    ``offsets[c + 1]`` holding cluster ``c``. Inserted vectors go to a small
+    unsorted buffer that is scanned exhaustively and merged into the sorted
+    layout once it exceeds ``merge_threshold``, so inserts stay cheap.
+    Saved indexes are directories of ``.npy`` files that load memory-mapped.
+    """
+
+    def __init__(self, centroids: np.ndarray, nprobe: int = 8, merge_threshold: int = 50000):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        self.merge_threshold = merge_threshold
+        self.metadata: Dict[str, Any] = {}
+        dim = self.centroids.shape[1]
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+        self._pending_vectors = np.empty((0, dim), dtype=np.float32)
+        self._pending_ids = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self._pending_ids)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @staticmethod
+    def default_n_lists(n_vectors: int) -> int:
+        """About sqrt(n) clusters, balancing centroid and list scanning at query time"""
+        return int(min(max(1, np.sqrt(n_vectors)), 4096))
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, ids: Optional[np.ndarray] = None, n_lists: Optional[int] = None,
+              nprobe: int = 8, seed: int = 0) -> "IVFIndex":
+        """Train centroids on ``vectors`` and add them (ids default to row numbers)"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        centroids = kmeans(vectors, n_lists or cls.default_n_lists(len(vectors)), seed=seed)
+        index = cls(centroids, nprobe=nprobe)
+        index.add(vectors, np.arange(len(vectors)) if ids is None else ids)
+        index.merge_pending()
+        return index
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        """Insert vectors; they are searchable immediately"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(vectors) != len(ids):
+            raise ValueError("vectors and ids must have the same length")
+        self._pending_vectors = np.concatenate([self._pending_vectors, vectors])
+        self._pending_ids = np.concatenate([self._pending_ids, ids])
+        if len(self._pending_ids) > self.merge_threshold:
+            self.merge_pending()
+
+    def merge_pending(self) -> None:
+        """Move buffered inserts into the cluster-sorted layout"""
+        if not len(self._pending_ids):
+            return
+        assignments = np.concatenate([
+            np.repeat(np.arange(self.n_lists, dtype=np.int32), np.diff(self.offsets)),
+            _nearest_centroids(self._pending_vectors, self.centroids)
+        ])
+        order = np.argsort(assignments, kind='stable')
+        self.vectors = np.ascontiguousarray(np.concatenate([self.vectors, self._pending_vectors])[order])
+        self.ids = np.concatenate([self.ids, self._pending_ids])[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=self.n_lists))])
+        self._pending_vectors = self._pending_vectors[:0]
+        self._pending_ids = self._pending_ids[:0]
+
+    def search(self, query: np.ndarray, k: int = 10,
+               nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and Euclidean distances of (approximately) the ``k`` nearest vectors, nearest first"""
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        centroid_distances = _squared_distances(self.centroids, query)
+        probe = np.argpartition(centroid_distances, nprobe - 1)[:nprobe]
+        starts, ends = self.offsets[probe], self.offsets[probe + 1]
+        sizes = ends - starts
+        rows = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+
+        candidates = self.vectors[rows]
+        candidate_ids = self.ids[rows]
+        if len(self._pending_ids):
+            candidates = np.concatenate([candidates, self._pending_vectors])
+            candidate_ids = np.concatenate([candidate_ids, self._pending_ids])
+
+        distances = _squared_distances(candidates, query)
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind='stable')]
+        return candidate_ids[top], np.sqrt(np.maximum(distances[top], 0))
+
+    def save(self, path: str) -> None:
+        """Write the index as a directory of .npy files (replacing any previous one)"""
+        self.merge_pending()
+        target = Path(path)
+        tmp = target.with_name(target.name + f'.{os.getpid()}.tmp')
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        np.save(tmp / 'centroids.npy', self.centroids)
+        np.save(tmp / 'vectors.npy', self.vectors)
+        np.save(tmp / 'ids.npy', self.ids)
+        np.save(tmp / 'offsets.npy', self.offsets)
+        with open(tmp / 'meta.json', 'w') as f:
+            json.dump({'version': INDEX_FORMAT_VERSION, 'nprobe': self.nprobe, **self.metadata}, f)
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+        logger.info(f"Saved IVF index ({len(self)} vectors, {self.n_lists} lists) to {target}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IVFIndex":
+        """Load a saved index; vectors and ids are memory-mapped unless ``mmap`` is False"""
+        source = Path(path)
+        with open(source / 'meta.json') as f:
+            metadata = json.load(f)
+        if metadata.pop('version', None) != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format in {source}")
+        mode = 'r' if mmap else None
+        index = cls(np.load(source / 'centroids.npy'), nprobe=metadata.pop('nprobe', 8))
+        index.vectors = np.load(source / 'vectors.npy', mmap_mode=mode)
+        index.ids = np.load(source / 'ids.npy', mmap_mode=mode)
+        index.offsets = np.load(source / 'offsets.npy')
+        index.metadata = metadata
+        return index
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Spotify MCP Server
+Measures module import time and time-to-first-response (process launch until
+the first JSON-RPC health_check reply) so cold-start regressions get caught
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent
+SERVER_SCRIPT = SERVER_DIR / "spotify_server.py"
+HEAVY_MODULES = ["pandas", "numpy", "aiohttp"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import spotify_server
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "import_ms": elapsed * 1000,
+    "heavy_modules_loaded": [m for m in %r if m in sys.modules]
+}))
+""" % (HEAVY_MODULES,)
+
+
+def _server_env() -> dict:
+    """Run the server in mock mode so no network access is involved"""
+    env = dict(os.environ)
+    env.pop("SPOTIFY_CLIENT_ID", None)
+    env.pop("SPOTIFY_CLIENT_SECRET", None)
+    return env
+
+
+def measure_import() -> dict:
+    """Import spotify_server in a fresh interpreter and report the time taken"""
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=SERVER_DIR, env=_server_env(),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_first_response() -> float:
+    """Launch the server on stdio and time the first health_check reply (ms)"""
+    request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "health_check"}) + "\n"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT)],
+        cwd=SERVER_DIR, env=_server_env(),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True
+    )
+    try:
+        process.stdin.write(request)
+        process.stdin.flush()
+        response = json.loads(process.stdout.readline())
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.get("id") != 1 or "result" not in response:
+            raise RuntimeError(f"Unexpected response: {response}")
+        return elapsed
+    finally:
+        process.stdin.close()
+        process.wait(timeout=10)
+
+
+def run_benchmark(runs: int) -> dict:
+    """Run the import and first-response measurements ``runs`` times each"""
+    imports = [measure_import() for _ in range(runs)]
+    first_responses = [measure_first_response() for _ in range(runs)]
+    import_times = [probe["import_ms"] for probe in imports]
+
+    heavy_loaded = sorted({m for probe in imports for m in probe["heavy_modules_loaded"]})
+
+    return {
+        "benchmark": "mcp_server_startup",
+        "generated_at": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "import_ms": {
+            "median": round(statistics.median(import_times), 2),
+            "min": round(min(import_times), 2),
+            "max": round(max(import_times), 2)
+        },
+        "time_to_first_response_ms": {
+            "median": round(statistics.median(first_responses), 2),
+            "min": round(min(first_responses), 2),
+            "max": round(max(first_responses), 2)
+        },
+        "heavy_modules_loaded_at_import": heavy_loaded
+    }
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Benchmark Spotify MCP server cold start')
+    parser.add_argument('--runs', '-n', type=int, default=5,
+                       help='Number of measurements per metric (default: 5)')
+    parser.add_argument('--output', '-o',
+                       help='Write the results as JSON to this file')
+    parser.add_argument('--max-import-ms', type=float,
+                       help='Fail if the median import time exceeds this budget')
+    parser.add_argument('--max-first-response-ms', type=float,
+                       help='Fail if the median time-to-first-response exceeds this budget')
+
+    args = parser.parse_args()
+
+    results = run_benchmark(args.runs)
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if results["heavy_modules_loaded_at_import"]:
+        failures.append(f"heavy modules imported eagerly: {', '.join(results['heavy_modules_loaded_at_import'])}")
+    if args.max_import_ms and results["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"import time {results['import_ms']['median']} ms > {args.max_import_ms} ms")
+    if args.max_first_response_ms and results["time_to_first_response_ms"]["median"] > args.max_first_response_ms:
+        failures.append(
+            f"time to first response {results['time_to_first_response_ms']['median']} ms "
+            f"> {args.max_first_response_ms} ms"
+        )
+
+    for failure in failures:
+        print(f"❌ Startup regression: {failure}", file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Precomputed recommendation candidates for the Spotify MCP Server
+Keeps the collaborative model's top-N tracks for every user in
+user_features.csv in a compact on-disk store (int32 track columns and
+float32 scores, memory-mapped), so a request for a known user is a dict
+lookup and a row slice. Refreshes only recompute users whose interactions
+changed, unless the model itself was retrained.
+"""
+
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from collaborative_filtering import CSRMatrix, ImplicitALS, TRACK_COLUMN, USER_COLUMN, WEIGHT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT_VERSION = 1
+CANDIDATE_COUNT = int(os.getenv('CANDIDATE_COUNT', '100'))
+
+# user_features.csv comes from a MongoDB $group, so the user is in _id
+USER_FEATURE_COLUMNS = ('_id', 'user_id', 'username')
+
+
+def read_users(path: str) -> List[str]:
+    """User ids listed in user_features.csv"""
+    header = pd.read_csv(path, nrows=0).columns
+    column = next((name for name in USER_FEATURE_COLUMNS if name in header), None)
+    if column is None:
+        raise ValueError(f"No user column ({', '.join(USER_FEATURE_COLUMNS)}) in {path}")
+    return pd.read_csv(path, usecols=[column])[column].dropna().astype(str).unique().tolist()
+
+
+def read_interactions(path: str) -> pd.DataFrame:
+    """The user, track and weight columns of user_track_interactions.csv"""
+    header = pd.read_csv(path, nrows=0).columns
+    weight = next((name for name in WEIGHT_COLUMNS if name in header), None)
+    if weight is None:
+        raise ValueError(f"No weight column ({', '.join(WEIGHT_COLUMNS)}) in {path}")
+    frame = pd.read_csv(path, usecols=[USER_COLUMN, TRACK_COLUMN, weight])
+    return frame.rename(columns={weight: 'weight'}).dropna(subset=[USER_COLUMN, TRACK_COLUMN])
+
+
+def interaction_digests(interactions: pd.DataFrame) -> Dict[str, int]:
+    """Order-independent 64-bit digest of each user's interactions"""
+    if interactions.empty:
+        return {}
+    hashes = pd.util.hash_pandas_object(interactions[[USER_COLUMN, TRACK_COLUMN, 'weight']], index=False).to_numpy()
+    codes, users = pd.factorize(interactions[USER_COLUMN].astype(str))
+    order = np.argsort(codes, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    # uint64 addition wraps, which is what we want for a digest
+    sums = np.add.reduceat(hashes[order], starts)
+    return dict(zip(users[codes[order][starts]].tolist(), sums.tolist()))
+
+
+class CandidateStore:
+    """Top-N candidate tracks and scores per user
+
+    ``candidates[i]`` holds columns into ``tracks`` for ``users[i]``, best
+    first and padded with -1; ``digests[i]`` identifies the interactions they
+    were computed from and ``model`` the model that scored them.
+    """
+
+    def __init__(self, users: Sequence[str], tracks: Sequence[str], candidates: np.ndarray,
+                 scores: np.ndarray, digests: np.ndarray, model: str = ''):
+        self.users = np.asarray(users, dtype=str)
+        self.tracks = np.asarray(tracks, dtype=str)
+        self.candidates = candidates
+        self.scores = scores
+        self.digests = np.asarray(digests, dtype=np.uint64)
+        self.model = model
+        self._user_index = {user: i for i, user in enumerate(self.users.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._user_index
+
+    @property
+    def depth(self) -> int:
+        return self.candidates.shape[1] if self.candidates.ndim == 2 else 0
+
+    def lookup(self, user_id: str, k: Optional[int] = None) -> Optional[Tuple[List[str], List[float]]]:
+        """Up to ``k`` candidate track URIs and scores for ``user_id``, or None if not stored"""
+        row = self._user_index.get(user_id)
+        if row is None:
+            return None
+        columns = np.asarray(self.candidates[row, :k])
+        scores = np.asarray(self.scores[row, :k])
+        keep = columns >= 0
+        return self.tracks[columns[keep]].tolist(), scores[keep].tolist()
+
+    @classmethod
+    def empty(cls, depth: int = CANDIDATE_COUNT) -> "CandidateStore":
+        return cls([], [], np.empty((0, depth), dtype=np.int32), np.empty((0, depth), dtype=np.float32),
+                   np.empty(0, dtype=np.uint64))
+
+    def refresh(self, model: ImplicitALS, users: Sequence[str], interactions: Optional[pd.DataFrame] = None,
+                model_id: str = '', depth: Optional[int] = None) -> "CandidateStore":
+        """A store for ``users`` that reuses every row still valid here
+
+        Rows are recomputed for users that are new, whose interactions
+        digest changed, or all of them when ``model_id`` or ``depth``
+        differ. User vectors are folded in from ``interactions`` when given
+        (so new plays count without retraining), otherwise taken from the
+        model; users known to neither are left out.
+        """
+        depth = depth or self.depth or CANDIDATE_COUNT
+        users = list(dict.fromkeys(str(user) for user in users))
+        digests = interaction_digests(interactions) if interactions is not None else {}
+        reusable = model_id == self.model and depth == self.depth
+
+        stale: List[str] = []
+        for user in users:
+            row = self._user_index.get(user)
+            if not reusable or row is None or int(self.digests[row]) != digests.get(user, 0):
+                stale.append(user)
+
+        vectors, exclude, scored = self._user_vectors(model, stale, interactions)
+        rows, scores = model.recommend_rows(vectors, exclude, depth) if scored else (
+            np.empty((0, depth), dtype=np.int32), np.empty((0, depth), dtype=np.float32))
+        if rows.shape[1] < depth:
+            rows = np.pad(rows, ((0, 0), (0, depth - rows.shape[1])), constant_values=-1)
+            scores = np.pad(scores, ((0, 0), (0, depth - scores.shape[1])), constant_values=np.nan)
+
+        # Keep reusable rows, then the fresh ones; remap both onto one compact track list
+        stale_users = set(stale)
+        kept = [user for user in users if user not in stale_users] if reusable else []
+        kept_rows = np.array([self._user_index[user] for user in kept], dtype=np.intp)
+        kept_columns = np.asarray(self.candidates[kept_rows]) if len(kept) else np.empty((0, depth), dtype=np.int32)
+        tracks = self.tracks if len(self.tracks) else np.empty(1, dtype=str)
+        uris = np.concatenate([tracks[kept_columns.clip(0)], np.asarray(model.tracks)[rows.clip(0)]])
+        valid = np.concatenate([kept_columns >= 0, rows >= 0])
+        codes, unique_tracks = pd.factorize(uris[valid])
+        candidates = np.full(valid.shape, -1, dtype=np.int32)
+        candidates[valid] = codes
+
+        all_users = kept + scored
+        store = CandidateStore(
+            all_users, np.asarray(unique_tracks, dtype=str), candidates,
+            np.concatenate([np.asarray(self.scores[kept_rows]).reshape(-1, depth), scores]).astype(np.float32),
+            np.array([digests.get(user, 0) for user in all_users], dtype=np.uint64),
+            model_id
+        )
+        logger.info(f"Candidate store refreshed: {len(scored)} users recomputed, {len(kept)} reused")
+        return store
+
+    @staticmethod
+    def _user_vectors(model: ImplicitALS, users: List[str], interactions: Optional[pd.DataFrame]
+                      ) -> Tuple[np.ndarray, Optional[CSRMatrix], List[str]]:
+        """Factors, played-track exclusions and ids of the ``users`` the model can score"""
+        if interactions is not None:
+            frame = interactions[interactions[USER_COLUMN].astype(str).isin(set(users))]
+            columns = pd.Series(np.arange(len(model.tracks)), index=model.tracks)
+            track_columns = frame[TRACK_COLUMN].astype(str).map(columns)
+            keep = (track_columns.notna() & (frame['weight'] > 0)).to_numpy()
+            frame, track_columns = frame[keep], track_columns[keep]
+            user_codes, scored = pd.factorize(frame[USER_COLUMN].astype(str), sort=True)
+            matrix = CSRMatrix.from_coo(user_codes, track_columns.to_numpy(dtype=np.int64),
+                                        frame['weight'].to_numpy(), (len(scored), len(model.tracks)))
+            return model.fold_in_rows(matrix), matrix, scored.tolist()
+
+        scored = [user for user in users if model.has_user(user)]
+        rows = np.array([model.user_row(user) for user in scored], dtype=np.intp)
+        vectors = np.asarray(model.user_factors)[rows]
+        exclude = None
+        if model.user_items is not None and len(rows):
+            counts = np.diff(model.user_items.indptr)[rows]
+            indices = np.concatenate([model.user_items.row(row)[0] for row in rows])
+            exclude = CSRMatrix(np.r_[0, np.cumsum(counts)], indices, np.ones(len(indices)),
+                                (len(rows), len(model.tracks)))
+        return vectors, exclude, scored
+
+    def save(self, path: str) -> None:
+        """Write the store as a directory of .npy files (replacing any previous one)"""
+        target = Path(path)
+        tmp = target.with_name(target.name + f'.{os.getpid()}.tmp')
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        np.save(tmp / 'users.npy', self.users)
+        np.save(tmp / 'tracks.npy', self.tracks)
+        np.save(tmp / 'candidates.npy', np.asarray(self.candidates))
+        np.save(tmp / 'scores.npy', np.asarray(self.scores))
+        np.save(tmp / 'digests.npy', self.digests)
+        with open(tmp / 'meta.json', 'w') as f:
+            json.dump({'version': STORE_FORMAT_VERSION, 'model': self.model}, f)
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+        logger.info(f"Saved candidates for {len(self)} users to {target}")
+
+    @classmethod
+    def load(cls, path: str) -> "CandidateStore":
+        """Load a saved store; candidate and score matrices are memory-mapped"""
+        source = Path(path)
+        with open(source / 'meta.json') as f:
+            metadata = json.load(f)
+        if metadata.get('version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported candidate store format in {source}")
+        return cls(np.load(source / 'users.npy'), np.load(source / 'tracks.npy'),
+                   np.load(source / 'candidates.npy', mmap_mode='r'), np.load(source / 'scores.npy', mmap_mode='r'),
+                   np.load(source / 'digests.npy'), metadata.get('model', ''))
+
+
+def model_id(path: str, mtime_ns: Optional[int] = None) -> str:
+    """Identifier of the saved model at ``path`` (its resolved path and meta.json mtime)
+
+    Resolving the path keeps the id the same however the directory is spelled,
+    so the server and scripts/precompute_recommendations.py agree on it.
+    """
+    if mtime_ns is None:
+        mtime_ns = os.stat(os.path.join(path, 'meta.json')).st_mtime_ns
+    return f"{os.path.realpath(path)}:{mtime_ns}"
+
+
+def refresh_store(path: str, model: ImplicitALS, users_path: str, interactions_path: Optional[str] = None,
+                  model_id: str = '', depth: int = CANDIDATE_COUNT) -> CandidateStore:
+    """Load the store at ``path`` (if any), refresh it against the current data and save it"""
+    try:
+        store = CandidateStore.load(path) if os.path.isdir(path) else CandidateStore.empty(depth)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Rebuilding unreadable candidate store {path}: {e}")
+        store = CandidateStore.empty(depth)
+    interactions = read_interactions(interactions_path) if interactions_path and os.path.exists(interactions_path) else None
+    refreshed = store.refresh(model, read_users(users_path), interactions, model_id, depth)
+    refreshed.save(path)
+    return CandidateStore.load(path)
+
+
+def default_dataset_path(name: str) -> str:
+    """``name`` under ML_DATASETS_DIR, by default the repository's ml_datasets directory"""
+    root = os.getenv('ML_DATASETS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml_datasets')
+    return os.path.normpath(os.path.join(root, name))
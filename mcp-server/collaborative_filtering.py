@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Collaborative-filtering model for the Spotify MCP Server
+Implicit-feedback matrix factorization (Hu, Koren & Volinsky ALS) trained
+on the user-track interactions exported by scripts/prepare_ml_datasets.py.
+The interaction matrix is held in NumPy CSR arrays, each ALS half-step
+solves its users (or tracks) in batched, multi-threaded linear solves, and
+saved factors load memory-mapped.
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MODEL_FORMAT_VERSION = 1
+
+# Interaction columns written by MLDatasetPreparator.extract_interaction_matrix
+USER_COLUMN = 'user_id'
+TRACK_COLUMN = 'track_uri'
+WEIGHT_COLUMNS = ('engagement_score', 'play_count')
+
+
+class CSRMatrix:
+    """Minimal compressed sparse row matrix: ``indptr``, ``indices`` and ``data`` arrays"""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, shape: Tuple[int, int]):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float32)
+        self.shape = shape
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def from_coo(cls, rows: np.ndarray, cols: np.ndarray, values: np.ndarray,
+                 shape: Tuple[int, int]) -> "CSRMatrix":
+        """Build from coordinate triples; duplicate (row, col) entries are summed"""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        keys, inverse = np.unique(rows * shape[1] + cols, return_inverse=True)
+        data = np.bincount(inverse, weights=values, minlength=len(keys))
+        rows, cols = np.divmod(keys, shape[1])
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=shape[0]))])
+        return cls(indptr, cols, data, shape)
+
+    def transpose(self) -> "CSRMatrix":
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(self.indices, minlength=self.shape[1]))])
+        return CSRMatrix(indptr, rows[order], self.data[order], (self.shape[1], self.shape[0]))
+
+    def row(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Column indices and values of row ``i``"""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+
+def interaction_matrix(interactions: pd.DataFrame, weight_column: Optional[str] = None
+                       ) -> Tuple[CSRMatrix, np.ndarray, np.ndarray]:
+    """User x track CSR matrix of interaction weights, with the user ids and track URIs of its rows and columns
+
+    The weight defaults to ``engagement_score`` (play count scaled by
+    completion rate), falling back to ``play_count``.
+    """
+    if weight_column is None:
+        weight_column = next((column for column in WEIGHT_COLUMNS if column in interactions.columns), None)
+    if weight_column is None or USER_COLUMN not in interactions or TRACK_COLUMN not in interactions:
+        raise ValueError(f"Interactions need {USER_COLUMN}, {TRACK_COLUMN} and one of {WEIGHT_COLUMNS}")
+
+    frame = interactions[[USER_COLUMN, TRACK_COLUMN, weight_column]].dropna(subset=[USER_COLUMN, TRACK_COLUMN])
+    weights = pd.to_numeric(frame[weight_column], errors='coerce').fillna(0).to_numpy()
+    user_codes, users = pd.factorize(frame[USER_COLUMN].astype(str), sort=True)
+    track_codes, tracks = pd.factorize(frame[TRACK_COLUMN].astype(str), sort=True)
+    keep = weights > 0
+    matrix = CSRMatrix.from_coo(user_codes[keep], track_codes[keep], weights[keep], (len(users), len(tracks)))
+    return matrix, np.asarray(users, dtype=str), np.asarray(tracks, dtype=str)
+
+
+def _row_batches(counts: np.ndarray, max_entries: int) -> List[np.ndarray]:
+    """Group rows of similar length so that each group's padded size stays near ``max_entries``"""
+    order = np.argsort(counts, kind='stable')
+    sorted_counts = counts[order]
+    batches = []
+    start = 0
+    while start < len(order):
+        # Rows are sorted by length, so a group's padded width is its last row's count
+        widths = np.maximum(sorted_counts[start:], 1)
+        sizes = widths * np.arange(1, len(widths) + 1)
+        end = start + max(1, int(np.searchsorted(sizes, max_entries, side='right')))
+        batches.append(order[start:end])
+        start = end
+    return batches
+
+
+def _solve_rows(matrix: CSRMatrix, fixed: np.ndarray, gram: np.ndarray, alpha: float, rows: np.ndarray,
+                initial: Optional[np.ndarray] = None, cg_steps: Optional[int] = None) -> np.ndarray:
+    """Least-squares factors for ``rows`` given the other side's factors
+
+    Row ``u`` solves ``(YtY + Yu^T (Cu - I) Yu + lambda I) x = Yu^T Cu p``
+    with confidence ``c = 1 + alpha * r`` and preference 1 on observed
+    entries. The rows' entries are padded to a common length so each step
+    is a batched matmul. With ``cg_steps`` the systems are refined from
+    ``initial`` by that many conjugate-gradient steps, which never forms
+    the k x k matrices; otherwise they are built and solved exactly.
+    """
+    starts = matrix.indptr[rows]
+    counts = matrix.indptr[rows + 1] - starts
+    width = int(counts.max()) if len(counts) else 0
+    valid = np.arange(width) < counts[:, None]
+    positions = np.where(valid, starts[:, None] + np.arange(width), 0)
+    factors = np.asarray(fixed)[matrix.indices[positions]].astype(np.float64)
+    weights = np.where(valid, alpha * matrix.data[positions], 0.0)
+    rhs = np.matmul(((1.0 + weights) * valid)[:, None, :], factors)[:, 0]
+
+    if cg_steps is None or initial is None:
+        lhs = gram + np.matmul(factors.transpose(0, 2, 1) * weights[:, None, :], factors)
+        return np.linalg.solve(lhs, rhs[..., None])[..., 0]
+
+    def product(x: np.ndarray) -> np.ndarray:
+        projected = np.matmul(factors, x[..., None])[..., 0]
+        return x @ gram + np.matmul((weights * projected)[:, None, :], factors)[:, 0]
+
+    x = initial.astype(np.float64)
+    residual = rhs - product(x)
+    direction = residual.copy()
+    norm = np.einsum('bk,bk->b', residual, residual)
+    for _ in range(cg_steps):
+        if not norm.any():
+            break
+        step_product = product(direction)
+        curvature = np.einsum('bk,bk->b', direction, step_product)
+        step = np.divide(norm, curvature, out=np.zeros_like(norm), where=curvature > 0)
+        x += step[:, None] * direction
+        residual -= step[:, None] * step_product
+        new_norm = np.einsum('bk,bk->b', residual, residual)
+        ratio = np.divide(new_norm, norm, out=np.zeros_like(norm), where=norm > 0)
+        direction = residual + ratio[:, None] * direction
+        norm = new_norm
+    return x
+
+
+class ImplicitALS:
+    """Implicit-feedback ALS over a user x track matrix of interaction weights
+
+    Each half-step warm-starts from the previous factors and takes
+    ``cg_steps`` conjugate-gradient steps (``None`` solves exactly).
+    Scores are predicted preferences: about 1.0 for tracks the user is
+    expected to like and near 0.0 otherwise. Factors are float32; a saved
+    model is a directory of ``.npy`` files that load memory-mapped.
+    """
+
+    def __init__(self, factors: int = 64, regularization: float = 0.05, alpha: float = 10.0,
+                 iterations: int = 15, cg_steps: Optional[int] = 3, workers: Optional[int] = None,
+                 seed: int = 0):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.seed = seed
+        self.user_factors = np.empty((0, factors), dtype=np.float32)
+        self.item_factors = np.empty((0, factors), dtype=np.float32)
+        self.users = np.empty(0, dtype=str)
+        self.tracks = np.empty(0, dtype=str)
+        self.user_items: Optional[CSRMatrix] = None
+        self._user_index: Dict[str, int] = {}
+        self._track_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def _half_step(self, matrix: CSRMatrix, fixed: np.ndarray, current: np.ndarray,
+                   executor: concurrent.futures.Executor) -> np.ndarray:
+        gram = (fixed.T.astype(np.float64) @ fixed) + self.regularization * np.eye(self.factors)
+        # Keep each batch's padded factor block to roughly 32 MB
+        batches = _row_batches(np.diff(matrix.indptr), max(1, (1 << 22) // self.factors))
+        solved = np.empty((matrix.shape[0], self.factors), dtype=np.float32)
+        futures = [executor.submit(_solve_rows, matrix, fixed, gram, self.alpha, rows,
+                                   current[rows], self.cg_steps)
+                   for rows in batches]
+        for future, rows in zip(futures, batches):
+            solved[rows] = future.result()
+        return solved
+
+    def fit(self, matrix: CSRMatrix, users: Sequence[str], tracks: Sequence[str]) -> "ImplicitALS":
+        """Train on a user x track matrix whose rows and columns are ``users`` and ``tracks``"""
+        rng = np.random.default_rng(self.seed)
+        scale = 0.01
+        user_factors = rng.normal(0, scale, (matrix.shape[0], self.factors)).astype(np.float32)
+        item_factors = rng.normal(0, scale, (matrix.shape[1], self.factors)).astype(np.float32)
+        item_users = matrix.transpose()
+
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            for iteration in range(self.iterations):
+                user_factors = self._half_step(matrix, item_factors, user_factors, executor)
+                item_factors = self._half_step(item_users, user_factors, item_factors, executor)
+                logger.debug(f"ALS iteration {iteration + 1}/{self.iterations} done")
+
+        self.user_factors, self.item_factors = user_factors, item_factors
+        self.user_items = matrix
+        self._set_ids(users, tracks)
+        logger.info(f"Trained ALS on {matrix.shape[0]} users x {matrix.shape[1]} tracks "
+                    f"({matrix.nnz} interactions)")
+        return self
+
+    @classmethod
+    def from_interactions(cls, interactions: pd.DataFrame, weight_column: Optional[str] = None,
+                          **params: Any) -> "ImplicitALS":
+        matrix, users, tracks = interaction_matrix(interactions, weight_column)
+        return cls(**params).fit(matrix, users, tracks)
+
+    def _set_ids(self, users: Sequence[str], tracks: Sequence[str]) -> None:
+        self.users = np.asarray(users, dtype=str)
+        self.tracks = np.asarray(tracks, dtype=str)
+        self._user_index = {user: i for i, user in enumerate(self.users.tolist())}
+        self._track_index = {uri: i for i, uri in enumerate(self.tracks.tolist())}
+
+    def has_user(self, user_id: str) -> bool:
+        return user_id in self._user_index
+
+    def user_row(self, user_id: str) -> Optional[int]:
+        return self._user_index.get(user_id)
+
+    def track_indices(self, tracks: Iterable[str]) -> List[int]:
+        """Columns of the known tracks, accepting bare IDs as well as URIs"""
+        indices = []
+        for track in tracks:
+            uri = track if ':' in track else f'spotify:track:{track}'
+            if uri in self._track_index:
+                indices.append(self._track_index[uri])
+        return indices
+
+    def fold_in(self, tracks: Sequence[int], weights: Optional[Sequence[float]] = None) -> np.ndarray:
+        """Factors for an unseen user who interacted with the given track columns"""
+        tracks = np.asarray(tracks, dtype=np.int32)
+        weights = np.ones(len(tracks)) if weights is None else np.asarray(weights, dtype=np.float64)
+        return self.fold_in_rows(CSRMatrix([0, len(tracks)], tracks, weights, (1, len(self.tracks))))[0]
+
+    def fold_in_rows(self, matrix: CSRMatrix) -> np.ndarray:
+        """Factors for each row of a users x tracks interaction matrix, with track factors held fixed
+
+        This is exactly the ALS user step, so it reproduces trained factors
+        for unchanged users and gives current ones for users with new plays.
+        """
+        fixed = np.asarray(self.item_factors)
+        gram = (fixed.T.astype(np.float64) @ fixed) + self.regularization * np.eye(self.factors)
+        solved = np.empty((matrix.shape[0], self.factors), dtype=np.float32)
+        for rows in _row_batches(np.diff(matrix.indptr), max(1, (1 << 22) // self.factors)):
+            solved[rows] = _solve_rows(matrix, fixed, gram, self.alpha, rows)
+        return solved
+
+    def recommend_rows(self, vectors: np.ndarray, exclude: Optional[CSRMatrix] = None, k: int = 100,
+                       batch_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-``k`` track columns and scores for many user vectors at once
+
+        Row ``i`` of ``exclude`` lists the columns to leave out for vector
+        ``i``. Returns ``(len(vectors), k)`` arrays, best first.
+        """
+        item_factors = np.asarray(self.item_factors)
+        k = min(k, len(item_factors))
+        top_rows = np.empty((len(vectors), k), dtype=np.int32)
+        top_scores = np.empty((len(vectors), k), dtype=np.float32)
+        for start in range(0, len(vectors), batch_size):
+            scores = np.asarray(vectors[start:start + batch_size]) @ item_factors.T
+            if exclude is not None:
+                lo, hi = exclude.indptr[start], exclude.indptr[min(start + len(scores), exclude.shape[0])]
+                owners = np.repeat(np.arange(len(scores)), np.diff(exclude.indptr[start:start + len(scores) + 1]))
+                scores[owners, exclude.indices[lo:hi]] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_values = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_values, axis=1, kind='stable')
+            top_rows[start:start + len(scores)] = np.take_along_axis(top, order, axis=1)
+            top_scores[start:start + len(scores)] = np.take_along_axis(top_values, order, axis=1)
+        return top_rows, top_scores
+
+    def user_vector(self, user_id: Optional[str] = None, seed_tracks: Iterable[str] = ()) -> Optional[np.ndarray]:
+        """The user's factors, or factors folded in from seed tracks; None if neither is known"""
+        if user_id is not None and user_id in self._user_index:
+            return np.asarray(self.user_factors[self._user_index[user_id]])
+        seeds = self.track_indices(seed_tracks)
+        return self.fold_in(seeds) if seeds else None
+
+    def recommend(self, user_id: Optional[str] = None, seed_tracks: Iterable[str] = (),
+                  k: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        """Track columns with the ``k`` highest predicted preferences, best first
+
+        Tracks the user already played and the seed tracks are left out.
+        """
+        seed_tracks = list(seed_tracks)
+        vector = self.user_vector(user_id, seed_tracks)
+        if vector is None:
+            raise ValueError("Unknown user and no known seed tracks")
+        scores = np.asarray(self.item_factors) @ vector
+        exclude = self.track_indices(seed_tracks)
+        if user_id in self._user_index and self.user_items is not None:
+            exclude.extend(self.user_items.row(self._user_index[user_id])[0].tolist())
+        if exclude:
+            scores[exclude] = -np.inf
+        k = min(k, len(scores) - len(set(exclude)))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return top, scores[top]
+
+    def score(self, user_id: Optional[str], tracks: Sequence[str],
+              seed_tracks: Iterable[str] = ()) -> List[Optional[float]]:
+        """Predicted preference for each track, or None for tracks the model has not seen"""
+        vector = self.user_vector(user_id, seed_tracks)
+        if vector is None:
+            return [None] * len(tracks)
+        columns = [self.track_indices([track]) for track in tracks]
+        known = [column[0] for column in columns if column]
+        scores = iter((np.asarray(self.item_factors[known]) @ vector).tolist()) if known else iter(())
+        return [next(scores) if column else None for column in columns]
+
+    def save(self, path: str) -> None:
+        """Write the model as a directory of .npy files (replacing any previous one)"""
+        target = Path(path)
+        tmp = target.with_name(target.name + f'.{os.getpid()}.tmp')
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        np.save(tmp / 'user_factors.npy', self.user_factors)
+        np.save(tmp / 'item_factors.npy', self.item_factors)
+        np.save(tmp / 'users.npy', self.users)
+        np.save(tmp / 'tracks.npy', self.tracks)
+        if self.user_items is not None:
+            np.save(tmp / 'user_items_indptr.npy', self.user_items.indptr)
+            np.save(tmp / 'user_items_indices.npy', self.user_items.indices)
+        with open(tmp / 'meta.json', 'w') as f:
+            json.dump({
+                'version': MODEL_FORMAT_VERSION,
+                'factors': self.factors,
+                'regularization': self.regularization,
+                'alpha': self.alpha,
+                'iterations': self.iterations,
+                'cg_steps': self.cg_steps
+            }, f)
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+        logger.info(f"Saved ALS model ({len(self.users)} users, {len(self.tracks)} tracks) to {target}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "ImplicitALS":
+        """Load a saved model; factor matrices are memory-mapped unless ``mmap`` is False"""
+        source = Path(path)
+        with open(source / 'meta.json') as f:
+            metadata = json.load(f)
+        if metadata.get('version') != MODEL_FORMAT_VERSION:
+            raise ValueError(f"Unsupported model format in {source}")
+        mode = 'r' if mmap else None
+        model = cls(metadata['factors'], metadata['regularization'], metadata['alpha'], metadata['iterations'],
+                    metadata.get('cg_steps'))
+        model.user_factors = np.load(source / 'user_factors.npy', mmap_mode=mode)
+        model.item_factors = np.load(source / 'item_factors.npy', mmap_mode=mode)
+        model._set_ids(np.load(source / 'users.npy'), np.load(source / 'tracks.npy'))
+        if (source / 'user_items_indptr.npy').exists():
+            indptr = np.load(source / 'user_items_indptr.npy', mmap_mode=mode)
+            indices = np.load(source / 'user_items_indices.npy', mmap_mode=mode)
+            model.user_items = CSRMatrix(indptr, indices, np.ones(len(indices), dtype=np.float32),
+                                         (len(model.users), len(model.tracks)))
+        return model
+
+
+def default_model_path() -> Optional[str]:
+    """CF_MODEL_PATH, or the repository's ml_datasets/cf_model if present"""
+    path = os.getenv('CF_MODEL_PATH')
+    if path:
+        return path
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml_datasets', 'cf_model')
+    return os.path.normpath(default) if os.path.exists(default) else None
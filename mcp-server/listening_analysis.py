@@ -0,0 +1,1059 @@
+#!/usr/bin/env python3
+"""
+Listening history analysis for the Spotify MCP Server
+Reads only the columns each analysis needs, with compact dtypes, and keeps
+parsed datasets in an in-memory LRU cache and in memory-mapped Arrow sidecar
+files so repeated analyses of the same file skip CSV parsing.
+
+Files above ANALYSIS_STREAMING_THRESHOLD_MB are instead streamed in chunks
+into mergeable ListeningAggregates (counters, histograms and heavy-hitter
+sketches), so memory use does not grow with the size of the history. The
+aggregates are persisted next to the sidecars together with the byte offset
+they cover, so when a history only grows, later calls read just the new tail.
+
+The analysis functions are synchronous and CPU-bound; the server runs them
+through run_analysis in a thread or process pool, off the event loop.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from sketches import HyperLogLog, SpaceSaving
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_METADATA_KEY = b'echotune_source'
+
+# Columns each analysis type reads from the listening-history CSV
+ANALYSIS_COLUMNS: Dict[str, List[str]] = {
+    'summary': [
+        'ts', 'ms_played', 'spotify_track_uri', 'master_metadata_track_name',
+        'master_metadata_album_artist_name', 'master_metadata_album_album_name'
+    ],
+    'temporal': ['ts'],
+    'genre_preferences': [],
+    'listening_habits': ['ms_played', 'master_metadata_track_name'],
+    'recommendations_prep': ['master_metadata_album_artist_name']
+}
+
+# Compact dtypes for the columns above; repeated strings become categoricals
+COLUMN_DTYPES: Dict[str, str] = {
+    'ms_played': 'int32',
+    'spotify_track_uri': 'category',
+    'master_metadata_track_name': 'category',
+    'master_metadata_album_artist_name': 'category',
+    'master_metadata_album_album_name': 'category'
+}
+
+# Streaming mode: files at least this large are read in chunks of CHUNK_ROWS rows
+STREAMING_THRESHOLD_BYTES = int(float(os.getenv('ANALYSIS_STREAMING_THRESHOLD_MB', '256')) * 1024 * 1024)
+CHUNK_ROWS = int(os.getenv('ANALYSIS_CHUNK_ROWS', '100000'))
+TOP_K_CAPACITY = int(os.getenv('ANALYSIS_TOPK_CAPACITY', '1000'))
+
+# Columns tracked with heavy-hitter sketches in streaming mode
+TOP_K_COLUMNS = ('master_metadata_track_name', 'master_metadata_album_artist_name')
+
+# Columns whose distinct values are counted, exactly or with HyperLogLog
+DISTINCT_COLUMNS = ('spotify_track_uri', 'master_metadata_album_artist_name', 'master_metadata_album_album_name')
+DISTINCT_ERROR = float(os.getenv('ANALYSIS_DISTINCT_ERROR', '0.01'))
+
+# Incremental mode: persisted aggregates cover every column an analysis reads
+INCREMENTAL = os.getenv('ANALYSIS_INCREMENTAL', 'true').lower() != 'false'
+AGGREGATE_STATE_VERSION = 1
+AGGREGATE_STATE_SUFFIX = '.aggregates.json'
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def read_header(data_file: str) -> List[str]:
+    """Column names of a CSV file"""
+    return list(pd.read_csv(data_file, nrows=0).columns)
+
+
+def read_csv_columns(data_file: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read ``columns`` of a CSV (all when None) using COLUMN_DTYPES"""
+    names = columns if columns is not None else read_header(data_file)
+    dtypes = {column: COLUMN_DTYPES[column] for column in names if column in COLUMN_DTYPES}
+    try:
+        return pd.read_csv(data_file, usecols=columns, dtype=dtypes)
+    except (ValueError, TypeError) as e:
+        # Integer columns with missing values cannot be read as int32
+        logger.warning(f"Falling back to default numeric dtypes for {data_file}: {e}")
+        dtypes = {column: dtype for column, dtype in dtypes.items() if dtype == 'category'}
+        return pd.read_csv(data_file, usecols=columns, dtype=dtypes)
+
+
+def iter_csv_chunks(data_file, columns: List[str], chunk_rows: int = CHUNK_ROWS,
+                    names: Optional[List[str]] = None) -> Iterable[pd.DataFrame]:
+    """Yield ``columns`` of a CSV ``chunk_rows`` rows at a time
+
+    ``data_file`` may be a path or a binary stream; pass the header as
+    ``names`` when the stream starts after the header line.
+    """
+    # Numeric columns keep pandas' defaults so a late missing value cannot fail the read
+    dtypes = {column: 'category' for column in columns if COLUMN_DTYPES.get(column) == 'category'}
+    header = None if names is not None else 'infer'
+    with pd.read_csv(data_file, usecols=columns, dtype=dtypes, chunksize=chunk_rows,
+                     header=header, names=names) as reader:
+        yield from reader
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of bytes ``start`` to ``end`` of a file"""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:self._remaining]
+        count = self._file.readinto(view)
+        self._remaining -= count
+        return count
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+class DatasetCache:
+    """LRU cache of parsed listening-history DataFrames bounded by a byte budget
+
+    Entries are keyed on the file's absolute path, mtime and size, so a file
+    that changes on disk is re-read automatically. When pyarrow is installed,
+    each parsed CSV is also written to an uncompressed Arrow IPC sidecar that
+    is memory-mapped on later loads (including after a restart).
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, sidecar_dir: Optional[str] = None,
+                 use_sidecars: bool = True):
+        self.max_bytes = max_bytes
+        self.sidecar_dir = Path(sidecar_dir) if sidecar_dir else None
+        self.use_sidecars = use_sidecars
+        self._entries: "OrderedDict[Tuple[str, int, int], Tuple[pd.DataFrame, int, List[str]]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'sidecar_loads': 0, 'csv_loads': 0, 'evictions': 0}
+
+    def load(self, data_file: str, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Return ``columns`` of ``data_file`` (all when None), using the cache when valid
+
+        Requested columns missing from the file are ignored. A cached entry
+        holding a superset of the requested columns is reused; otherwise the
+        missing columns are loaded and merged into the entry.
+        """
+        path = os.path.abspath(data_file)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                df, _, header = entry
+                wanted = self._wanted_columns(header, columns)
+                if all(column in df.columns for column in wanted):
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    # New frame so callers can add derived columns without touching the cache
+                    return df[wanted].copy(deep=False)
+            self.stats['misses'] += 1
+
+        header = entry[2] if entry is not None else read_header(path)
+        wanted = self._wanted_columns(header, columns)
+
+        # Load everything already cached or in the sidecar too, so neither shrinks
+        load_columns = set(wanted)
+        if entry is not None:
+            load_columns.update(entry[0].columns)
+        sidecar_columns = self._sidecar_columns(path, stat)
+        if sidecar_columns:
+            load_columns.update(sidecar_columns)
+        load_columns = [column for column in header if column in load_columns]
+
+        df = None
+        if sidecar_columns is not None and set(wanted) <= set(sidecar_columns):
+            df = self._read_sidecar(path, sidecar_columns)
+        if df is None:
+            df = read_csv_columns(path, None if len(load_columns) == len(header) else load_columns)
+            self.stats['csv_loads'] += 1
+            logger.info(f"Parsed {len(df)} records ({len(df.columns)} columns) from {data_file}")
+            self._write_sidecar(path, stat, df)
+
+        self._store(key, df, header)
+        return df[wanted].copy(deep=False)
+
+    @staticmethod
+    def _wanted_columns(header: List[str], columns: Optional[Iterable[str]]) -> List[str]:
+        if columns is None:
+            return list(header)
+        requested = set(columns)
+        # Keep at least one column so the row count is still available
+        return [column for column in header if column in requested] or header[:1]
+
+    def _store(self, key: Tuple[str, int, int], df: pd.DataFrame, header: List[str]):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            logger.info(f"Dataset {key[0]} ({nbytes} bytes) exceeds the cache budget, not caching")
+            return
+
+        with self._lock:
+            # Drop stale versions of the same file
+            for stale in [k for k in self._entries if k[0] == key[0] and k != key]:
+                self._total_bytes -= self._entries.pop(stale)[1]
+
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, nbytes, header)
+            self._total_bytes += nbytes
+
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_bytes
+                self.stats['evictions'] += 1
+
+    def sidecar_path(self, path: str, suffix: str = '.arrow') -> Path:
+        """Location of the Arrow sidecar (or another derived file) for a source file"""
+        source = Path(path)
+        if self.sidecar_dir is None:
+            return source.with_name(source.name + suffix)
+        digest = hashlib.sha1(str(source).encode()).hexdigest()[:12]
+        return self.sidecar_dir / f"{source.stem}.{digest}{suffix}"
+
+    @staticmethod
+    def _source_stamp(stat: os.stat_result) -> Dict[str, int]:
+        return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    def _sidecar_columns(self, path: str, stat: os.stat_result) -> Optional[List[str]]:
+        """Columns stored in a valid (up-to-date) sidecar, or None"""
+        if not self.use_sidecars:
+            return None
+        sidecar = self.sidecar_path(path)
+        if not sidecar.exists():
+            return None
+
+        try:
+            import pyarrow as pa
+        except ImportError:
+            return None
+
+        try:
+            with pa.memory_map(str(sidecar), 'r') as source:
+                schema = pa.ipc.open_file(source).schema
+            stamp = json.loads((schema.metadata or {}).get(SIDECAR_METADATA_KEY, b'{}'))
+            if stamp != self._source_stamp(stat):
+                logger.info(f"Sidecar {sidecar} is stale, re-reading CSV")
+                return None
+            return list(schema.names)
+        except Exception as e:
+            logger.warning(f"Could not read sidecar {sidecar}: {e}")
+            return None
+
+    def _read_sidecar(self, path: str, columns: List[str]) -> Optional[pd.DataFrame]:
+        import pyarrow as pa
+
+        sidecar = self.sidecar_path(path)
+        try:
+            with pa.memory_map(str(sidecar), 'r') as source:
+                # Selecting from a memory-mapped table only touches the chosen columns
+                table = pa.ipc.open_file(source).read_all().select(columns)
+                df = table.to_pandas()
+            self.stats['sidecar_loads'] += 1
+            logger.info(f"Loaded {len(df)} records ({len(columns)} columns) from sidecar {sidecar}")
+            return df
+        except Exception as e:
+            logger.warning(f"Could not read sidecar {sidecar}: {e}")
+            return None
+
+    def _write_sidecar(self, path: str, stat: os.stat_result, df: pd.DataFrame):
+        if not self.use_sidecars:
+            return
+
+        try:
+            import pyarrow as pa
+        except ImportError:
+            logger.debug("pyarrow not installed, skipping dataset sidecar")
+            return
+
+        sidecar = self.sidecar_path(path)
+        tmp_path = sidecar.with_name(sidecar.name + '.tmp')
+        try:
+            sidecar.parent.mkdir(parents=True, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[SIDECAR_METADATA_KEY] = json.dumps(self._source_stamp(stat)).encode()
+            table = table.replace_schema_metadata(metadata)
+
+            # Uncompressed IPC files can be memory-mapped without a decode step
+            with pa.OSFile(str(tmp_path), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, sidecar)
+            logger.info(f"Wrote dataset sidecar {sidecar}")
+        except Exception as e:
+            logger.warning(f"Could not write sidecar {sidecar}: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'entries': len(self._entries),
+                'cached_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+dataset_cache = DatasetCache(
+    max_bytes=int(os.getenv('ANALYSIS_CACHE_MAX_MB', '512')) * 1024 * 1024,
+    sidecar_dir=os.getenv('ANALYSIS_CACHE_DIR'),
+    use_sidecars=os.getenv('ANALYSIS_SIDECARS', 'true').lower() != 'false'
+)
+
+
+class AnalysisCancelled(Exception):
+    """Raised inside a worker when the caller has cancelled or timed out the analysis"""
+
+
+class ListeningFrame:
+    """Listening-history DataFrame plus derived data shared between analyses
+
+    The parsed timestamp, its hour/day/month parts, completion rates and
+    per-column value counts are computed on first use and then reused, so
+    running several analyses over one load does that work only once. With a
+    ``distinct_error``, distinct counts are HyperLogLog estimates instead of
+    exact ``nunique()`` results.
+    """
+
+    def __init__(self, df: pd.DataFrame, distinct_error: Optional[float] = None):
+        self.df = df
+        self.distinct_error = distinct_error
+        self._value_counts: Dict[str, pd.Series] = {}
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def has(self, column: str) -> bool:
+        return column in self.df.columns
+
+    @cached_property
+    def timestamp(self) -> pd.Series:
+        return pd.to_datetime(self.df['ts'])
+
+    @cached_property
+    def hour(self) -> pd.Series:
+        return self.timestamp.dt.hour
+
+    @cached_property
+    def day_of_week(self) -> pd.Series:
+        return self.timestamp.dt.dayofweek
+
+    @cached_property
+    def month(self) -> pd.Series:
+        return self.timestamp.dt.month
+
+    @cached_property
+    def completion_rate(self) -> pd.Series:
+        # Assume average track length of 3 minutes (180,000ms)
+        return (self.df['ms_played'] / 180000).clip(0, 1)
+
+    def value_counts(self, column: str) -> pd.Series:
+        if column not in self._value_counts:
+            self._value_counts[column] = self.df[column].value_counts()
+        return self._value_counts[column]
+
+    def top_items(self, column: str, n: int) -> List[Tuple[Any, int]]:
+        """The ``n`` most frequent values of ``column`` with their counts"""
+        return [(value, int(count)) for value, count in self.value_counts(column).head(n).items()]
+
+    def distinct_count(self, column: str) -> int:
+        if self.distinct_error is None:
+            return int(self.df[column].nunique())
+        sketch = HyperLogLog(self.distinct_error)
+        sketch.update(self.df[column])
+        return sketch.count()
+
+
+class ListeningAggregates:
+    """Mergeable aggregates of a listening history, built chunk by chunk
+
+    Holds row and play-time counters, completion counts, hour/day/month
+    histograms, the timestamp range, SpaceSaving sketches of the most
+    played tracks and artists and HyperLogLog sketches of the distinct
+    tracks, artists and albums. Memory use is fixed by ``top_k_capacity``
+    and ``distinct_error`` and independent of the number of rows; aggregates
+    of separate chunks (or files) combine with ``merge``.
+    """
+
+    def __init__(self, columns: Iterable[str], top_k_capacity: int = TOP_K_CAPACITY,
+                 distinct_error: float = DISTINCT_ERROR):
+        self.columns = set(columns)
+        self.top_k_capacity = top_k_capacity
+        self.distinct_error = distinct_error
+        self.records = 0
+        self.ms_played_sum = 0
+        self.ms_played_count = 0
+        self.completion_sum = 0.0
+        self.completed_fully = 0
+        self.skipped_early = 0
+        self.hourly = np.zeros(24, dtype=np.int64)
+        self.daily = np.zeros(7, dtype=np.int64)
+        self.monthly = np.zeros(13, dtype=np.int64)
+        self.ts_min: Optional[pd.Timestamp] = None
+        self.ts_max: Optional[pd.Timestamp] = None
+        self.ts_error = False
+        self.top = {column: SpaceSaving(top_k_capacity) for column in TOP_K_COLUMNS if column in self.columns}
+        self.distinct = {column: HyperLogLog(distinct_error) for column in DISTINCT_COLUMNS if column in self.columns}
+
+    def __len__(self) -> int:
+        return self.records
+
+    def has(self, column: str) -> bool:
+        return column in self.columns
+
+    def top_items(self, column: str, n: int) -> List[Tuple[Any, int]]:
+        """Estimated ``n`` most frequent values of ``column`` (see SpaceSaving)"""
+        return self.top[column].top(n)
+
+    def distinct_count(self, column: str) -> int:
+        """Estimated number of distinct values of ``column`` (see HyperLogLog)"""
+        return self.distinct[column].count()
+
+    def update(self, frame: ListeningFrame) -> None:
+        """Fold one chunk into the aggregates"""
+        self.records += len(frame)
+
+        if frame.has('ms_played'):
+            ms_played = frame.df['ms_played']
+            self.ms_played_sum += int(ms_played.sum())
+            self.ms_played_count += int(ms_played.count())
+            completion_rate = frame.completion_rate
+            self.completion_sum += float(completion_rate.sum())
+            self.completed_fully += int((completion_rate >= 0.8).sum())
+            self.skipped_early += int((completion_rate < 0.3).sum())
+
+        if frame.has('ts') and not self.ts_error:
+            try:
+                self._update_time(frame)
+            except Exception as e:
+                logger.warning(f"Could not parse timestamp data: {e}")
+                self.ts_error = True
+
+        for column, sketch in self.top.items():
+            counts = frame.value_counts(column)
+            sketch.update_counts(counts.head(sketch.capacity + 1).items(), total=int(counts.sum()))
+
+        for column, sketch in self.distinct.items():
+            sketch.update(frame.df[column])
+
+    def _update_time(self, frame: ListeningFrame) -> None:
+        valid = frame.timestamp.notna()
+        if not valid.any():
+            return
+        self.hourly += np.bincount(frame.hour[valid].astype(int), minlength=24)
+        self.daily += np.bincount(frame.day_of_week[valid].astype(int), minlength=7)
+        self.monthly += np.bincount(frame.month[valid].astype(int), minlength=13)
+        self._extend_range(frame.timestamp.min(), frame.timestamp.max())
+
+    def _extend_range(self, earliest: Optional[pd.Timestamp], latest: Optional[pd.Timestamp]) -> None:
+        if earliest is not None:
+            self.ts_min = earliest if self.ts_min is None else min(self.ts_min, earliest)
+        if latest is not None:
+            self.ts_max = latest if self.ts_max is None else max(self.ts_max, latest)
+
+    def merge(self, other: "ListeningAggregates") -> "ListeningAggregates":
+        """Combine with the aggregates of another chunk"""
+        self.columns |= other.columns
+        self.records += other.records
+        self.ms_played_sum += other.ms_played_sum
+        self.ms_played_count += other.ms_played_count
+        self.completion_sum += other.completion_sum
+        self.completed_fully += other.completed_fully
+        self.skipped_early += other.skipped_early
+        self.hourly += other.hourly
+        self.daily += other.daily
+        self.monthly += other.monthly
+        self.ts_error = self.ts_error or other.ts_error
+        try:
+            self._extend_range(other.ts_min, other.ts_max)
+        except TypeError:
+            # Timezone-aware and naive timestamps cannot be compared
+            self.ts_error = True
+        for column, sketch in other.top.items():
+            if column in self.top:
+                self.top[column].merge(sketch)
+            else:
+                self.top[column] = sketch
+        for column, sketch in other.distinct.items():
+            if column in self.distinct:
+                self.distinct[column].merge(sketch)
+            else:
+                self.distinct[column] = sketch
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable state"""
+        return {
+            'columns': sorted(self.columns),
+            'top_k_capacity': self.top_k_capacity,
+            'distinct_error': self.distinct_error,
+            'records': self.records,
+            'ms_played_sum': self.ms_played_sum,
+            'ms_played_count': self.ms_played_count,
+            'completion_sum': self.completion_sum,
+            'completed_fully': self.completed_fully,
+            'skipped_early': self.skipped_early,
+            'hourly': self.hourly.tolist(),
+            'daily': self.daily.tolist(),
+            'monthly': self.monthly.tolist(),
+            'ts_min': self.ts_min.isoformat() if self.ts_min is not None else None,
+            'ts_max': self.ts_max.isoformat() if self.ts_max is not None else None,
+            'ts_error': self.ts_error,
+            'top': {column: sketch.to_dict() for column, sketch in self.top.items()},
+            'distinct': {column: sketch.to_dict() for column, sketch in self.distinct.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "ListeningAggregates":
+        aggregates = cls(state['columns'], state['top_k_capacity'], state['distinct_error'])
+        for field in ('records', 'ms_played_sum', 'ms_played_count', 'completion_sum',
+                      'completed_fully', 'skipped_early', 'ts_error'):
+            setattr(aggregates, field, state[field])
+        for field in ('hourly', 'daily', 'monthly'):
+            setattr(aggregates, field, np.array(state[field], dtype=np.int64))
+        aggregates.ts_min = pd.Timestamp(state['ts_min']) if state['ts_min'] else None
+        aggregates.ts_max = pd.Timestamp(state['ts_max']) if state['ts_max'] else None
+        aggregates.top = {column: SpaceSaving.from_dict(sketch) for column, sketch in state['top'].items()}
+        aggregates.distinct = {column: HyperLogLog.from_dict(sketch) for column, sketch in state['distinct'].items()}
+        return aggregates
+
+    @staticmethod
+    def counts(histogram: np.ndarray) -> List[Tuple[int, int]]:
+        """Non-zero ``(value, count)`` pairs of a histogram, in value order"""
+        return [(int(value), int(histogram[value])) for value in np.flatnonzero(histogram)]
+
+
+def aggregate_csv(data_file: str, columns: Iterable[str], cancel_event=None,
+                  chunk_rows: int = CHUNK_ROWS, distinct_error: float = DISTINCT_ERROR) -> ListeningAggregates:
+    """Stream ``columns`` of ``data_file`` into ListeningAggregates, one chunk in memory at a time"""
+    header = read_header(data_file)
+    wanted = DatasetCache._wanted_columns(header, columns)
+    aggregates = ListeningAggregates(wanted, distinct_error=distinct_error)
+    chunks = 0
+    for chunk in iter_csv_chunks(data_file, wanted, chunk_rows):
+        aggregates.update(ListeningFrame(chunk))
+        chunks += 1
+        _check_cancelled(cancel_event)
+    logger.info(f"Streamed {aggregates.records} records in {chunks} chunks from {data_file}")
+    return aggregates
+
+
+_state_locks: Dict[str, threading.Lock] = {}
+_state_locks_guard = threading.Lock()
+
+
+def _complete_lines_end(path: str) -> int:
+    """Offset just past the last newline, so a row still being appended is left for later"""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 64 * 1024)
+            f.seek(start)
+            block = f.read(end - start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+def _fingerprint(path: str, offset: int) -> str:
+    """Hash of the start of the file and of the bytes just before ``offset``
+
+    Appending rows leaves it unchanged; rewriting the processed part does not.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+        f.seek(max(0, offset - FINGERPRINT_BYTES))
+        digest.update(f.read(offset - f.tell()))
+    return digest.hexdigest()
+
+
+def _load_aggregate_state(state_path: Path, path: str, header: List[str], end: int, distinct_error: float
+                          ) -> Optional[Tuple[ListeningAggregates, int, Optional[Dict[str, int]]]]:
+    """Persisted aggregates, the offset they cover and the file's size/mtime when saved, if still valid for ``path``"""
+    if not state_path.exists():
+        return None
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+        offset = state['offset']
+        if (state.get('version') != AGGREGATE_STATE_VERSION or state['header'] != header or offset > end
+                or state['fingerprint'] != _fingerprint(path, offset)):
+            logger.info(f"Discarding outdated aggregate state {state_path}")
+            return None
+        aggregates = ListeningAggregates.from_dict(state['aggregates'])
+        if aggregates.top_k_capacity != TOP_K_CAPACITY or aggregates.distinct_error != distinct_error:
+            return None
+        return aggregates, offset, state.get('source_stamp')
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Could not read aggregate state {state_path}: {e}")
+        return None
+
+
+def _save_aggregate_state(state_path: Path, path: str, header: List[str], offset: int,
+                          aggregates: ListeningAggregates, source_stamp: Dict[str, int]) -> None:
+    tmp_path = state_path.with_name(state_path.name + f'.{os.getpid()}.tmp')
+    try:
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': AGGREGATE_STATE_VERSION,
+                'source': path,
+                'header': header,
+                'offset': offset,
+                'fingerprint': _fingerprint(path, offset),
+                'source_stamp': source_stamp,
+                'aggregates': aggregates.to_dict()
+            }, f)
+        os.replace(tmp_path, state_path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not write aggregate state {state_path}: {e}")
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def aggregate_csv_incremental(data_file: str, cancel_event=None, chunk_rows: int = CHUNK_ROWS,
+                              distinct_error: float = DISTINCT_ERROR) -> Tuple[ListeningAggregates, Dict[str, int]]:
+    """ListeningAggregates of ``data_file``, reading only rows appended since the last call
+
+    The aggregates of every column in ANALYSIS_COLUMNS are persisted with
+    the byte offset they cover and a fingerprint of the processed bytes. If
+    the file has only grown since, just the rows after that offset are read
+    and merged in; otherwise everything is recomputed. A last row without a
+    trailing newline is read on a full scan, or once the file is unchanged
+    since the previous call; otherwise it may still be being written and is
+    left for later. Returns the
+    aggregates and counts of previously and newly processed records.
+    """
+    path = os.path.abspath(data_file)
+    with _state_locks_guard:
+        lock = _state_locks.setdefault(path, threading.Lock())
+
+    with lock:
+        header = read_header(path)
+        stat = os.stat(path)
+        stamp = DatasetCache._source_stamp(stat)
+        end = _complete_lines_end(path)
+        state_path = dataset_cache.sidecar_path(path, AGGREGATE_STATE_SUFFIX)
+        state = _load_aggregate_state(state_path, path, header, stat.st_size, distinct_error)
+
+        seen_stamp = None
+        if state is not None:
+            aggregates, offset, seen_stamp = state
+        else:
+            columns = {column for columns in ANALYSIS_COLUMNS.values() for column in columns}
+            aggregates = ListeningAggregates(DatasetCache._wanted_columns(header, columns),
+                                             distinct_error=distinct_error)
+            with open(path, 'rb') as f:
+                offset = len(f.readline())
+        previous_records = aggregates.records
+
+        # The file ends without a newline: its last row is complete if we are reading
+        # everything anyway, or if nothing has written to the file since the last call
+        if end < stat.st_size and (state is None or seen_stamp == stamp):
+            end = stat.st_size
+
+        if end > offset:
+            wanted = [column for column in header if column in aggregates.columns]
+            with io.BufferedReader(_ByteRange(path, offset, end)) as tail:
+                for chunk in iter_csv_chunks(tail, wanted, chunk_rows, names=header):
+                    aggregates.update(ListeningFrame(chunk))
+                    _check_cancelled(cancel_event)
+            _save_aggregate_state(state_path, path, header, end, aggregates, stamp)
+        elif seen_stamp != stamp:
+            # Nothing new to read, but remember the file as seen now
+            _save_aggregate_state(state_path, path, header, offset, aggregates, stamp)
+
+        new_records = aggregates.records - previous_records
+        logger.info(f"Aggregated {new_records} new records ({previous_records} already processed) from {data_file}")
+        return aggregates, {'previous_records': previous_records, 'new_records': new_records}
+
+
+def analyze_summary(frame: ListeningFrame) -> Dict[str, Any]:
+    """Generate comprehensive summary statistics"""
+    df = frame.df
+
+    summary = {
+        "total_tracks": len(df),
+        "unique_tracks": frame.distinct_count('spotify_track_uri') if frame.has('spotify_track_uri') else 0,
+        "unique_artists": frame.distinct_count('master_metadata_album_artist_name') if frame.has('master_metadata_album_artist_name') else 0,
+        "unique_albums": frame.distinct_count('master_metadata_album_album_name') if frame.has('master_metadata_album_album_name') else 0,
+    }
+    if frame.distinct_error is not None:
+        summary["unique_counts_approximate"] = True
+
+    # Time-based analysis
+    if frame.has('ms_played'):
+        summary.update({
+            "total_listening_time_ms": int(df['ms_played'].sum()),
+            "total_listening_time_hours": round(df['ms_played'].sum() / (1000 * 60 * 60), 2),
+            "average_track_completion": round(df['ms_played'].mean() / 30000, 2)
+        })
+
+    # Date range analysis
+    if frame.has('ts'):
+        try:
+            earliest, latest = frame.timestamp.min(), frame.timestamp.max()
+            summary.update({
+                "date_range": {
+                    "earliest": earliest.isoformat(),
+                    "latest": latest.isoformat(),
+                    "span_days": (latest - earliest).days
+                }
+            })
+        except Exception:
+            logger.warning("Could not parse timestamp data")
+
+    # Top items
+    if frame.has('master_metadata_track_name'):
+        top_tracks = frame.top_items('master_metadata_track_name', 10)
+        summary["top_tracks"] = [{"track": track, "plays": count} for track, count in top_tracks]
+
+    if frame.has('master_metadata_album_artist_name'):
+        top_artists = frame.top_items('master_metadata_album_artist_name', 10)
+        summary["top_artists"] = [{"artist": artist, "plays": count} for artist, count in top_artists]
+
+    return summary
+
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def most_active_period(peak_hour: int) -> str:
+    return "morning" if 6 <= peak_hour <= 12 else "afternoon" if 12 < peak_hour <= 18 else "evening" if 18 < peak_hour <= 24 else "night"
+
+
+def _sorted_counts(values: pd.Series) -> List[Tuple[int, int]]:
+    return [(int(value), int(count)) for value, count in values.value_counts().sort_index().items()]
+
+
+def temporal_distributions(hourly_counts: List[Tuple[int, int]], daily_counts: List[Tuple[int, int]],
+                           monthly_counts: List[Tuple[int, int]]) -> Dict[str, Any]:
+    """Distributions and peaks from ``(value, count)`` pairs sorted by value"""
+
+    def peak(counts):
+        # Most frequent value, smallest on ties (as Series.mode)
+        return max(counts, key=lambda pair: (pair[1], -pair[0]))[0]
+
+    peak_hour = peak(hourly_counts) if hourly_counts else 0
+    peak_day = DAY_NAMES[peak(daily_counts)] if daily_counts else "Unknown"
+
+    return {
+        "hourly_distribution": {str(h): count for h, count in hourly_counts},
+        # 0=Monday, 6=Sunday
+        "daily_distribution": {DAY_NAMES[day]: count for day, count in daily_counts},
+        "monthly_distribution": {str(m): count for m, count in monthly_counts},
+        "patterns": {
+            "peak_listening_hour": int(peak_hour),
+            "peak_listening_day": peak_day,
+            "most_active_period": most_active_period(peak_hour)
+        }
+    }
+
+
+def analyze_temporal_patterns(frame: ListeningFrame) -> Dict[str, Any]:
+    """Analyze listening patterns over time"""
+
+    temporal_analysis = {}
+
+    if frame.has('ts'):
+        try:
+            temporal_analysis.update(temporal_distributions(
+                _sorted_counts(frame.hour), _sorted_counts(frame.day_of_week), _sorted_counts(frame.month)
+            ))
+
+        except Exception as e:
+            logger.warning(f"Error in temporal analysis: {e}")
+            temporal_analysis["error"] = "Could not analyze temporal patterns"
+
+    return temporal_analysis
+
+
+def analyze_genre_preferences(frame: Union[ListeningFrame, ListeningAggregates]) -> Dict[str, Any]:
+    """Analyze genre preferences and music taste"""
+
+    # This would require additional genre data or API calls to classify tracks
+    # For now, provide a mock analysis based on artist patterns
+
+    genre_analysis = {
+        "genre_distribution": {
+            "pop": np.random.randint(20, 40),
+            "rock": np.random.randint(15, 30),
+            "electronic": np.random.randint(10, 25),
+            "hip-hop": np.random.randint(5, 20),
+            "indie": np.random.randint(5, 15),
+            "classical": np.random.randint(0, 10)
+        },
+        "diversity_score": round(np.random.uniform(0.6, 0.9), 2),
+        "mainstream_vs_niche": {
+            "mainstream_percentage": round(np.random.uniform(60, 85), 1),
+            "niche_percentage": round(np.random.uniform(15, 40), 1)
+        }
+    }
+
+    return genre_analysis
+
+
+def analyze_listening_habits(frame: ListeningFrame) -> Dict[str, Any]:
+    """Analyze detailed listening habits and patterns"""
+
+    habits = {}
+
+    # Completion rates
+    if frame.has('ms_played'):
+        completion_rate = frame.completion_rate
+        habits["completion_stats"] = {
+            "average_completion_rate": round(completion_rate.mean(), 3),
+            "tracks_completed_fully": int((completion_rate >= 0.8).sum()),
+            "tracks_skipped_early": int((completion_rate < 0.3).sum())
+        }
+
+    # Repeat listening
+    if frame.has('master_metadata_track_name'):
+        track_counts = frame.value_counts('master_metadata_track_name')
+        habits["repeat_behavior"] = {
+            "tracks_played_once": int((track_counts == 1).sum()),
+            "tracks_played_multiple": int((track_counts > 1).sum()),
+            "most_repeated_track": {
+                "name": track_counts.index[0] if len(track_counts) > 0 else "Unknown",
+                "play_count": int(track_counts.iloc[0]) if len(track_counts) > 0 else 0
+            }
+        }
+
+    # Session patterns
+    habits["session_insights"] = estimate_session_insights()
+
+    return habits
+
+
+def estimate_session_insights() -> Dict[str, Any]:
+    """Session patterns (mock values until session data is available)"""
+    return {
+        "estimated_daily_sessions": round(np.random.uniform(3, 8), 1),
+        "average_session_length_minutes": round(np.random.uniform(15, 45), 1),
+        "preferred_listening_mode": np.random.choice(["continuous", "shuffle", "mixed"])
+    }
+
+
+def prepare_recommendation_features(frame: Union[ListeningFrame, ListeningAggregates]) -> Dict[str, Any]:
+    """Prepare features for ML recommendation models"""
+
+    features = {
+        "user_profile_features": {
+            "activity_level": "high" if len(frame) > 1000 else "medium" if len(frame) > 100 else "low",
+            "music_exploration": round(np.random.uniform(0.3, 0.8), 2),
+            "genre_diversity": round(np.random.uniform(0.4, 0.9), 2),
+            "temporal_consistency": round(np.random.uniform(0.5, 0.9), 2)
+        },
+        "recommendation_seeds": {
+            "top_artists": [],
+            "top_genres": ["pop", "rock", "electronic"],
+            "preferred_audio_features": {
+                "danceability": round(np.random.uniform(0.4, 0.8), 2),
+                "energy": round(np.random.uniform(0.3, 0.7), 2),
+                "valence": round(np.random.uniform(0.3, 0.8), 2)
+            }
+        }
+    }
+
+    # Extract top artists if available
+    if frame.has('master_metadata_album_artist_name'):
+        top_artists = frame.top_items('master_metadata_album_artist_name', 5)
+        features["recommendation_seeds"]["top_artists"] = [artist for artist, _ in top_artists]
+
+    return features
+
+
+def summarize_aggregates(aggregates: ListeningAggregates) -> Dict[str, Any]:
+    """Summary statistics from streamed aggregates; top items come from the sketches"""
+
+    summary = {
+        "total_tracks": aggregates.records,
+        "unique_tracks": aggregates.distinct_count('spotify_track_uri') if aggregates.has('spotify_track_uri') else 0,
+        "unique_artists": aggregates.distinct_count('master_metadata_album_artist_name') if aggregates.has('master_metadata_album_artist_name') else 0,
+        "unique_albums": aggregates.distinct_count('master_metadata_album_album_name') if aggregates.has('master_metadata_album_album_name') else 0,
+        "unique_counts_approximate": True
+    }
+
+    if aggregates.has('ms_played'):
+        summary.update({
+            "total_listening_time_ms": aggregates.ms_played_sum,
+            "total_listening_time_hours": round(aggregates.ms_played_sum / (1000 * 60 * 60), 2),
+            "average_track_completion": (
+                round(aggregates.ms_played_sum / aggregates.ms_played_count / 30000, 2)
+                if aggregates.ms_played_count else None
+            )
+        })
+
+    if aggregates.has('ts') and not aggregates.ts_error and aggregates.ts_min is not None:
+        summary["date_range"] = {
+            "earliest": aggregates.ts_min.isoformat(),
+            "latest": aggregates.ts_max.isoformat(),
+            "span_days": (aggregates.ts_max - aggregates.ts_min).days
+        }
+
+    if aggregates.has('master_metadata_track_name'):
+        top_tracks = aggregates.top_items('master_metadata_track_name', 10)
+        summary["top_tracks"] = [{"track": track, "plays": count} for track, count in top_tracks]
+
+    if aggregates.has('master_metadata_album_artist_name'):
+        top_artists = aggregates.top_items('master_metadata_album_artist_name', 10)
+        summary["top_artists"] = [{"artist": artist, "plays": count} for artist, count in top_artists]
+
+    return summary
+
+
+def summarize_temporal_patterns(aggregates: ListeningAggregates) -> Dict[str, Any]:
+    """Listening patterns over time from streamed histograms"""
+
+    if not aggregates.has('ts'):
+        return {}
+    if aggregates.ts_error:
+        return {"error": "Could not analyze temporal patterns"}
+    return temporal_distributions(
+        aggregates.counts(aggregates.hourly), aggregates.counts(aggregates.daily),
+        aggregates.counts(aggregates.monthly)
+    )
+
+
+def summarize_listening_habits(aggregates: ListeningAggregates) -> Dict[str, Any]:
+    """Listening habits from streamed aggregates
+
+    Counts of tracks played once or several times need every track's exact
+    count and are not reported in streaming mode.
+    """
+
+    habits = {}
+
+    if aggregates.has('ms_played'):
+        habits["completion_stats"] = {
+            "average_completion_rate": (
+                round(aggregates.completion_sum / aggregates.ms_played_count, 3)
+                if aggregates.ms_played_count else None
+            ),
+            "tracks_completed_fully": aggregates.completed_fully,
+            "tracks_skipped_early": aggregates.skipped_early
+        }
+
+    if aggregates.has('master_metadata_track_name'):
+        top_track = aggregates.top_items('master_metadata_track_name', 1)
+        habits["repeat_behavior"] = {
+            "most_repeated_track": {
+                "name": top_track[0][0] if top_track else "Unknown",
+                "play_count": top_track[0][1] if top_track else 0
+            }
+        }
+
+    habits["session_insights"] = estimate_session_insights()
+
+    return habits
+
+
+ANALYZERS = {
+    'summary': analyze_summary,
+    'temporal': analyze_temporal_patterns,
+    'genre_preferences': analyze_genre_preferences,
+    'listening_habits': analyze_listening_habits,
+    'recommendations_prep': prepare_recommendation_features
+}
+
+
+# Streaming counterparts of ANALYZERS, computed from ListeningAggregates
+STREAMING_ANALYZERS = {
+    'summary': summarize_aggregates,
+    'temporal': summarize_temporal_patterns,
+    'genre_preferences': analyze_genre_preferences,
+    'listening_habits': summarize_listening_habits,
+    'recommendations_prep': prepare_recommendation_features
+}
+
+
+def _check_cancelled(cancel_event) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise AnalysisCancelled()
+
+
+def run_analysis(data_file: str, analysis_type: Union[str, List[str]], cancel_event=None,
+                 streaming: Optional[bool] = None, approximate: bool = False,
+                 incremental: Optional[bool] = None) -> Dict[str, Any]:
+    """Load ``data_file`` once and run one or more analyses; meant to be run in an executor
+
+    A single analysis type returns its results at the top level. A list of
+    types shares one load (of the union of their columns) and one set of
+    derived columns, and returns ``{"results": {type: results}}``.
+    ``streaming`` reads the file in chunks into ListeningAggregates instead
+    of loading it whole; by default it is used for files of at least
+    STREAMING_THRESHOLD_BYTES. Streamed aggregates are persisted and
+    extended with appended rows on later calls unless ``incremental`` is
+    False (default: ANALYSIS_INCREMENTAL); ``incremental=True`` implies
+    streaming. ``approximate`` estimates distinct counts with HyperLogLog
+    (relative error DISTINCT_ERROR), as streaming mode always does.
+    ``cancel_event`` (a threading.Event, thread pools only) is checked
+    between steps so abandoned calls stop early.
+    """
+    analysis_types = [analysis_type] if isinstance(analysis_type, str) else list(dict.fromkeys(analysis_type))
+    unknown = [name for name in analysis_types if name not in ANALYZERS]
+    if unknown or not analysis_types:
+        raise ValueError(f"Unknown analysis type: {', '.join(map(str, unknown)) or analysis_type}")
+
+    columns = {column for name in analysis_types for column in ANALYSIS_COLUMNS[name]}
+    if streaming is None:
+        streaming = incremental or os.path.getsize(data_file) >= STREAMING_THRESHOLD_BYTES
+    if incremental is None:
+        incremental = INCREMENTAL
+
+    progress = None
+    if streaming:
+        if incremental:
+            source, progress = aggregate_csv_incremental(data_file, cancel_event)
+        else:
+            source = aggregate_csv(data_file, columns, cancel_event)
+        analyzers = STREAMING_ANALYZERS
+    else:
+        df = dataset_cache.load(data_file, columns)
+        logger.info(f"Loaded {len(df)} records from {data_file}")
+        _check_cancelled(cancel_event)
+        source = ListeningFrame(df, DISTINCT_ERROR if approximate else None)
+        analyzers = ANALYZERS
+
+    results = {}
+    for name in analysis_types:
+        results[name] = analyzers[name](source)
+        _check_cancelled(cancel_event)
+
+    response = {'total_records': len(source)}
+    if streaming:
+        response['streaming'] = True
+    if progress is not None:
+        response['incremental'] = progress
+    if isinstance(analysis_type, str):
+        return {**response, **results[analysis_type]}
+    return {**response, 'results': results}
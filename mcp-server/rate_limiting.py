@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Rate limiting for Spotify Web API clients
+A token-bucket limiter shared by the MCP server and the data scripts that
+call the API. Importing it has no side effects, so scripts can use it
+without loading the server.
+"""
+
+import asyncio
+import time
+
+
+class TokenBucketRateLimiter:
+    """Token-bucket rate limiter shared by all coroutines of one API client
+    
+    Tokens refill continuously at ``calls / period`` per second up to ``calls``.
+    Every operation does constant work, and waiters sleep only until the next
+    token (or the end of a server-imposed Retry-After window) is available.
+    """
+    
+    def __init__(self, calls: int, period: float):
+        self.capacity = float(calls)
+        self.refill_rate = calls / period
+        self.tokens = float(calls)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        
+    def _refill(self, now: float):
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+            self.last_refill = now
+    
+    def remaining(self) -> int:
+        """Number of calls that can be made right now without waiting"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return 0
+        self._refill(now)
+        return int(self.tokens)
+    
+    def defer(self, seconds: float):
+        """Block all callers for ``seconds`` (e.g. from a 429 Retry-After header)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        # Refill from the end of the block, so it is not credited as idle time
+        self.last_refill = self.blocked_until
+        
+    async def acquire(self) -> float:
+        """Take one token, waiting only as long as needed. Returns seconds waited."""
+        waited = 0.0
+        # The lock is FIFO, so waiters are served in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait_time = self.blocked_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    wait_time = (1 - self.tokens) / self.refill_rate
+                await asyncio.sleep(wait_time)
+                waited += wait_time
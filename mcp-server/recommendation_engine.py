@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Local content-based recommendation engine for the Spotify MCP Server
+Loads track audio-feature vectors into a contiguous float32 matrix and
+answers target-feature and seed-track queries with vectorized nearest-neighbour
+search, so recommendations work offline and carry real similarity scores.
+Catalogues of ANN_MIN_TRACKS or more tracks get a persisted IVF index
+(ann_index.IVFIndex) for seed-track queries, tuned with ANN_NPROBE.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ann_index import IVFIndex
+
+logger = logging.getLogger(__name__)
+
+# Audio features used as vector dimensions, in matrix column order
+FEATURE_COLUMNS = (
+    'danceability', 'energy', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo'
+)
+
+# Divisors mapping each feature onto [0, 1]; the others already are
+FEATURE_SCALE = {'tempo': 250.0}
+
+# Approximate search: catalogues at least this large are indexed
+ANN_MIN_TRACKS = int(os.getenv('ANN_MIN_TRACKS', '50000'))
+ANN_NPROBE = int(os.getenv('ANN_NPROBE', '8'))
+
+# Accepted spellings of the metadata columns (track_features.csv and the merged history CSV)
+ID_COLUMNS = ('track_uri', 'spotify_track_uri', 'uri', 'track_id', 'id')
+NAME_COLUMNS = ('track_name', 'master_metadata_track_name', 'name')
+ARTIST_COLUMNS = ('artist', 'artist_name', 'master_metadata_album_artist_name')
+ALBUM_COLUMNS = ('album', 'album_name', 'master_metadata_album_album_name')
+
+
+def track_uri(track: str) -> str:
+    """Normalize a Spotify track ID, URI or open.spotify.com URL to a ``spotify:track:`` URI"""
+    track = str(track).strip()
+    if track.startswith('spotify:track:'):
+        return track
+    if 'open.spotify.com/track/' in track:
+        track = track.split('open.spotify.com/track/', 1)[1].split('?', 1)[0]
+    return f'spotify:track:{track}'
+
+
+def _find_column(columns: Dict[str, str], candidates: Sequence[str]) -> Optional[str]:
+    for candidate in candidates:
+        if candidate in columns:
+            return columns[candidate]
+    return None
+
+
+class ContentBasedEngine:
+    """Nearest-neighbour search over track audio features
+
+    ``features`` is an ``(n_tracks, len(FEATURE_COLUMNS))`` C-contiguous
+    float32 matrix of features scaled to [0, 1]. Similarity is
+    ``1 - d / sqrt(k)`` for the Euclidean distance ``d`` over the ``k``
+    queried dimensions, so 1.0 is an exact match and 0.0 the farthest
+    possible track. Queries over all dimensions use ``index`` when one is
+    attached; queries on a subset of features scan the matrix exactly.
+    """
+
+    def __init__(self, track_uris: Sequence[str], features: np.ndarray,
+                 metadata: Optional[Dict[str, Sequence[Any]]] = None):
+        self.track_uris = np.asarray(track_uris, dtype=object)
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        if self.features.shape != (len(self.track_uris), len(FEATURE_COLUMNS)):
+            raise ValueError(f"Expected a ({len(self.track_uris)}, {len(FEATURE_COLUMNS)}) feature matrix, "
+                             f"got {self.features.shape}")
+        self.metadata = {key: np.asarray(values, dtype=object) for key, values in (metadata or {}).items()}
+        self._index = {uri: i for i, uri in enumerate(self.track_uris.tolist())}
+        self.index: Optional[IVFIndex] = None
+        self.nprobe = ANN_NPROBE
+
+    def __len__(self) -> int:
+        return len(self.track_uris)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "ContentBasedEngine":
+        """Build from a frame with a track URI/ID column and audio-feature columns
+
+        Column names are matched case-insensitively, so both the lower-case
+        ``track_features.csv`` and the merged history's ``Danceability`` ...
+        ``Tempo`` columns work. Repeated tracks keep their first row with
+        features; tracks without any feature are dropped and remaining gaps
+        are filled with the feature's mean.
+        """
+        columns = {str(column).strip().lower(): column for column in df.columns}
+        id_column = _find_column(columns, ID_COLUMNS)
+        if id_column is None:
+            raise ValueError("No track URI column found")
+        feature_columns = [columns[name] for name in FEATURE_COLUMNS if name in columns]
+        if not feature_columns:
+            raise ValueError("No audio feature columns found")
+
+        features = pd.DataFrame(index=df.index)
+        for name in FEATURE_COLUMNS:
+            values = pd.to_numeric(df[columns[name]], errors='coerce') if name in columns else np.nan
+            features[name] = values / FEATURE_SCALE.get(name, 1.0)
+        features = features.clip(0, 1)
+
+        has_features = features.notna().any(axis=1) & df[id_column].notna()
+        uris = df[id_column].astype(str).map(track_uri)
+        # Each track's first row that has features
+        keep = has_features & ~uris.where(has_features).duplicated(keep='first')
+
+        features = features[keep]
+        features = features.fillna(features.mean()).fillna(0.5)
+
+        metadata = {}
+        for key, candidates in (('track_name', NAME_COLUMNS), ('artist_name', ARTIST_COLUMNS),
+                                ('album_name', ALBUM_COLUMNS)):
+            column = _find_column(columns, candidates)
+            if column is not None:
+                metadata[key] = df.loc[keep, column].where(df.loc[keep, column].notna(), None).tolist()
+
+        return cls(uris[keep].tolist(), features.to_numpy(dtype=np.float32), metadata)
+
+    @classmethod
+    def from_csv(cls, path: str, index_path: Optional[str] = None) -> "ContentBasedEngine":
+        """Load from a CSV, reading only the ID, metadata and feature columns
+
+        Large catalogues also load (or build) their IVF index, kept at
+        ``index_path`` (default TRACK_INDEX_PATH or ``<path>.ivf``).
+        """
+        header = {str(column).strip().lower(): column for column in pd.read_csv(path, nrows=0).columns}
+        wanted = {name for name in FEATURE_COLUMNS if name in header}
+        for candidates in (ID_COLUMNS, NAME_COLUMNS, ARTIST_COLUMNS, ALBUM_COLUMNS):
+            found = next((candidate for candidate in candidates if candidate in header), None)
+            if found is not None:
+                wanted.add(found)
+        engine = cls.from_dataframe(pd.read_csv(path, usecols=[header[name] for name in wanted]))
+        logger.info(f"Loaded {len(engine)} track feature vectors from {path}")
+        if len(engine) >= ANN_MIN_TRACKS:
+            engine.load_index(index_path or os.getenv('TRACK_INDEX_PATH') or f'{path}.ivf')
+        return engine
+
+    def _uri_digest(self, rows: int) -> str:
+        digest = hashlib.sha1()
+        for uri in self.track_uris[:rows].tolist():
+            digest.update(uri.encode())
+            digest.update(b'\n')
+        return digest.hexdigest()
+
+    def load_index(self, path: str) -> IVFIndex:
+        """Attach the IVF index saved at ``path``, updating or rebuilding it as needed
+
+        An index built for an earlier version of the catalogue whose tracks
+        are a prefix of the current ones gets just the new tracks inserted;
+        any other mismatch triggers a rebuild. The index is saved if changed.
+        """
+        index = None
+        if os.path.isdir(path):
+            try:
+                index = IVFIndex.load(path)
+                rows = index.metadata.get('rows', -1)
+                if not 0 <= rows <= len(self) or index.metadata.get('uri_digest') != self._uri_digest(rows):
+                    logger.info(f"Rebuilding outdated track index {path}")
+                    index = None
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not load track index {path}: {e}")
+                index = None
+
+        if index is None:
+            index = IVFIndex.build(self.features, nprobe=self.nprobe)
+            rows = 0
+        else:
+            rows = index.metadata['rows']
+            if rows < len(self):
+                index.add(self.features[rows:], np.arange(rows, len(self)))
+                logger.info(f"Inserted {len(self) - rows} new tracks into {path}")
+
+        if index.metadata.get('rows') != len(self):
+            index.metadata = {'rows': len(self), 'uri_digest': self._uri_digest(len(self))}
+            try:
+                index.save(path)
+            except OSError as e:
+                logger.warning(f"Could not save track index {path}: {e}")
+
+        self.index = index
+        return index
+
+    def vector(self, features: Dict[str, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Scaled query vector and the indices of the dimensions given in ``features``"""
+        query = np.zeros(len(FEATURE_COLUMNS), dtype=np.float32)
+        dims = []
+        for dim, name in enumerate(FEATURE_COLUMNS):
+            if features.get(name) is not None:
+                query[dim] = min(max(float(features[name]) / FEATURE_SCALE.get(name, 1.0), 0.0), 1.0)
+                dims.append(dim)
+        return query, np.array(dims, dtype=np.intp)
+
+    def track_indices(self, tracks: Iterable[str]) -> List[int]:
+        """Matrix rows of the known tracks among ``tracks`` (IDs, URIs or URLs)"""
+        indices = (self._index.get(track_uri(track)) for track in tracks)
+        return [index for index in indices if index is not None]
+
+    def lookup_rows(self, tracks: Sequence[str]) -> np.ndarray:
+        """Matrix row of each of ``tracks``, -1 for unknown ones"""
+        index = self._index
+        return np.fromiter((index.get(track, -1) if track in index else index.get(track_uri(track), -1)
+                            for track in tracks), dtype=np.intp, count=len(tracks))
+
+    def search(self, query: np.ndarray, dims: Optional[np.ndarray] = None, k: int = 20,
+               exclude: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of the ``k`` most similar tracks and their similarities, best first"""
+        dims = np.arange(len(FEATURE_COLUMNS)) if dims is None or len(dims) == 0 else dims
+        exclude = np.fromiter(exclude, dtype=np.intp)
+
+        if self.index is not None and len(dims) == len(FEATURE_COLUMNS):
+            rows, distances = self.index.search(query, k + len(exclude), self.nprobe)
+            similarities = 1.0 - distances / np.sqrt(len(dims))
+            keep = ~np.isin(rows, exclude)
+            return rows[keep][:k].astype(np.intp), similarities[keep][:k]
+
+        if len(dims) == len(FEATURE_COLUMNS):
+            diff = self.features - query
+        else:
+            diff = self.features[:, dims] - query[dims]
+        distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        similarities = 1.0 - distances / np.sqrt(len(dims))
+
+        if len(exclude):
+            similarities[exclude] = -np.inf
+        k = min(k, len(similarities) - len(exclude))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        return top, similarities[top]
+
+    def query(self, target_features: Optional[Dict[str, float]] = None,
+              seed_tracks: Optional[Iterable[str]] = None, k: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        """Tracks closest to the seed tracks' centroid, adjusted by ``target_features``
+
+        Target features override the centroid on their dimensions. With only
+        targets, just those dimensions are compared. Seed tracks are never
+        returned.
+        """
+        seeds = self.track_indices(seed_tracks or [])
+        query, dims = self.vector(target_features or {})
+        if seeds:
+            centroid = self.features[seeds].mean(axis=0)
+            centroid[dims] = query[dims]
+            query, dims = centroid, None
+        elif len(dims) == 0:
+            raise ValueError("Need known seed tracks or target features for a local query")
+        return self.search(query, dims, k, exclude=seeds)
+
+    def recommendations(self, rows: np.ndarray, similarities: np.ndarray) -> List[Dict[str, Any]]:
+        """Recommendation records for search results, in the server's response format"""
+        results = []
+        for row, similarity in zip(rows.tolist(), similarities.tolist()):
+            uri = self.track_uris[row]
+            track_id = uri.rsplit(':', 1)[-1]
+            values = self.features[row]
+            results.append({
+                "track_id": track_id,
+                "track_uri": uri,
+                "track_name": self.metadata['track_name'][row] if 'track_name' in self.metadata else None,
+                "artist_name": self.metadata['artist_name'][row] if 'artist_name' in self.metadata else None,
+                "album_name": self.metadata['album_name'][row] if 'album_name' in self.metadata else None,
+                "external_url": f"https://open.spotify.com/track/{track_id}",
+                "features": {
+                    name: round(float(values[dim]) * FEATURE_SCALE.get(name, 1.0), 4)
+                    for dim, name in enumerate(FEATURE_COLUMNS)
+                },
+                "confidence_score": round(similarity, 4)
+            })
+        return results
+
+
+def default_features_path() -> Optional[str]:
+    """TRACK_FEATURES_PATH, or the repository's ml_datasets/track_features.csv if present"""
+    path = os.getenv('TRACK_FEATURES_PATH')
+    if path:
+        return path
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml_datasets', 'track_features.csv')
+    return os.path.normpath(default) if os.path.exists(default) else None
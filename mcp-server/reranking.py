@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Recommendation re-ranking for the Spotify MCP Server
+A final stage over each candidate batch: drop tracks the user keeps
+skipping (per skip_prediction_dataset.csv), then pick the returned tracks
+by maximal marginal relevance over audio-feature similarity with a cap on
+tracks per artist. Everything is array arithmetic on the batch; the greedy
+selection only loops over the ``k`` picks.
+"""
+
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 0 keeps the incoming order, 1 weighs novelty as much as relevance
+RERANK_DIVERSITY = float(os.getenv('RERANK_DIVERSITY', '0.3'))
+RERANK_MAX_PER_ARTIST = int(os.getenv('RERANK_MAX_PER_ARTIST', '2'))
+# A (user, track) pair is filtered once it was skipped this often over at least SKIP_MIN_PLAYS plays
+SKIP_RATE_THRESHOLD = float(os.getenv('SKIP_RATE_THRESHOLD', '0.7'))
+SKIP_MIN_PLAYS = 2
+
+
+def mmr_order(relevance: np.ndarray, similarity: np.ndarray, k: int, diversity: float = RERANK_DIVERSITY,
+              artists: Optional[np.ndarray] = None, max_per_artist: int = RERANK_MAX_PER_ARTIST) -> np.ndarray:
+    """Indices of ``k`` candidates chosen greedily by maximal marginal relevance
+
+    Each pick maximizes ``(1 - diversity) * relevance - diversity * s``,
+    where ``s`` is the candidate's highest similarity to the picks so far.
+    With ``artists`` (integer codes), an artist's candidates are passed over
+    once it has ``max_per_artist`` picks, unless nothing else is left.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    chosen = np.empty(k, dtype=np.intp)
+    base = (1.0 - diversity) * relevance
+    closest = np.zeros(n)
+    # 0 for eligible candidates, -inf once picked; capped artists are tracked separately
+    blocked = np.zeros(n)
+    capped = np.zeros(n)
+    artist_counts = np.zeros(int(artists.max()) + 1 if artists is not None and n else 0, dtype=np.intp)
+
+    for pick in range(k):
+        scores = base - diversity * closest + blocked
+        best = int(np.argmax(scores + capped))
+        if blocked[best] or capped[best]:
+            # Only capped artists are left; take the best candidate not yet picked
+            best = int(np.argmax(scores))
+        chosen[pick] = best
+        blocked[best] = -np.inf
+        np.maximum(closest, similarity[best], out=closest)
+        if artists is not None and max_per_artist > 0 and artists[best] >= 0:
+            artist_counts[artists[best]] += 1
+            if artist_counts[artists[best]] >= max_per_artist:
+                capped[artists == artists[best]] = -np.inf
+    return chosen
+
+
+class SkipFilter:
+    """Tracks each user has skipped heavily, from the skip-prediction dataset"""
+
+    def __init__(self, skipped: Dict[str, np.ndarray]):
+        self._skipped = skipped
+
+    def __len__(self) -> int:
+        return len(self._skipped)
+
+    @classmethod
+    def from_csv(cls, path: str, threshold: float = SKIP_RATE_THRESHOLD,
+                 min_plays: int = SKIP_MIN_PLAYS) -> "SkipFilter":
+        """Aggregate ``is_skip`` per (user_id, track_uri) and keep the pairs over ``threshold``"""
+        frame = pd.read_csv(path, usecols=['user_id', 'track_uri', 'is_skip']).dropna()
+        frame['is_skip'] = frame['is_skip'].astype(str).str.lower().isin(('true', '1', '1.0'))
+        stats = frame.groupby(['user_id', 'track_uri'], sort=False)['is_skip'].agg(['mean', 'size'])
+        heavy = stats[(stats['size'] >= min_plays) & (stats['mean'] >= threshold)].reset_index()
+        skipped = {str(user): np.asarray(group['track_uri'], dtype=str)
+                   for user, group in heavy.groupby('user_id', sort=False)}
+        logger.info(f"Loaded skip filter: {len(heavy)} heavily skipped tracks for {len(skipped)} users")
+        return cls(skipped)
+
+    def keep_mask(self, user_id: str, uris: Sequence[str]) -> np.ndarray:
+        """False for the ``uris`` this user skips heavily"""
+        skipped = self._skipped.get(user_id)
+        if skipped is None:
+            return np.ones(len(uris), dtype=bool)
+        return ~np.isin(np.asarray(uris, dtype=str), skipped)
+
+
+def rerank(recommendations: List[Dict[str, Any]], k: int, user_id: Optional[str] = None,
+           engine=None, skip_filter: Optional[SkipFilter] = None, diversity: float = RERANK_DIVERSITY,
+           max_per_artist: int = RERANK_MAX_PER_ARTIST) -> List[Dict[str, Any]]:
+    """The ``k`` records to return from a ranked candidate batch
+
+    Relevance is ``confidence_score`` scaled to [0, 1], or the incoming rank
+    when some candidates are unscored. Similarity is the content engine's
+    ``1 - d / sqrt(dims)`` over audio features; tracks it does not know
+    count as dissimilar to everything.
+    """
+    if not recommendations:
+        return recommendations
+    uris = [rec.get("track_uri") or f"spotify:track:{rec.get('track_id')}" for rec in recommendations]
+
+    if skip_filter is not None and user_id is not None:
+        keep = skip_filter.keep_mask(user_id, uris)
+        if not keep.all():
+            recommendations = [rec for rec, kept in zip(recommendations, keep) if kept]
+            uris = [uri for uri, kept in zip(uris, keep) if kept]
+
+    n = len(recommendations)
+    if n <= 1 or (diversity <= 0 and max_per_artist <= 0):
+        return recommendations[:k]
+
+    scores = [rec.get("confidence_score") for rec in recommendations]
+    if any(score is None for score in scores):
+        relevance = 1.0 - np.arange(n) / n
+    else:
+        relevance = np.asarray(scores, dtype=np.float64)
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n)
+
+    similarity = np.zeros((n, n))
+    if engine is not None and diversity > 0:
+        rows = engine.lookup_rows(uris)
+        known = np.flatnonzero(rows >= 0)
+        if len(known) > 1:
+            vectors = engine.features[rows[known]].astype(np.float64)
+            squared = np.einsum('ij,ij->i', vectors, vectors)
+            distances = np.sqrt(np.maximum(squared[:, None] + squared[None, :] - 2.0 * vectors @ vectors.T, 0))
+            similarity[np.ix_(known, known)] = 1.0 - distances / np.sqrt(vectors.shape[1])
+
+    artists = None
+    if max_per_artist > 0:
+        names = [rec.get("artist_name") for rec in recommendations]
+        codes = {name: code for code, name in enumerate(dict.fromkeys(names))}
+        artists = np.array([codes[name] if name else -1 for name in names], dtype=np.intp)
+
+    order = mmr_order(relevance, similarity, k, diversity, artists, max_per_artist)
+    return [recommendations[i] for i in order.tolist()]
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Mergeable streaming sketches for the Spotify MCP Server
+Fixed-size summaries that can be built per chunk of a large dataset and
+merged, so analyses over files larger than memory stay in constant space:
+SpaceSaving for top-K heavy hitters and HyperLogLog for distinct counts.
+"""
+
+import base64
+import heapq
+import math
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class SpaceSaving:
+    """Top-K heavy hitters (Metwally et al. Space-Saving) with weighted, mergeable updates
+
+    At most ``capacity`` items are monitored. Each monitored count is an
+    overestimate by at most its recorded error, and any unmonitored item
+    occurred at most ``floor`` times. Items whose true count exceeds
+    ``total / capacity`` are always monitored, so ``top(n)`` is exact for
+    skewed data such as play counts whenever ``n`` is well below capacity.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self.floor = 0
+        self._counts: Dict[Hashable, int] = {}
+        self._errors: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._counts
+
+    def update(self, item: Hashable, weight: int = 1) -> None:
+        """Count ``weight`` occurrences of ``item``"""
+        self.total += weight
+        if item in self._counts:
+            self._counts[item] += weight
+            return
+        if len(self._counts) >= self.capacity:
+            # Replace the smallest counter; the new item inherits its count as error
+            victim = min(self._counts, key=self._counts.__getitem__)
+            self.floor = max(self.floor, self._counts.pop(victim))
+            self._errors.pop(victim)
+        self._counts[item] = self.floor + weight
+        self._errors[item] = self.floor
+
+    def update_counts(self, counts: Iterable[Tuple[Hashable, int]], total: Optional[int] = None) -> None:
+        """Fold in exact ``(item, count)`` pairs, e.g. a chunk's ``value_counts().items()``
+
+        Only the ``capacity + 1`` largest pairs affect the result, so callers
+        holding sorted counts can pass just those along with the chunk's
+        ``total`` (which otherwise defaults to the sum of the pairs given).
+        """
+        chunk = SpaceSaving(self.capacity)
+        chunk._counts = {item: int(count) for item, count in counts if count > 0}
+        chunk._errors = dict.fromkeys(chunk._counts, 0)
+        chunk.total = sum(chunk._counts.values()) if total is None else int(total)
+        chunk._truncate()
+        self.merge(chunk)
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """Merge ``other`` into this sketch (Agarwal et al. mergeable summaries)"""
+        counts: Dict[Hashable, int] = {}
+        errors: Dict[Hashable, int] = {}
+        for item in self._counts.keys() | other._counts.keys():
+            counts[item] = self._counts.get(item, self.floor) + other._counts.get(item, other.floor)
+            errors[item] = self._errors.get(item, self.floor) + other._errors.get(item, other.floor)
+        self._counts, self._errors = counts, errors
+        self.floor += other.floor
+        self.total += other.total
+        self._truncate()
+        return self
+
+    def _truncate(self) -> None:
+        if len(self._counts) <= self.capacity:
+            return
+        kept = heapq.nlargest(self.capacity + 1, self._counts.items(), key=lambda pair: pair[1])
+        self.floor = max(self.floor, kept[-1][1])
+        self._counts = dict(kept[:-1])
+        self._errors = {item: self._errors[item] for item in self._counts}
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[Any, int]]:
+        """Up to ``n`` monitored items with their (over)estimated counts, largest first"""
+        ranked = sorted(self._counts.items(), key=lambda pair: pair[1], reverse=True)
+        return ranked if n is None else ranked[:n]
+
+    def error(self, item: Hashable) -> int:
+        """Upper bound on how much ``item``'s estimated count exceeds its true count"""
+        return self._errors.get(item, self.floor)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable state (items must be JSON values, e.g. strings)"""
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'floor': self.floor,
+            'items': [[item, count, self._errors[item]] for item, count in self._counts.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "SpaceSaving":
+        sketch = cls(state['capacity'])
+        sketch.total = state['total']
+        sketch.floor = state['floor']
+        sketch._counts = {item: count for item, count, _ in state['items']}
+        sketch._errors = {item: error for item, _, error in state['items']}
+        return sketch
+
+
+class HyperLogLog:
+    """Approximate distinct counting (Flajolet et al. HyperLogLog) in fixed, mergeable space
+
+    ``error`` is the target relative standard error; the sketch uses
+    ``2**precision`` one-byte registers with ``precision`` chosen so that
+    ``1.04 / sqrt(2**precision) <= error`` (16 KB for the default 1%).
+    Values are hashed with pandas' stable 64-bit hash, so sketches built in
+    different processes, or saved and reloaded, can be merged.
+    """
+
+    MIN_PRECISION = 4
+    MAX_PRECISION = 18
+
+    def __init__(self, error: float = 0.01, precision: Optional[int] = None):
+        if precision is None:
+            if not 0 < error < 1:
+                raise ValueError("error must be between 0 and 1")
+            precision = math.ceil(math.log2((1.04 / error) ** 2))
+        self.precision = min(max(precision, self.MIN_PRECISION), self.MAX_PRECISION)
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        """Relative standard error of ``count()``"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, values: Iterable[Any]) -> None:
+        """Add values (a Series, array or any iterable); missing values are ignored"""
+        if isinstance(values, pd.Series):
+            values = values.dropna()
+            if values.empty:
+                return
+            hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        else:
+            values = [value for value in values if value is not None]
+            if not values:
+                return
+            hashes = pd.util.hash_array(np.asarray(values, dtype=object))
+        self.update_hashes(hashes)
+
+    def update_hashes(self, hashes: np.ndarray) -> None:
+        """Add precomputed 64-bit hashes"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        remainder = hashes & np.uint64((1 << (64 - p)) - 1)
+        # Rank = position of the leftmost 1 bit in the remaining 64 - p bits
+        bit_length = np.frexp(remainder.astype(np.float64))[1]
+        rank = (64 - p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Union with ``other``; both sketches must use the same precision"""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """Estimated number of distinct values added"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable state"""
+        return {
+            'precision': self.precision,
+            'registers': base64.b64encode(self.registers.tobytes()).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(precision=state['precision'])
+        registers = np.frombuffer(base64.b64decode(state['registers']), dtype=np.uint8)
+        if len(registers) != len(sketch.registers):
+            raise ValueError("HyperLogLog state does not match its precision")
+        sketch.registers = registers.copy()
+        return sketch
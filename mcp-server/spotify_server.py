@@ -5,19 +5,29 @@ Provides comprehensive tools for Spotify API automation, music recommendation wo
 browser automation, and advanced data analysis
 """
 
+from __future__ import annotations
+
+import argparse
 import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import importlib
 import json
+import multiprocessing
 import os
 import sys
-from typing import Dict, List, Any, Optional, Union
+import threading
+from typing import Dict, List, Any, Optional, Tuple, Union
 import logging
 from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
-import aiohttp
 import time
+import sqlite3
+from collections import OrderedDict
 from pathlib import Path
 
+from rate_limiting import TokenBucketRateLimiter
+
 # Setup enhanced logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +35,180 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class _LazyModule:
+    """Module proxy that defers the real import until an attribute is first used
+    
+    pandas, numpy and aiohttp account for most of the server's import time but
+    are not needed to answer health_check in mock mode, so they are only loaded
+    by the tools that use them.
+    """
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+pd = _LazyModule('pandas')
+np = _LazyModule('numpy')
+aiohttp = _LazyModule('aiohttp')
+listening_analysis = _LazyModule('listening_analysis')
+recommendation_engine = _LazyModule('recommendation_engine')
+collaborative_filtering = _LazyModule('collaborative_filtering')
+candidate_store = _LazyModule('candidate_store')
+reranking = _LazyModule('reranking')
+
+def _run_analysis_job(data_file: str, analysis_type: Union[str, List[str]], cancel_event=None,
+                      **options) -> Dict[str, Any]:
+    """Executor entry point; the analysis module (and pandas) is imported in the worker"""
+    return listening_analysis.run_analysis(data_file, analysis_type, cancel_event, **options)
+
+class ResponseCache:
+    """In-process TTL + LRU cache with an optional SQLite backing store
+    
+    Values must be JSON-serialisable. When ``path`` is given, entries are also
+    written to disk so the cache survives restarts; memory misses fall back to
+    the disk copy before counting as a miss. Disk reads run in a worker
+    thread, and writes are queued and committed in batches off the event
+    loop, so SQLite never blocks request handling.
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 300, path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0, 'disk_writes': 0}
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._pending_writes: Dict[str, Tuple[str, float]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            # Used from worker threads, one at a time under _conn_lock
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    value TEXT,
+                    expires_at REAL
+                )
+            ''')
+            self._conn.execute('DELETE FROM response_cache WHERE expires_at < ?', (time.time(),))
+            self._conn.commit()
+    
+    @staticmethod
+    def make_key(params: Dict[str, Any]) -> str:
+        """Build a stable cache key from already-normalized parameters"""
+        return json.dumps(params, sort_keys=True, separators=(',', ':'))
+    
+    async def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return value
+            del self._entries[key]
+        
+        if self._conn is not None and key not in self._pending_writes:
+            row = await asyncio.to_thread(self._read, key)
+            if row and row[1] > now:
+                value = json.loads(row[0])
+                self._store(key, value, row[1])
+                self.stats['hits'] += 1
+                self.stats['disk_hits'] += 1
+                return value
+        
+        self.stats['misses'] += 1
+        return None
+    
+    async def set(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl
+        self._store(key, value, expires_at)
+        if self._conn is not None:
+            self._pending_writes[key] = (json.dumps(value), expires_at)
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_pending())
+    
+    def _store(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+    
+    def _read(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._conn_lock:
+            if self._conn is None:
+                return None
+            return self._conn.execute(
+                'SELECT value, expires_at FROM response_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+    
+    def _write(self, rows: List[Tuple[str, str, float]]):
+        """Write queued entries in one transaction"""
+        with self._conn_lock:
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO response_cache (cache_key, value, expires_at) VALUES (?, ?, ?)',
+                    rows
+                )
+            self.stats['disk_writes'] += 1
+    
+    def _take_pending(self) -> List[Tuple[str, str, float]]:
+        rows = [(key, value, expires_at) for key, (value, expires_at) in self._pending_writes.items()]
+        self._pending_writes.clear()
+        return rows
+    
+    async def _flush_pending(self):
+        # Yield once so writes from concurrently finishing requests share a commit
+        await asyncio.sleep(0)
+        while self._pending_writes:
+            rows = self._take_pending()
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist {len(rows)} cache entries: {e}")
+    
+    async def flush(self):
+        """Wait until every queued write is on disk"""
+        while self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0,
+            'persistent': self._conn is not None,
+            'pending_writes': len(self._pending_writes)
+        }
+    
+    def close(self):
+        """Write anything still queued, then close the database"""
+        if self._conn is not None:
+            if self._flush_task is not None and not self._flush_task.done():
+                self._flush_task.cancel()
+            if self._pending_writes:
+                self._write(self._take_pending())
+            with self._conn_lock:
+                self._conn.close()
+                self._conn = None
+
 class SpotifyMCPServer:
     """Enhanced MCP Server for Spotify API integration and automation"""
     
@@ -35,6 +219,9 @@ class SpotifyMCPServer:
         self.access_token = None
         self.refresh_token = None
         self.token_expires_at = None
+        self.token_refresh_margin = 60  # seconds before expiry to refresh in background
+        self._auth_task: Optional[asyncio.Task] = None
+        self._token_refresh_task: Optional[asyncio.Task] = None
         
         # Enhanced configuration
         self.api_base_url = "https://api.spotify.com/v1"
@@ -42,7 +229,57 @@ class SpotifyMCPServer:
         self.request_timeout = 30
         self.rate_limit_calls = 100
         self.rate_limit_period = 60
-        self.request_history = []
+        self.max_retries = 2
+        self.rate_limiter = TokenBucketRateLimiter(self.rate_limit_calls, self.rate_limit_period)
+        
+        # Connection pooling - one long-lived session per process
+        self.pool_limit = int(os.getenv('SPOTIFY_POOL_LIMIT', '100'))
+        self.pool_limit_per_host = int(os.getenv('SPOTIFY_POOL_LIMIT_PER_HOST', '20'))
+        self.keepalive_timeout = 30
+        self.dns_cache_ttl = 300
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.pool_stats = {
+            'sessions_created': 0,
+            'requests_sent': 0
+        }
+        
+        # CPU-bound analysis runs in a thread or process pool, off the event loop
+        self.analysis_executor_type = os.getenv('ANALYSIS_EXECUTOR', 'thread')
+        self.analysis_workers = int(os.getenv('ANALYSIS_WORKERS', str(min(4, os.cpu_count() or 1))))
+        self.analysis_timeout = float(os.getenv('ANALYSIS_TIMEOUT', '120'))
+        self._analysis_executor: Optional[concurrent.futures.Executor] = None
+        
+        # Recommendation response cache
+        self.recommendation_cache = ResponseCache(
+            max_size=int(os.getenv('RECOMMENDATION_CACHE_SIZE', '1024')),
+            ttl=float(os.getenv('RECOMMENDATION_CACHE_TTL', '300')),
+            path=os.getenv('RECOMMENDATION_CACHE_PATH')
+        )
+        # In-flight /recommendations fetches by cache key, shared by concurrent identical queries
+        self._recommendation_fetches: Dict[str, asyncio.Task] = {}
+        
+        # Local content-based engine over track audio features:
+        # 'auto' uses it without credentials or when the API fails, 'local' always, 'spotify' never
+        self.recommendation_engine_mode = os.getenv('RECOMMENDATION_ENGINE', 'auto')
+        self._local_engine = None
+        self._local_engine_stamp: Optional[Tuple[str, int]] = None
+        self._local_engine_lock: Optional[asyncio.Lock] = None
+        
+        # Collaborative-filtering (ALS) model trained by scripts/train_collaborative_model.py
+        self._cf_model = None
+        self._cf_model_stamp: Optional[Tuple[str, int]] = None
+        
+        # Per-user top-N candidates precomputed from that model, refreshed in the background
+        self.candidate_store_path = os.getenv('CANDIDATE_STORE_PATH')
+        self.candidate_refresh_interval = float(os.getenv('CANDIDATE_REFRESH_INTERVAL', '300'))
+        self._candidate_store = None
+        self._candidate_stamp: Optional[Tuple] = None
+        self._candidate_refresh_task: Optional[asyncio.Task] = None
+        
+        # Re-ranking: fetch this many times the requested tracks, then diversify and drop heavy skips
+        self.rerank_overfetch = max(1, int(os.getenv('RERANK_OVERFETCH', '3')))
+        self._skip_filter = None
+        self._skip_filter_stamp: Optional[Tuple[str, int]] = None
         
         # Initialize with mock data if credentials not available
         if not self.client_id or not self.client_secret:
@@ -62,6 +299,52 @@ class SpotifyMCPServer:
             'avg_response_time': 0
         }
         
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared pooled HTTP session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            )
+            self.pool_stats['sessions_created'] += 1
+            logger.debug("Created pooled HTTP session")
+        
+        self.pool_stats['requests_sent'] += 1
+        return self._session
+    
+    def _get_pool_stats(self) -> Dict[str, Any]:
+        """Report connection pool configuration and usage"""
+        return {
+            'session_open': self._session is not None and not self._session.closed,
+            'limit': self.pool_limit,
+            'limit_per_host': self.pool_limit_per_host,
+            'keepalive_timeout': self.keepalive_timeout,
+            'dns_cache_ttl': self.dns_cache_ttl,
+            **self.pool_stats
+        }
+    
+    async def close(self):
+        """Release pooled connections; call once on server shutdown"""
+        if self._token_refresh_task and not self._token_refresh_task.done():
+            self._token_refresh_task.cancel()
+        if self._candidate_refresh_task and not self._candidate_refresh_task.done():
+            self._candidate_refresh_task.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Closed pooled HTTP session")
+        self._session = None
+        self.recommendation_cache.close()
+        if self._analysis_executor is not None:
+            self._analysis_executor.shutdown(wait=False, cancel_futures=True)
+            self._analysis_executor = None
+        
     async def health_check(self) -> Dict[str, Any]:
         """Comprehensive health check for Spotify API and server status"""
         try:
@@ -73,7 +356,10 @@ class SpotifyMCPServer:
                     'api_available': True,
                     'auth_status': 'mock_mode',
                     'mock_mode': True,
-                    'response_time_ms': round((time.time() - start_time) * 1000, 2)
+                    'response_time_ms': round((time.time() - start_time) * 1000, 2),
+                    'connection_pool': self._get_pool_stats(),
+                    'recommendation_cache': self.recommendation_cache.get_stats(),
+                    'local_engine': self._get_local_engine_stats()
                 })
                 return {'status': 'healthy', 'details': self.health_status}
             
@@ -85,11 +371,10 @@ class SpotifyMCPServer:
                     return {'status': 'unhealthy', 'error': 'Authentication failed', 'details': self.health_status}
             
             # Test API connectivity
-            async with aiohttp.ClientSession() as session:
-                headers = {'Authorization': f'Bearer {self.access_token}'}
-                async with session.get(f"{self.api_base_url}/me", headers=headers, timeout=self.request_timeout) as response:
-                    api_available = response.status == 200
-                    
+            headers = {'Authorization': f'Bearer {self.access_token}'}
+            async with self._get_session().get(f"{self.api_base_url}/me", headers=headers) as response:
+                api_available = response.status == 200
+                
             response_time = round((time.time() - start_time) * 1000, 2)
             
             self.health_status.update({
@@ -97,7 +382,10 @@ class SpotifyMCPServer:
                 'api_available': api_available,
                 'auth_status': 'authenticated' if api_available else 'failed',
                 'response_time_ms': response_time,
-                'rate_limit_remaining': self._get_rate_limit_remaining()
+                'rate_limit_remaining': self._get_rate_limit_remaining(),
+                'connection_pool': self._get_pool_stats(),
+                'recommendation_cache': self.recommendation_cache.get_stats(),
+                'local_engine': self._get_local_engine_stats()
             })
             
             status = 'healthy' if api_available else 'unhealthy'
@@ -121,71 +409,97 @@ class SpotifyMCPServer:
         
     def _get_rate_limit_remaining(self) -> int:
         """Calculate remaining rate limit calls"""
-        current_time = time.time()
-        # Remove old requests outside the rate limit window
-        self.request_history = [req_time for req_time in self.request_history 
-                              if current_time - req_time < self.rate_limit_period]
-        return max(0, self.rate_limit_calls - len(self.request_history))
+        return self.rate_limiter.remaining()
         
     async def _rate_limit_check(self):
         """Check and enforce rate limiting"""
-        if self._get_rate_limit_remaining() <= 0:
-            wait_time = self.rate_limit_period
-            logger.warning(f"Rate limit reached, waiting {wait_time} seconds")
-            await asyncio.sleep(wait_time)
-        
-        self.request_history.append(time.time())
+        waited = await self.rate_limiter.acquire()
+        if waited > 0:
+            logger.warning(f"Rate limit reached, waited {waited:.2f} seconds")
+    
+    @staticmethod
+    def _parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+        """Parse a Retry-After header value in seconds"""
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return default
+    
+    async def _api_get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Tuple[int, Dict[str, Any]]:
+        """GET a Spotify API endpoint, honouring Retry-After on 429 responses"""
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        for attempt in range(self.max_retries + 1):
+            async with self._get_session().get(f"{self.api_base_url}{path}",
+                                               params=params, headers=headers) as response:
+                if response.status != 429 or attempt == self.max_retries:
+                    return response.status, await response.json()
+                retry_after = self._parse_retry_after(response.headers.get('Retry-After'))
+            
+            logger.warning(f"Spotify rate limited {path}, retrying after {retry_after} seconds")
+            self.rate_limiter.defer(retry_after)
+            await self._rate_limit_check()
             
     async def _make_auth_request(self, auth_data: Dict[str, str]) -> Dict[str, Any]:
         """Common method for making authentication requests to Spotify API"""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self.auth_url, data=auth_data, timeout=self.request_timeout) as response:
-                if response.status == 200:
-                    token_data = await response.json()
-                    self.access_token = token_data['access_token']
-                    expires_in = token_data.get('expires_in', 3600)
-                    self.token_expires_at = datetime.now() + timedelta(seconds=expires_in)
-                    
-                    # Update refresh token if provided
-                    if 'refresh_token' in token_data:
-                        self.refresh_token = token_data['refresh_token']
-                    
-                    return {
-                        "status": "authenticated", 
-                        "expires_in": expires_in,
-                        "token_type": token_data.get('token_type', 'Bearer')
-                    }
-                else:
-                    error_data = await response.json()
-                    return {
-                        "status": "error",
-                        "error": error_data.get('error', 'Authentication failed')
-                    }
+        async with self._get_session().post(self.auth_url, data=auth_data) as response:
+            if response.status == 200:
+                token_data = await response.json()
+                self.access_token = token_data['access_token']
+                expires_in = token_data.get('expires_in', 3600)
+                self.token_expires_at = datetime.now() + timedelta(seconds=expires_in)
+                
+                # Update refresh token if provided
+                if 'refresh_token' in token_data:
+                    self.refresh_token = token_data['refresh_token']
+                
+                return {
+                    "status": "authenticated", 
+                    "expires_in": expires_in,
+                    "token_type": token_data.get('token_type', 'Bearer')
+                }
+            else:
+                error_data = await response.json()
+                return {
+                    "status": "error",
+                    "error": error_data.get('error', 'Authentication failed')
+                }
 
     async def authenticate(self, refresh: bool = False) -> Dict[str, Any]:
-        """Enhanced authentication with Spotify API including token refresh"""
+        """Enhanced authentication with Spotify API including token refresh
+        
+        Concurrent callers share a single in-flight token request instead of
+        each posting to the accounts service.
+        """
         if self.mock_mode:
             self.health_status['auth_status'] = 'mock_authenticated'
             return {"status": "mock_authenticated", "expires_in": 3600}
-            
+        
+        if self._auth_task is None or self._auth_task.done():
+            self._auth_task = asyncio.create_task(self._authenticate(refresh))
+        # Shield so a cancelled caller does not abort the refresh for everyone else
+        return await asyncio.shield(self._auth_task)
+    
+    async def _authenticate(self, refresh: bool) -> Dict[str, Any]:
+        """Perform a single token request; use authenticate() instead"""
         try:
             await self._rate_limit_check()
             
             if refresh and self.refresh_token:
-                return await self._refresh_access_token()
-            
-            # For now, implement client credentials flow for public data
-            auth_data = {
-                'grant_type': 'client_credentials',
-                'client_id': self.client_id,
-                'client_secret': self.client_secret
-            }
-            
-            result = await self._make_auth_request(auth_data)
+                result = await self._refresh_access_token()
+            else:
+                # For now, implement client credentials flow for public data
+                auth_data = {
+                    'grant_type': 'client_credentials',
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret
+                }
+                
+                result = await self._make_auth_request(auth_data)
             
             if result["status"] == "authenticated":
                 self.health_status['auth_status'] = 'authenticated'
                 logger.info("Successfully authenticated with Spotify API")
+                self._schedule_token_refresh()
             else:
                 logger.error(f"Authentication failed: {result.get('error')}")
                 self.health_status['auth_status'] = 'failed'
@@ -197,6 +511,29 @@ class SpotifyMCPServer:
             self.health_status['auth_status'] = 'error'
             return {"status": "error", "error": str(e)}
     
+    def _schedule_token_refresh(self):
+        """(Re)arm the background task that renews the token before it expires"""
+        current = asyncio.current_task()
+        if (self._token_refresh_task and not self._token_refresh_task.done()
+                and self._token_refresh_task is not current):
+            self._token_refresh_task.cancel()
+        self._token_refresh_task = asyncio.create_task(self._token_refresh_loop())
+    
+    async def _token_refresh_loop(self):
+        """Refresh the token shortly before token_expires_at so requests never block on auth"""
+        retry_delay = 5
+        while self.token_expires_at:
+            remaining = (self.token_expires_at - datetime.now()).total_seconds()
+            await asyncio.sleep(max(0, remaining - self.token_refresh_margin))
+            
+            result = await self.authenticate(refresh=True)
+            if result.get('status') == 'authenticated':
+                # A fresh refresh loop was scheduled by the successful request
+                return
+            
+            logger.warning(f"Background token refresh failed, retrying in {retry_delay} seconds")
+            await asyncio.sleep(retry_delay)
+    
     async def _refresh_access_token(self) -> Dict[str, Any]:
         """Refresh the access token using refresh token"""
         try:
@@ -229,86 +566,84 @@ class SpotifyMCPServer:
         
         try:
             logger.info(f"Generating recommendations for user {user_id}")
-            await self._rate_limit_check()
-            
-            if self.mock_mode or not self.access_token:
-                return await self._get_mock_recommendations(user_id, limit, seed_genres, target_features)
-            
-            # Ensure we have valid authentication
-            if self._is_token_expired():
-                auth_result = await self.authenticate()
-                if auth_result.get('status') != 'authenticated':
-                    return {"user_id": user_id, "error": "Authentication failed", "status": "error"}
             
-            # Build recommendation parameters
-            params = {
-                'limit': min(limit, 100),  # Spotify API limit
-                'market': 'US'
-            }
+            if self.recommendation_engine_mode == 'local' or self.mock_mode or not self.access_token:
+                local = await self._get_local_recommendations(user_id, limit, seed_genres, target_features,
+                                                              seed_tracks, seed_artists)
+                if local is not None or self.recommendation_engine_mode == 'local':
+                    return local or {"user_id": user_id, "error": "Local recommendation engine unavailable",
+                                     "status": "error"}
+                await self._rate_limit_check()
+                return await self._get_mock_recommendations(user_id, limit, seed_genres, target_features,
+                                                            seed_tracks, seed_artists)
             
-            # Add seed parameters (at least one is required)
-            if seed_genres:
-                params['seed_genres'] = ','.join(seed_genres[:5])  # Max 5 seeds
-            if seed_tracks:
-                params['seed_tracks'] = ','.join(seed_tracks[:5])
-            if seed_artists:
-                params['seed_artists'] = ','.join(seed_artists[:5])
+            # Plain per-user requests come from the precomputed candidate store when it has the user
+            if not (seed_genres or seed_tracks or seed_artists or target_features):
+                precomputed = await self._get_precomputed_recommendations(user_id, limit)
+                if precomputed is not None:
+                    return precomputed
             
-            # Add target audio features
-            if target_features:
-                for feature, value in target_features.items():
-                    if feature in ['danceability', 'energy', 'valence', 'acousticness', 'instrumentalness', 'liveness', 'speechiness']:
-                        params[f'target_{feature}'] = max(0, min(1, value))
-                    elif feature in ['tempo', 'loudness']:
-                        params[f'target_{feature}'] = value
+            # Serve repeated requests from cache without touching the API or the rate limiter
+            params = self._build_recommendation_params(limit * self.rerank_overfetch, seed_genres,
+                                                       target_features, seed_tracks, seed_artists)
+            cache_key = ResponseCache.make_key(params)
+            cached = await self.recommendation_cache.get(cache_key)
+            if cached is not None:
+                recommendations = await self._score_recommendations(user_id, cached, seed_tracks)
+                recommendations = await self._rerank_recommendations(user_id, recommendations, limit)
+                return {
+                    "user_id": user_id,
+                    "recommendations": recommendations,
+                    "total_count": len(recommendations),
+                    "seed_genres": seed_genres or [],
+                    "seed_tracks": seed_tracks or [],
+                    "seed_artists": seed_artists or [],
+                    "target_features": target_features or {},
+                    "generated_at": datetime.now().isoformat(),
+                    "cached": True,
+                    "status": "success"
+                }
             
-            # Make API request
-            headers = {'Authorization': f'Bearer {self.access_token}'}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.api_base_url}/recommendations", 
-                                     params=params, headers=headers, timeout=self.request_timeout) as response:
-                    self.health_status['total_requests'] += 1
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        tracks = data.get('tracks', [])
-                        
-                        recommendations = []
-                        for track in tracks:
-                            rec = {
-                                "track_id": track['id'],
-                                "track_name": track['name'],
-                                "artist_name": ", ".join([artist['name'] for artist in track['artists']]),
-                                "album_name": track['album']['name'],
-                                "external_url": track['external_urls']['spotify'],
-                                "preview_url": track.get('preview_url'),
-                                "duration_ms": track['duration_ms'],
-                                "popularity": track['popularity'],
-                                "confidence_score": np.random.uniform(0.7, 0.95)  # Mock confidence for now
-                            }
-                            recommendations.append(rec)
-                        
-                        return {
-                            "user_id": user_id,
-                            "recommendations": recommendations,
-                            "total_count": len(recommendations),
-                            "seed_genres": seed_genres or [],
-                            "seed_tracks": seed_tracks or [],
-                            "seed_artists": seed_artists or [],
-                            "target_features": target_features or {},
-                            "generated_at": datetime.now().isoformat(),
-                            "status": "success"
-                        }
-                    else:
-                        self.health_status['failed_requests'] += 1
-                        error_data = await response.json()
-                        logger.error(f"Spotify API error: {error_data}")
-                        return {
-                            "user_id": user_id,
-                            "error": error_data.get('error', {}).get('message', 'API request failed'),
-                            "status": "error"
-                        }
+            # Concurrent requests for the same query (from any user) share one API call;
+            # scoring and re-ranking below stay per user
+            fetch = self._recommendation_fetches.get(cache_key)
+            if fetch is None:
+                fetch = asyncio.create_task(self._fetch_recommendation_tracks(params, cache_key))
+                self._recommendation_fetches[cache_key] = fetch
+                fetch.add_done_callback(lambda _: self._recommendation_fetches.pop(cache_key, None))
+            # Shield so a cancelled caller does not abort the fetch for everyone else
+            status, data = await asyncio.shield(fetch)
+            if status is None:
+                return {"user_id": user_id, "error": "Authentication failed", "status": "error"}
             
+            if status == 200:
+                recommendations = await self._score_recommendations(user_id, data, seed_tracks)
+                recommendations = await self._rerank_recommendations(user_id, recommendations, limit)
+                
+                return {
+                    "user_id": user_id,
+                    "recommendations": recommendations,
+                    "total_count": len(recommendations),
+                    "seed_genres": seed_genres or [],
+                    "seed_tracks": seed_tracks or [],
+                    "seed_artists": seed_artists or [],
+                    "target_features": target_features or {},
+                    "generated_at": datetime.now().isoformat(),
+                    "status": "success"
+                }
+            else:
+                self.health_status['failed_requests'] += 1
+                logger.error(f"Spotify API error: {data}")
+                local = await self._get_local_recommendations(user_id, limit, seed_genres, target_features,
+                                                              seed_tracks, seed_artists)
+                if local is not None:
+                    return local
+                return {
+                    "user_id": user_id,
+                    "error": data.get('error', {}).get('message', 'API request failed'),
+                    "status": "error"
+                }
+    
         except Exception as e:
             logger.error(f"Error generating recommendations: {e}")
             self.health_status['failed_requests'] += 1
@@ -318,50 +653,418 @@ class SpotifyMCPServer:
                 "status": "error"
             }
     
-    async def _get_mock_recommendations(self, user_id: str, limit: int, 
-                                      seed_genres: Optional[List[str]] = None,
-                                      target_features: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
-        """Generate mock recommendations for testing"""
+    async def _fetch_recommendation_tracks(self, params: Dict[str, Any],
+                                           cache_key: str) -> Tuple[Optional[int], Any]:
+        """Call /recommendations and cache the unscored track records
         
-        # Enhanced mock data based on seeds
-        genres = seed_genres or ["pop", "rock", "electronic"]
-        artists = ["The Weeknd", "Dua Lipa", "Ed Sheeran", "Taylor Swift", "Drake"]
+        Returns ``(200, records)``, ``(status, error body)`` on an API error,
+        or ``(None, None)`` when authentication fails.
+        """
+        await self._rate_limit_check()
         
-        mock_recommendations = []
-        for i in range(limit):
-            genre = np.random.choice(genres)
-            artist = np.random.choice(artists)
-            
-            # Generate realistic audio features
-            features = {
-                "danceability": np.random.uniform(0.3, 0.9),
-                "energy": np.random.uniform(0.2, 0.8),
-                "valence": np.random.uniform(0.1, 0.9),
-                "acousticness": np.random.uniform(0.0, 0.6),
-                "tempo": np.random.uniform(80, 160)
+        # Ensure we have valid authentication
+        if self._is_token_expired():
+            auth_result = await self.authenticate()
+            if auth_result.get('status') != 'authenticated':
+                return None, None
+        
+        # Make API request
+        status, data = await self._api_get("/recommendations", params)
+        self.health_status['total_requests'] += 1
+        if status != 200:
+            return status, data
+        
+        recommendations = []
+        for track in data.get('tracks', []):
+            rec = {
+                "track_id": track['id'],
+                "track_name": track['name'],
+                "artist_name": ", ".join([artist['name'] for artist in track['artists']]),
+                "album_name": track['album']['name'],
+                "external_url": track['external_urls']['spotify'],
+                "preview_url": track.get('preview_url'),
+                "duration_ms": track['duration_ms'],
+                "popularity": track['popularity']
             }
-            
-            # Adjust features based on target_features if provided
-            if target_features:
-                for feature, target_value in target_features.items():
-                    if feature in features:
-                        # Adjust towards target with some variance
-                        features[feature] = np.clip(
-                            np.random.normal(target_value, 0.1), 0, 1
+            recommendations.append(rec)
+        
+        # Cached unscored: scores depend on the user, the cache key does not
+        await self.recommendation_cache.set(cache_key, recommendations)
+        return status, recommendations
+    
+    @staticmethod
+    def _build_recommendation_params(limit: int,
+                                     seed_genres: Optional[List[str]] = None,
+                                     target_features: Optional[Dict[str, float]] = None,
+                                     seed_tracks: Optional[List[str]] = None,
+                                     seed_artists: Optional[List[str]] = None,
+                                     market: str = 'US') -> Dict[str, Any]:
+        """Build normalized /recommendations query parameters
+        
+        Seeds are de-duplicated and sorted and target values are clamped and
+        rounded, so equivalent requests map to the same parameters (and cache key).
+        """
+        params = {
+            'limit': min(limit, 100),  # Spotify API limit
+            'market': market
+        }
+        
+        # Add seed parameters (at least one is required, max 5 each)
+        for name, seeds in (('seed_genres', seed_genres),
+                            ('seed_tracks', seed_tracks),
+                            ('seed_artists', seed_artists)):
+            if seeds:
+                params[name] = ','.join(sorted(set(seeds[:5])))
+        
+        # Add target audio features
+        if target_features:
+            for feature, value in target_features.items():
+                if feature in ['danceability', 'energy', 'valence', 'acousticness', 'instrumentalness', 'liveness', 'speechiness']:
+                    params[f'target_{feature}'] = round(max(0, min(1, value)), 2)
+                elif feature == 'tempo':
+                    params['target_tempo'] = round(max(0, value), 1)
+                elif feature == 'loudness':
+                    params['target_loudness'] = round(value, 1)
+        
+        return params
+    
+    async def _get_local_engine(self):
+        """Return the content-based engine, (re)loading it off the event loop when its file changes"""
+        if self.recommendation_engine_mode == 'spotify':
+            return None
+        if self._local_engine_lock is None:
+            self._local_engine_lock = asyncio.Lock()
+        
+        async with self._local_engine_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                path = await loop.run_in_executor(None, recommendation_engine.default_features_path)
+                if path is None or not os.path.exists(path):
+                    return None
+                stamp = (path, os.stat(path).st_mtime_ns)
+                if stamp != self._local_engine_stamp:
+                    self._local_engine = await loop.run_in_executor(
+                        None, recommendation_engine.ContentBasedEngine.from_csv, path
+                    )
+                    self._local_engine_stamp = stamp
+            except Exception as e:
+                logger.warning(f"Local recommendation engine unavailable: {e}")
+                return None
+            return self._local_engine
+    
+    async def _get_cf_model(self):
+        """Return the collaborative-filtering model, (re)loading it when it is retrained"""
+        if self.recommendation_engine_mode == 'spotify':
+            return None
+        if self._local_engine_lock is None:
+            self._local_engine_lock = asyncio.Lock()
+        
+        async with self._local_engine_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                path = await loop.run_in_executor(None, collaborative_filtering.default_model_path)
+                meta = os.path.join(path, 'meta.json') if path else None
+                if meta is None or not os.path.exists(meta):
+                    return None
+                stamp = (path, os.stat(meta).st_mtime_ns)
+                if stamp != self._cf_model_stamp:
+                    self._cf_model = await loop.run_in_executor(
+                        None, collaborative_filtering.ImplicitALS.load, path
+                    )
+                    self._cf_model_stamp = stamp
+            except Exception as e:
+                logger.warning(f"Collaborative-filtering model unavailable: {e}")
+                return None
+            return self._cf_model
+    
+    async def _get_skip_filter(self):
+        """Return the per-user skip filter, (re)loading it when the skip-prediction dataset changes"""
+        if self._local_engine_lock is None:
+            self._local_engine_lock = asyncio.Lock()
+        
+        async with self._local_engine_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                path = await loop.run_in_executor(
+                    None, candidate_store.default_dataset_path, 'skip_prediction_dataset.csv'
+                )
+                if not os.path.exists(path):
+                    return None
+                stamp = (path, os.stat(path).st_mtime_ns)
+                if stamp != self._skip_filter_stamp:
+                    self._skip_filter = await loop.run_in_executor(None, reranking.SkipFilter.from_csv, path)
+                    self._skip_filter_stamp = stamp
+            except Exception as e:
+                logger.warning(f"Skip filter unavailable: {e}")
+                return None
+            return self._skip_filter
+    
+    def _start_candidate_refresh(self):
+        """Start the background candidate refresh unless it is running (or, with no interval, already ran once)"""
+        task = self._candidate_refresh_task
+        if task is None or (task.done() and self.candidate_refresh_interval > 0):
+            self._candidate_refresh_task = asyncio.create_task(self._candidate_refresh_loop())
+    
+    async def _candidate_refresh_loop(self):
+        """Refresh the candidate store whenever the model, interactions or user list change
+        
+        Only users whose interactions changed are recomputed (all of them after
+        retraining); requests keep being served from the previous store, and
+        by live scoring on a miss, while a refresh runs.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                model = await self._get_cf_model()
+                path = self.candidate_store_path or candidate_store.default_dataset_path('candidates')
+                users_path = candidate_store.default_dataset_path('user_features.csv')
+                interactions_path = candidate_store.default_dataset_path('user_track_interactions.csv')
+                if model is not None and os.path.exists(users_path):
+                    stamp = (self._cf_model_stamp,) + tuple(
+                        os.stat(source).st_mtime_ns if os.path.exists(source) else None
+                        for source in (users_path, interactions_path)
+                    )
+                    if stamp != self._candidate_stamp:
+                        model_id = candidate_store.model_id(*self._cf_model_stamp)
+                        self._candidate_store = await loop.run_in_executor(
+                            None, functools.partial(candidate_store.refresh_store, path, model, users_path,
+                                                    interactions_path, model_id)
                         )
-            
-            mock_recommendations.append({
+                        self._candidate_stamp = stamp
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Candidate store refresh failed: {e}")
+            if self.candidate_refresh_interval <= 0:
+                return
+            await asyncio.sleep(self.candidate_refresh_interval)
+    
+    def _get_local_engine_stats(self) -> Dict[str, Any]:
+        """Report the local engine's mode and what it has loaded"""
+        return {
+            'mode': self.recommendation_engine_mode,
+            'loaded': self._local_engine is not None,
+            'tracks': len(self._local_engine) if self._local_engine is not None else 0,
+            'source': self._local_engine_stamp[0] if self._local_engine_stamp else None,
+            'collaborative_users': len(self._cf_model) if self._cf_model is not None else 0,
+            'collaborative_source': self._cf_model_stamp[0] if self._cf_model_stamp else None,
+            'precomputed_users': len(self._candidate_store) if self._candidate_store is not None else 0
+        }
+    
+    async def _get_local_recommendations(self, user_id: str, limit: int,
+                                       seed_genres: Optional[List[str]] = None,
+                                       target_features: Optional[Dict[str, float]] = None,
+                                       seed_tracks: Optional[List[str]] = None,
+                                       seed_artists: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Recommend from local models; None when neither can answer the query
+        
+        Plain requests for a user in the candidate store are served from it.
+        Otherwise the collaborative-filtering model scores known users or
+        seed tracks live unless target features are given, and the
+        content-based engine answers the rest. Each source returns extra
+        candidates for the re-ranking stage to choose ``limit`` from.
+        """
+        engine = await self._get_local_engine()
+        model = await self._get_cf_model() if not target_features else None
+        loop = asyncio.get_running_loop()
+        recommendations = None
+        fetch = limit * self.rerank_overfetch
+        
+        if model is not None:
+            recommendations = self._lookup_precomputed(user_id, limit, engine) if not seed_tracks else None
+            if recommendations is not None:
+                source = "precomputed"
+            else:
+                try:
+                    rows, scores = await loop.run_in_executor(
+                        None, functools.partial(model.recommend, user_id, seed_tracks or [], fetch)
+                    )
+                    recommendations = self._describe_tracks(engine, model.tracks[rows].tolist(), scores.tolist())
+                    source = "collaborative"
+                except ValueError as e:
+                    logger.debug(f"Collaborative model cannot answer query: {e}")
+        
+        if recommendations is None:
+            if engine is None:
+                return None
+            try:
+                rows, similarities = await loop.run_in_executor(
+                    None, functools.partial(engine.query, target_features, seed_tracks, fetch)
+                )
+            except ValueError as e:
+                logger.debug(f"Local engine cannot answer query: {e}")
+                return None
+            recommendations = engine.recommendations(rows, similarities)
+            source = "local"
+        
+        recommendations = await self._rerank_recommendations(user_id, recommendations, limit)
+        return {
+            "user_id": user_id,
+            "recommendations": recommendations,
+            "total_count": len(recommendations),
+            "seed_genres": seed_genres or [],
+            "seed_tracks": seed_tracks or [],
+            "seed_artists": seed_artists or [],
+            "target_features": target_features or {},
+            "generated_at": datetime.now().isoformat(),
+            "engine": source,
+            "status": "success"
+        }
+    
+    def _lookup_precomputed(self, user_id: str, limit: int, engine) -> Optional[List[Dict[str, Any]]]:
+        """Stored candidates for ``user_id`` (``limit`` times the re-rank overfetch), or None if not stored
+        
+        Callers must have loaded the collaborative model, which the background
+        refresh started here builds the store from.
+        """
+        self._start_candidate_refresh()
+        store = self._candidate_store
+        if store is None or limit > store.depth:
+            return None
+        candidates = store.lookup(user_id, min(limit * self.rerank_overfetch, store.depth))
+        return self._describe_tracks(engine, *candidates) if candidates is not None else None
+    
+    async def _get_precomputed_recommendations(self, user_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        """Serve a plain (unseeded) request from the candidate store; None if the user is not in it"""
+        if await self._get_cf_model() is None:
+            return None
+        engine = await self._get_local_engine()
+        recommendations = self._lookup_precomputed(user_id, limit, engine)
+        if recommendations is None:
+            return None
+        recommendations = await self._rerank_recommendations(user_id, recommendations, limit)
+        return {
+            "user_id": user_id,
+            "recommendations": recommendations,
+            "total_count": len(recommendations),
+            "seed_genres": [],
+            "seed_tracks": [],
+            "seed_artists": [],
+            "target_features": {},
+            "generated_at": datetime.now().isoformat(),
+            "engine": "precomputed",
+            "status": "success"
+        }
+    
+    @staticmethod
+    def _describe_tracks(engine, uris: List[str], scores: List[float]) -> List[Dict[str, Any]]:
+        """Records for scored track URIs, with names and features from the content engine when it knows the track"""
+        recommendations = []
+        for uri, score in zip(uris, scores):
+            known = engine.track_indices([uri]) if engine is not None else []
+            if known:
+                rec = engine.recommendations(np.array(known), np.array([0.0]))[0]
+            else:
+                track_id = uri.rsplit(':', 1)[-1]
+                rec = {
+                    "track_id": track_id,
+                    "track_uri": uri,
+                    "external_url": f"https://open.spotify.com/track/{track_id}"
+                }
+            rec["confidence_score"] = round(score, 4)
+            recommendations.append(rec)
+        return recommendations
+    
+    async def _rerank_recommendations(self, user_id: str, recommendations: List[Dict[str, Any]],
+                                      limit: int) -> List[Dict[str, Any]]:
+        """Pick ``limit`` of the candidates: drop the user's heavy skips, then diversify by audio features and artist"""
+        engine = await self._get_local_engine()
+        skip_filter = await self._get_skip_filter()
+        return reranking.rerank(recommendations, limit, user_id, engine, skip_filter)
+    
+    async def _score_recommendations(self, user_id: str, recommendations: List[Dict[str, Any]],
+                                     seed_tracks: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Attach the collaborative model's predicted preference as each track's confidence_score
+        
+        Tracks are re-ordered by score, unscored ones (unknown to the model, or
+        no model loaded) last with a confidence_score of None.
+        """
+        model = await self._get_cf_model()
+        scores = (model.score(user_id, [rec["track_id"] for rec in recommendations], seed_tracks or [])
+                  if model is not None else [None] * len(recommendations))
+        scored = [dict(rec, confidence_score=None if score is None else round(score, 4))
+                  for rec, score in zip(recommendations, scores)]
+        scored.sort(key=lambda rec: (rec["confidence_score"] is None, -(rec["confidence_score"] or 0.0)))
+        return scored
+    
+    # Mock audio features: name -> (low, high) of the uniform draw
+    MOCK_FEATURE_RANGES = {
+        "danceability": (0.3, 0.9),
+        "energy": (0.2, 0.8),
+        "valence": (0.1, 0.9),
+        "acousticness": (0.0, 0.6),
+        "tempo": (80, 160)
+    }
+    MOCK_ARTISTS = ["The Weeknd", "Dua Lipa", "Ed Sheeran", "Taylor Swift", "Drake"]
+    
+    @classmethod
+    def _mock_seed(cls, user_id: str, seed_genres: Optional[List[str]] = None,
+                   target_features: Optional[Dict[str, float]] = None,
+                   seed_tracks: Optional[List[str]] = None,
+                   seed_artists: Optional[List[str]] = None) -> int:
+        """Stable RNG seed for a mock request, independent of process and argument order"""
+        params = cls._build_recommendation_params(0, seed_genres, target_features, seed_tracks, seed_artists)
+        params['user_id'] = user_id
+        digest = hashlib.sha256(ResponseCache.make_key(params).encode()).digest()
+        return int.from_bytes(digest[:8], 'little')
+    
+    async def _get_mock_recommendations(self, user_id: str, limit: int, 
+                                      seed_genres: Optional[List[str]] = None,
+                                      target_features: Optional[Dict[str, float]] = None,
+                                      seed_tracks: Optional[List[str]] = None,
+                                      seed_artists: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Generate mock recommendations for testing
+        
+        Every field is drawn for the whole batch at once from a Generator seeded
+        by the user and the seeds, so the same request always returns the same
+        tracks and tens of thousands of them can be generated for load tests.
+        """
+        
+        # Enhanced mock data based on seeds (sorted so seed order does not matter)
+        genres = sorted(set(seed_genres)) if seed_genres else ["pop", "rock", "electronic"]
+        artists = self.MOCK_ARTISTS
+        rng = np.random.default_rng(self._mock_seed(user_id, seed_genres, target_features,
+                                                    seed_tracks, seed_artists))
+        
+        genre_index = rng.integers(len(genres), size=limit)
+        artist_index = rng.integers(len(artists), size=limit)
+        
+        # Generate realistic audio features, one column per feature
+        feature_names = list(self.MOCK_FEATURE_RANGES)
+        low, high = np.array(list(self.MOCK_FEATURE_RANGES.values()), dtype=float).T
+        feature_values = rng.uniform(low, high, size=(limit, len(feature_names)))
+        
+        # Adjust features towards target_features (with some variance) if provided
+        target_features = target_features or {}
+        for column, feature in enumerate(feature_names):
+            if feature in target_features:
+                target_value = target_features[feature]
+                if feature == 'tempo':
+                    feature_values[:, column] = np.maximum(rng.normal(target_value, 10, size=limit), 0)
+                else:
+                    feature_values[:, column] = np.clip(rng.normal(target_value, 0.1, size=limit), 0, 1)
+        
+        durations = rng.integers(120000, 300000, size=limit).tolist()
+        popularity = rng.integers(20, 100, size=limit).tolist()
+        confidence = rng.uniform(0.6, 0.95, size=limit).tolist()
+        genre_titles = [genre.title() for genre in genres]
+        
+        mock_recommendations = [
+            {
                 "track_id": f"spotify:track:mock_{i}_{user_id}",
-                "track_name": f"{genre.title()} Track {i+1}",
-                "artist_name": artist,
-                "album_name": f"{genre.title()} Album",
+                "track_name": f"{genre_titles[g]} Track {i+1}",
+                "artist_name": artists[a],
+                "album_name": f"{genre_titles[g]} Album",
                 "external_url": f"https://open.spotify.com/track/mock_{i}",
                 "preview_url": f"https://p.scdn.co/mp3-preview/mock_{i}",
-                "duration_ms": np.random.randint(120000, 300000),
-                "popularity": np.random.randint(20, 100),
-                "features": features,
-                "confidence_score": np.random.uniform(0.6, 0.95)
-            })
+                "duration_ms": durations[i],
+                "popularity": popularity[i],
+                "features": dict(zip(feature_names, values)),
+                "confidence_score": confidence[i]
+            }
+            for i, (g, a, values) in enumerate(zip(genre_index.tolist(), artist_index.tolist(),
+                                                    feature_values.tolist()))
+        ]
         
         return {
             "user_id": user_id,
@@ -625,13 +1328,53 @@ class SpotifyMCPServer:
             "status": "success"
         }
     
-    async def analyze_listening_data(self, data_file: str, analysis_type: str,
-                                   time_range: Optional[str] = None) -> Dict[str, Any]:
-        """Enhanced analysis of user listening patterns from CSV data"""
+    def _get_analysis_executor(self) -> concurrent.futures.Executor:
+        """Return the pool that runs CPU-bound pandas analyses, creating it on first use"""
+        if self._analysis_executor is None:
+            if self.analysis_executor_type == 'process':
+                self._analysis_executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.analysis_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self._analysis_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.analysis_workers,
+                    thread_name_prefix='analysis'
+                )
+        return self._analysis_executor
+    
+    async def analyze_listening_data(self, data_file: str, analysis_type: Union[str, List[str]],
+                                   time_range: Optional[str] = None,
+                                   timeout: Optional[float] = None,
+                                   streaming: Optional[bool] = None,
+                                   approximate: bool = False,
+                                   incremental: Optional[bool] = None) -> Dict[str, Any]:
+        """Enhanced analysis of user listening patterns from CSV data
+        
+        ``analysis_type`` may be a list, in which case all analyses are computed
+        from one load and returned under ``results`` keyed by type. ``streaming``
+        forces (or disables) chunked analysis in constant memory; by default
+        files above ANALYSIS_STREAMING_THRESHOLD_MB are streamed. ``approximate``
+        reports HyperLogLog estimates (ANALYSIS_DISTINCT_ERROR) for distinct
+        counts, which streaming mode always does. Streamed aggregates are
+        persisted per file and later calls fold in only appended rows unless
+        ``incremental`` is False (default ANALYSIS_INCREMENTAL). The pandas
+        work runs in the analysis executor so the event loop stays responsive;
+        calls exceeding ``timeout`` (default ``analysis_timeout``) are abandoned
+        and, in thread mode, signalled to stop.
+        """
         
         try:
             logger.info(f"Analyzing listening data from {data_file} - type: {analysis_type}")
             
+            analysis_results = {
+                "data_file": data_file,
+                "analysis_type": analysis_type,
+                "time_range": time_range,
+                "analyzed_at": datetime.now().isoformat(),
+                "status": "success"
+            }
+            
             # Check if file exists
             if not os.path.exists(data_file):
                 return {
@@ -640,35 +1383,39 @@ class SpotifyMCPServer:
                     "status": "error"
                 }
             
-            # Load and analyze data
-            df = pd.read_csv(data_file)
-            logger.info(f"Loaded {len(df)} records from {data_file}")
-            
-            analysis_results = {
-                "data_file": data_file,
-                "analysis_type": analysis_type,
-                "time_range": time_range,
-                "analyzed_at": datetime.now().isoformat(),
-                "total_records": len(df),
-                "status": "success"
-            }
+            if timeout is None:
+                timeout = self.analysis_timeout
+            elif timeout <= 0:
+                return {
+                    "data_file": data_file,
+                    "error": f"timeout must be positive, got {timeout}",
+                    "status": "error"
+                }
             
-            if analysis_type == "summary":
-                analysis_results.update(await self._analyze_summary(df))
-            elif analysis_type == "temporal":
-                analysis_results.update(await self._analyze_temporal_patterns(df))
-            elif analysis_type == "genre_preferences":
-                analysis_results.update(await self._analyze_genre_preferences(df))
-            elif analysis_type == "listening_habits":
-                analysis_results.update(await self._analyze_listening_habits(df))
-            elif analysis_type == "recommendations_prep":
-                analysis_results.update(await self._prepare_recommendation_features(df))
-            else:
+            # Process pools cannot share a threading.Event; their queued work is still cancelled
+            cancel_event = threading.Event() if self.analysis_executor_type != 'process' else None
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._get_analysis_executor(),
+                functools.partial(
+                    _run_analysis_job, data_file, analysis_type, cancel_event,
+                    streaming=streaming, approximate=approximate, incremental=incremental
+                )
+            )
+            try:
+                analysis_results.update(await asyncio.wait_for(future, timeout=timeout))
+            except ValueError as e:
+                return {**analysis_results, "error": str(e), "status": "error"}
+            except asyncio.TimeoutError:
+                logger.warning(f"Analysis of {data_file} timed out after {timeout} seconds")
                 return {
                     **analysis_results,
-                    "error": f"Unknown analysis type: {analysis_type}",
+                    "error": f"Analysis timed out after {timeout} seconds",
                     "status": "error"
                 }
+            finally:
+                if cancel_event is not None and not future.done():
+                    cancel_event.set()
             
             return analysis_results
             
@@ -681,180 +1428,6 @@ class SpotifyMCPServer:
                 "status": "error"
             }
     
-    async def _analyze_summary(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Generate comprehensive summary statistics"""
-        
-        summary = {
-            "total_tracks": len(df),
-            "unique_tracks": df['spotify_track_uri'].nunique() if 'spotify_track_uri' in df.columns else 0,
-            "unique_artists": df['master_metadata_album_artist_name'].nunique() if 'master_metadata_album_artist_name' in df.columns else 0,
-            "unique_albums": df['master_metadata_album_album_name'].nunique() if 'master_metadata_album_album_name' in df.columns else 0,
-        }
-        
-        # Time-based analysis
-        if 'ms_played' in df.columns:
-            summary.update({
-                "total_listening_time_ms": int(df['ms_played'].sum()),
-                "total_listening_time_hours": round(df['ms_played'].sum() / (1000 * 60 * 60), 2),
-                "average_track_completion": round(df['ms_played'].mean() / 30000, 2) if 'ms_played' in df.columns else 0
-            })
-        
-        # Date range analysis
-        if 'ts' in df.columns:
-            try:
-                df['timestamp'] = pd.to_datetime(df['ts'])
-                summary.update({
-                    "date_range": {
-                        "earliest": df['timestamp'].min().isoformat(),
-                        "latest": df['timestamp'].max().isoformat(),
-                        "span_days": (df['timestamp'].max() - df['timestamp'].min()).days
-                    }
-                })
-            except:
-                logger.warning("Could not parse timestamp data")
-        
-        # Top items
-        if 'master_metadata_track_name' in df.columns:
-            top_tracks = df['master_metadata_track_name'].value_counts().head(10)
-            summary["top_tracks"] = [{"track": track, "plays": int(count)} for track, count in top_tracks.items()]
-        
-        if 'master_metadata_album_artist_name' in df.columns:
-            top_artists = df['master_metadata_album_artist_name'].value_counts().head(10)
-            summary["top_artists"] = [{"artist": artist, "plays": int(count)} for artist, count in top_artists.items()]
-        
-        return summary
-    
-    async def _analyze_temporal_patterns(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze listening patterns over time"""
-        
-        temporal_analysis = {}
-        
-        if 'ts' in df.columns:
-            try:
-                df['timestamp'] = pd.to_datetime(df['ts'])
-                df['hour'] = df['timestamp'].dt.hour
-                df['day_of_week'] = df['timestamp'].dt.dayofweek
-                df['month'] = df['timestamp'].dt.month
-                
-                # Hourly patterns
-                hourly_counts = df.groupby('hour').size().to_dict()
-                temporal_analysis["hourly_distribution"] = {str(h): int(count) for h, count in hourly_counts.items()}
-                
-                # Daily patterns (0=Monday, 6=Sunday)
-                daily_counts = df.groupby('day_of_week').size().to_dict()
-                day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                temporal_analysis["daily_distribution"] = {day_names[day]: int(count) for day, count in daily_counts.items()}
-                
-                # Monthly patterns
-                monthly_counts = df.groupby('month').size().to_dict()
-                temporal_analysis["monthly_distribution"] = {str(m): int(count) for m, count in monthly_counts.items()}
-                
-                # Peak listening times
-                peak_hour = df['hour'].mode().iloc[0] if not df['hour'].mode().empty else 0
-                peak_day = day_names[df['day_of_week'].mode().iloc[0]] if not df['day_of_week'].mode().empty else "Unknown"
-                
-                temporal_analysis["patterns"] = {
-                    "peak_listening_hour": int(peak_hour),
-                    "peak_listening_day": peak_day,
-                    "most_active_period": "morning" if 6 <= peak_hour <= 12 else "afternoon" if 12 < peak_hour <= 18 else "evening" if 18 < peak_hour <= 24 else "night"
-                }
-                
-            except Exception as e:
-                logger.warning(f"Error in temporal analysis: {e}")
-                temporal_analysis["error"] = "Could not analyze temporal patterns"
-        
-        return temporal_analysis
-    
-    async def _analyze_genre_preferences(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze genre preferences and music taste"""
-        
-        # This would require additional genre data or API calls to classify tracks
-        # For now, provide a mock analysis based on artist patterns
-        
-        genre_analysis = {
-            "genre_distribution": {
-                "pop": np.random.randint(20, 40),
-                "rock": np.random.randint(15, 30),
-                "electronic": np.random.randint(10, 25),
-                "hip-hop": np.random.randint(5, 20),
-                "indie": np.random.randint(5, 15),
-                "classical": np.random.randint(0, 10)
-            },
-            "diversity_score": round(np.random.uniform(0.6, 0.9), 2),
-            "mainstream_vs_niche": {
-                "mainstream_percentage": round(np.random.uniform(60, 85), 1),
-                "niche_percentage": round(np.random.uniform(15, 40), 1)
-            }
-        }
-        
-        return genre_analysis
-    
-    async def _analyze_listening_habits(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Analyze detailed listening habits and patterns"""
-        
-        habits = {}
-        
-        # Completion rates
-        if 'ms_played' in df.columns:
-            # Assume average track length of 3 minutes (180,000ms)
-            df['completion_rate'] = df['ms_played'] / 180000
-            df['completion_rate'] = df['completion_rate'].clip(0, 1)
-            
-            habits["completion_stats"] = {
-                "average_completion_rate": round(df['completion_rate'].mean(), 3),
-                "tracks_completed_fully": int((df['completion_rate'] >= 0.8).sum()),
-                "tracks_skipped_early": int((df['completion_rate'] < 0.3).sum())
-            }
-        
-        # Repeat listening
-        if 'master_metadata_track_name' in df.columns:
-            track_counts = df['master_metadata_track_name'].value_counts()
-            habits["repeat_behavior"] = {
-                "tracks_played_once": int((track_counts == 1).sum()),
-                "tracks_played_multiple": int((track_counts > 1).sum()),
-                "most_repeated_track": {
-                    "name": track_counts.index[0] if len(track_counts) > 0 else "Unknown",
-                    "play_count": int(track_counts.iloc[0]) if len(track_counts) > 0 else 0
-                }
-            }
-        
-        # Session patterns
-        habits["session_insights"] = {
-            "estimated_daily_sessions": round(np.random.uniform(3, 8), 1),
-            "average_session_length_minutes": round(np.random.uniform(15, 45), 1),
-            "preferred_listening_mode": np.random.choice(["continuous", "shuffle", "mixed"])
-        }
-        
-        return habits
-    
-    async def _prepare_recommendation_features(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Prepare features for ML recommendation models"""
-        
-        features = {
-            "user_profile_features": {
-                "activity_level": "high" if len(df) > 1000 else "medium" if len(df) > 100 else "low",
-                "music_exploration": round(np.random.uniform(0.3, 0.8), 2),
-                "genre_diversity": round(np.random.uniform(0.4, 0.9), 2),
-                "temporal_consistency": round(np.random.uniform(0.5, 0.9), 2)
-            },
-            "recommendation_seeds": {
-                "top_artists": [],
-                "top_genres": ["pop", "rock", "electronic"],
-                "preferred_audio_features": {
-                    "danceability": round(np.random.uniform(0.4, 0.8), 2),
-                    "energy": round(np.random.uniform(0.3, 0.7), 2),
-                    "valence": round(np.random.uniform(0.3, 0.8), 2)
-                }
-            }
-        }
-        
-        # Extract top artists if available
-        if 'master_metadata_album_artist_name' in df.columns:
-            top_artists = df['master_metadata_album_artist_name'].value_counts().head(5)
-            features["recommendation_seeds"]["top_artists"] = list(top_artists.index)
-        
-        return features
-    
     async def run_integration_tests(self) -> Dict[str, Any]:
         """Run comprehensive integration tests for all MCP server functionality"""
         
@@ -1025,8 +1598,32 @@ class SpotifyMCPServer:
 class MCPHandler:
     """Handle MCP protocol messages"""
     
+    TOOLS = {
+        "spotify_get_recommendations": "Get personalized music recommendations",
+        "spotify_create_playlist": "Create new playlists with tracks",
+        "spotify_analyze_listening_data": "Analyze CSV listening data",
+        "spotify_browser_automation": "Test Spotify Web Player functionality",
+        "spotify_integration_tests": "Run comprehensive integration tests",
+        "get_user_profile": "Get user profile and preferences",
+        "health_check": "Check server and API health"
+    }
+    
+    # Read-only tools, the only ones whose identical calls a batch may run once;
+    # anything with side effects (creating playlists, driving a browser) runs every time
+    MERGEABLE_TOOLS = frozenset({
+        "spotify_get_recommendations",
+        "spotify_analyze_listening_data",
+        "get_user_profile",
+        "health_check"
+    })
+    
     def __init__(self):
         self.spotify_server = SpotifyMCPServer()
+        self.batch_concurrency = int(os.getenv('MCP_BATCH_CONCURRENCY', '8'))
+        
+    async def close(self):
+        """Shut down the underlying server resources"""
+        await self.spotify_server.close()
         
     async def handle_tool_call(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Handle incoming tool calls"""
@@ -1056,15 +1653,7 @@ class MCPHandler:
             else:
                 return {
                     "error": f"Unknown tool: {tool_name}",
-                    "available_tools": [
-                        "spotify_get_recommendations",
-                        "spotify_create_playlist", 
-                        "spotify_analyze_listening_data",
-                        "spotify_browser_automation",
-                        "spotify_integration_tests",
-                        "get_user_profile",
-                        "health_check"
-                    ],
+                    "available_tools": list(self.TOOLS),
                     "status": "error"
                 }
                 
@@ -1075,14 +1664,281 @@ class MCPHandler:
                 "error": str(e),
                 "status": "error"
             }
+    
+    def _batch_merge_key(self, tool_name: str, parameters: Dict[str, Any]) -> Optional[str]:
+        """Key under which identical calls in a batch are executed only once, or None to always run"""
+        if tool_name not in self.MERGEABLE_TOOLS:
+            return None
+        # Recommendations are scored and re-ranked per user, so user_id stays in the key;
+        # different users with the same query still share the API fetch in get_recommendations
+        try:
+            return json.dumps([tool_name, parameters], sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+    
+    @staticmethod
+    def _parse_batch_call(call: Any) -> Tuple[str, Dict[str, Any]]:
+        """Tool name and parameters of one batch entry; ValueError if it is malformed"""
+        if not isinstance(call, dict):
+            raise ValueError(f"Batch call must be an object, got {type(call).__name__}")
+        tool_name = call.get('tool', call.get('name'))
+        if not isinstance(tool_name, str) or not tool_name:
+            raise ValueError("Batch call is missing a tool name")
+        parameters = call.get('parameters', call.get('arguments'))
+        if parameters is None:
+            parameters = {}
+        if not isinstance(parameters, dict):
+            raise ValueError(f"Parameters for {tool_name} must be an object")
+        return tool_name, parameters
+    
+    async def handle_tool_calls_batch(self, calls: List[Dict[str, Any]],
+                                      max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run many tool calls concurrently and return results in input order
+        
+        Each call is ``{"tool": name, "parameters": {...}}`` (or ``tools/call``
+        style ``{"name": ..., "arguments": {...}}``) with an optional ``id``;
+        malformed entries get an error result without affecting the others.
+        Duplicate calls to read-only tools (``MERGEABLE_TOOLS``) are merged into
+        one execution, at most ``max_concurrency`` calls run at once, and calls
+        that reach the rate limiter wait there while holding their slot, so a
+        throttled API slows the batch instead of queueing unbounded work behind it.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.batch_concurrency)
+        
+        # Warm the token once so concurrent calls don't race to authenticate
+        server = self.spotify_server
+        if not server.mock_mode and (not server.access_token or server._is_token_expired()):
+            await server.authenticate()
+        
+        async def run(tool_name: str, parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+            async with semaphore:
+                start_time = time.perf_counter()
+                result = await self.handle_tool_call(tool_name, parameters)
+                return result, (time.perf_counter() - start_time) * 1000
+        
+        shared: Dict[str, asyncio.Task] = {}
+        tasks = []
+        invalid: Dict[int, str] = {}
+        for index, call in enumerate(calls):
+            try:
+                tool_name, parameters = self._parse_batch_call(call)
+            except ValueError as e:
+                invalid[index] = str(e)
+                tasks.append((None, False))
+                continue
+            merge_key = self._batch_merge_key(tool_name, parameters)
+            if merge_key is not None and merge_key in shared:
+                tasks.append((shared[merge_key], True))
+                continue
+            task = asyncio.create_task(run(tool_name, parameters))
+            if merge_key is not None:
+                shared[merge_key] = task
+            tasks.append((task, False))
+        
+        await asyncio.gather(*{task for task, _ in tasks if task is not None})
+        
+        results = []
+        for index, (call, (task, merged)) in enumerate(zip(calls, tasks)):
+            if task is None:
+                result, duration_ms = {"error": invalid[index], "status": "error"}, 0.0
+            else:
+                result, duration_ms = task.result()
+            call = call if isinstance(call, dict) else {}
+            results.append({
+                "index": index,
+                "id": call.get('id'),
+                "tool": call.get('tool', call.get('name')),
+                "status": result.get('status', 'success') if isinstance(result, dict) else 'success',
+                "duration_ms": round(duration_ms, 2),
+                "merged": merged,
+                "result": result
+            })
+        
+        return results
 
-async def main():
-    """Main server entry point"""
+def _json_default(value: Any) -> Any:
+    """Serialise numpy scalars and other stray objects in tool results"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+class JSONRPCServer:
+    """Newline-delimited JSON-RPC 2.0 front end for MCPHandler
     
-    logger.info("🎵 Starting Enhanced Spotify MCP Server...")
+    Requests are read as a stream and dispatched concurrently, with at most
+    ``max_in_flight`` executing at once (reading pauses while the limit is
+    reached). Responses are written as soon as each call finishes, tagged with
+    the request id, so they may arrive out of order.
+    """
     
-    # Initialize handler
-    handler = MCPHandler()
+    PROTOCOL_VERSION = "2024-11-05"
+    MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+    
+    def __init__(self, handler: MCPHandler, max_in_flight: int = 32):
+        self.handler = handler
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        
+    async def serve_stdio(self):
+        """Serve requests from stdin, writing responses to stdout"""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=self.MAX_MESSAGE_SIZE)
+        try:
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        except ValueError:
+            # stdin is a regular file; feed the reader from a thread instead
+            def pump():
+                for line in sys.stdin.buffer:
+                    loop.call_soon_threadsafe(reader.feed_data, line)
+                loop.call_soon_threadsafe(reader.feed_eof)
+            loop.run_in_executor(None, pump)
+        
+        try:
+            transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+            writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+            
+            async def send(data: bytes):
+                writer.write(data)
+                await writer.drain()
+        except ValueError:
+            async def send(data: bytes):
+                sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+        
+        logger.info("Serving JSON-RPC on stdio")
+        await self._serve_stream(reader, send)
+        
+    async def serve_unix(self, path: str):
+        """Serve requests on a Unix domain socket, one stream per client"""
+        if os.path.exists(path):
+            os.unlink(path)
+        
+        async def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            async def send(data: bytes):
+                writer.write(data)
+                await writer.drain()
+            try:
+                await self._serve_stream(reader, send)
+            finally:
+                writer.close()
+        
+        server = await asyncio.start_unix_server(on_connect, path=path, limit=self.MAX_MESSAGE_SIZE)
+        logger.info(f"Serving JSON-RPC on unix socket {path}")
+        async with server:
+            await server.serve_forever()
+    
+    async def _serve_stream(self, reader: asyncio.StreamReader, send):
+        """Read messages until EOF, dispatching each one as its own task"""
+        write_lock = asyncio.Lock()
+        pending = set()
+        
+        async def reply(message: Any):
+            data = (json.dumps(message, default=_json_default) + "\n").encode()
+            async with write_lock:
+                await send(data)
+        
+        async def process(line: bytes):
+            try:
+                response = await self.handle_message(line)
+                if response is not None:
+                    await reply(response)
+            except Exception as e:
+                logger.error(f"Error processing JSON-RPC message: {e}")
+            finally:
+                self._slots.release()
+        
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # Message exceeded MAX_MESSAGE_SIZE; the oversized line is discarded
+                await reply(self._error(None, -32700, "Message too large"))
+                continue
+            if not line:
+                break
+            if not line.strip():
+                continue
+            
+            await self._slots.acquire()
+            task = asyncio.create_task(process(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    @staticmethod
+    def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+    
+    async def handle_message(self, raw: Union[str, bytes]) -> Optional[Any]:
+        """Handle one raw message (single request or batch); None means no reply"""
+        try:
+            message = json.loads(raw)
+        except (ValueError, UnicodeDecodeError):
+            return self._error(None, -32700, "Parse error")
+        
+        if isinstance(message, list):
+            if not message:
+                return self._error(None, -32600, "Invalid Request")
+            responses = await asyncio.gather(*(self._handle_request(m) for m in message))
+            responses = [r for r in responses if r is not None]
+            return responses or None
+        return await self._handle_request(message)
+    
+    async def _handle_request(self, request: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return self._error(None, -32600, "Invalid Request")
+        
+        request_id = request.get('id')
+        is_notification = 'id' not in request
+        
+        try:
+            result = await self._dispatch(request['method'], request.get('params') or {})
+        except LookupError as e:
+            response = self._error(request_id, -32601, str(e))
+        except (TypeError, ValueError) as e:
+            response = self._error(request_id, -32602, str(e))
+        except Exception as e:
+            logger.error(f"JSON-RPC method {request['method']} failed: {e}")
+            response = self._error(request_id, -32603, str(e))
+        else:
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        
+        return None if is_notification else response
+    
+    async def _dispatch(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "initialize":
+            return {
+                "protocolVersion": self.PROTOCOL_VERSION,
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "echotune-spotify", "version": "1.0.0"}
+            }
+        if method == "ping" or method.startswith("notifications/"):
+            return {}
+        if method == "tools/list":
+            return {"tools": [
+                {"name": name, "description": description, "inputSchema": {"type": "object"}}
+                for name, description in MCPHandler.TOOLS.items()
+            ]}
+        if method == "tools/call":
+            result = await self.handler.handle_tool_call(params.get('name', ''), params.get('arguments') or {})
+            return {
+                "content": [{"type": "text", "text": json.dumps(result, default=_json_default)}],
+                "isError": isinstance(result, dict) and result.get('status') == 'error'
+            }
+        if method == "tools/call_batch":
+            calls = params.get('calls', [])
+            if not isinstance(calls, list):
+                raise ValueError("calls must be a list")
+            return await self.handler.handle_tool_calls_batch(calls, params.get('max_concurrency'))
+        if method in MCPHandler.TOOLS:
+            # Shorthand: call a tool directly by method name
+            return await self.handler.handle_tool_call(method, params)
+        raise LookupError(f"Method not found: {method}")
+
+async def run_self_test(handler: MCPHandler):
+    """Exercise the main tools once and log the results"""
     
     # Perform health check
     health = await handler.spotify_server.health_check()
@@ -1111,23 +1967,42 @@ async def main():
         logger.info(f"✅ Integration tests: {integration_results['success_rate']}% success rate")
     else:
         logger.info("⚠️ Integration tests completed with errors")
+
+async def main():
+    """Main server entry point"""
+    
+    parser = argparse.ArgumentParser(description='EchoTune Spotify MCP server')
+    parser.add_argument('--socket', help='Serve on this Unix socket path instead of stdio')
+    parser.add_argument('--max-in-flight', type=int, default=int(os.getenv('MCP_MAX_IN_FLIGHT', '32')),
+                        help='Maximum number of requests executed concurrently (default: 32)')
+    parser.add_argument('--self-test', action='store_true',
+                        help='Run the built-in functionality checks and exit')
+    args = parser.parse_args()
+    
+    logger.info("🎵 Starting Enhanced Spotify MCP Server...")
+    
+    # Initialize handler
+    handler = MCPHandler()
     
-    logger.info("🚀 Enhanced Spotify MCP Server is ready!")
-    logger.info("📋 Available tools:")
-    logger.info("  - spotify_get_recommendations: Get personalized music recommendations")
-    logger.info("  - spotify_create_playlist: Create new playlists with tracks")
-    logger.info("  - spotify_analyze_listening_data: Analyze CSV listening data") 
-    logger.info("  - spotify_browser_automation: Test Spotify Web Player functionality")
-    logger.info("  - spotify_integration_tests: Run comprehensive integration tests")
-    logger.info("  - get_user_profile: Get user profile and preferences")
-    logger.info("  - health_check: Check server and API health")
-    
-    # Keep server running
     try:
-        while True:
-            await asyncio.sleep(1)
-    except KeyboardInterrupt:
+        if args.self_test:
+            await run_self_test(handler)
+            return
+        
+        logger.info("🚀 Enhanced Spotify MCP Server is ready!")
+        logger.info("📋 Available tools:")
+        for name, description in MCPHandler.TOOLS.items():
+            logger.info(f"  - {name}: {description}")
+        
+        rpc_server = JSONRPCServer(handler, max_in_flight=args.max_in_flight)
+        if args.socket:
+            await rpc_server.serve_unix(args.socket)
+        else:
+            await rpc_server.serve_stdio()
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.info("🛑 Shutting down Enhanced Spotify MCP Server...")
+    finally:
+        await handler.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
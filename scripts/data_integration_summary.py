@@ -10,6 +10,7 @@ from pathlib import Path
 from datetime import datetime
 import json
 from migrate_to_mongodb import MongoDBMigrator
+from mongodb_utils import estimate_distinct_counts
 
 def get_file_structure_summary():
     """Get summary of current file structure"""
@@ -38,8 +39,13 @@ def get_file_structure_summary():
         'total_size_mb': (main_size + split_size) / (1024 * 1024)
     }
 
-def get_mongodb_summary():
-    """Get MongoDB integration summary"""
+def get_mongodb_summary(approximate=True, error=0.01):
+    """Get MongoDB integration summary
+    
+    Unique counts are HyperLogLog estimates (relative error ``error``) unless
+    ``approximate`` is False, which uses distinct() and is limited to 16 MB of
+    distinct values.
+    """
     try:
         migrator = MongoDBMigrator()
         migrator.connect()
@@ -48,9 +54,17 @@ def get_mongodb_summary():
         stats = migrator.db.command("collStats", migrator.collection_name)
         
         # Get unique counts
-        unique_users = len(migrator.collection.distinct("user.username"))
-        unique_tracks = len(migrator.collection.distinct("spotify_track_uri"))
-        unique_artists = len(migrator.collection.distinct("track.artist"))
+        if approximate:
+            unique_counts = estimate_distinct_counts(
+                migrator.collection, ["user.username", "spotify_track_uri", "track.artist"], error
+            )
+            unique_users = unique_counts["user.username"]
+            unique_tracks = unique_counts["spotify_track_uri"]
+            unique_artists = unique_counts["track.artist"]
+        else:
+            unique_users = len(migrator.collection.distinct("user.username"))
+            unique_tracks = len(migrator.collection.distinct("spotify_track_uri"))
+            unique_artists = len(migrator.collection.distinct("track.artist"))
         
         # Get date range
         date_pipeline = [
@@ -88,6 +102,7 @@ def get_mongodb_summary():
             'unique_users': unique_users,
             'unique_tracks': unique_tracks,
             'unique_artists': unique_artists,
+            'unique_counts_approximate': approximate,
             'indexes_count': len(indexes),
             'date_range': date_stats[0] if date_stats else None,
             'completion_stats': completion_stats[0] if completion_stats else None
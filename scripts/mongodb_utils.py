@@ -4,8 +4,14 @@ Shared utilities for MongoDB operations in EchoTune AI
 Contains common data structures and helper functions for MongoDB scripts
 """
 
+import sys
 from datetime import datetime, timezone
-from typing import Dict, Any
+from pathlib import Path
+from typing import Dict, Any, Iterable, List
+
+# Mergeable sketches are shared with the MCP server
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'mcp-server'))
+from sketches import HyperLogLog
 
 
 def get_sample_listening_history_document() -> Dict[str, Any]:
@@ -83,4 +89,45 @@ def get_sample_document_json_structure() -> str:
     "explicit": false,
     "created_at": "timestamp"
   }
-}"""
\ No newline at end of file
+}"""
+
+
+def _get_field(document: Dict[str, Any], path: str) -> Any:
+    """Value of a dotted field path such as ``user.username`` (None when missing)"""
+    value = document
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def estimate_distinct_counts(collection, fields: Iterable[str], error: float = 0.01,
+                             batch_size: int = 10000) -> Dict[str, int]:
+    """
+    Approximate number of distinct values of each field, in one pass.
+    Streams a projection of the collection through HyperLogLog sketches with
+    relative standard error ``error``, so memory stays at a few KB per field
+    instead of holding every distinct value (and the 16 MB limit of distinct()
+    does not apply).
+    """
+    fields = list(fields)
+    sketches = {field: HyperLogLog(error) for field in fields}
+    projection = {field: 1 for field in fields}
+    projection['_id'] = 0
+
+    batch: List[Dict[str, Any]] = []
+    cursor = collection.find({}, projection=projection, batch_size=batch_size)
+    for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            _update_sketches(sketches, batch)
+            batch = []
+    _update_sketches(sketches, batch)
+
+    return {field: sketch.count() for field, sketch in sketches.items()}
+
+
+def _update_sketches(sketches: Dict[str, HyperLogLog], documents: List[Dict[str, Any]]) -> None:
+    for field, sketch in sketches.items():
+        sketch.update(_get_field(document, field) for document in documents)
@@ -14,6 +14,7 @@ from datetime import datetime
 from typing import List, Dict, Any
 import pandas as pd
 from migrate_to_mongodb import MongoDBMigrator
+from mongodb_utils import estimate_distinct_counts
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -230,8 +231,12 @@ class DataUploader:
         
         return stats
     
-    def verify_upload(self) -> Dict[str, Any]:
-        """Verify the upload by checking database statistics"""
+    def verify_upload(self, approximate: bool = True, error: float = 0.01) -> Dict[str, Any]:
+        """Verify the upload by checking database statistics
+        
+        Unique counts are HyperLogLog estimates (relative error ``error``)
+        unless ``approximate`` is False.
+        """
         logger.info("Verifying upload...")
         
         migrator = MongoDBMigrator()
@@ -245,9 +250,15 @@ class DataUploader:
             sample_docs = list(migrator.collection.find().limit(5))
             
             # Get unique counts
-            unique_users = migrator.collection.distinct("user.username")
-            unique_tracks = migrator.collection.distinct("spotify_track_uri")
-            unique_artists = migrator.collection.distinct("track.artist")
+            if approximate:
+                unique_counts = estimate_distinct_counts(
+                    migrator.collection, ["user.username", "spotify_track_uri", "track.artist"], error
+                )
+            else:
+                unique_counts = {
+                    field: len(migrator.collection.distinct(field))
+                    for field in ["user.username", "spotify_track_uri", "track.artist"]
+                }
             
             # Get date range
             date_pipeline = [
@@ -264,9 +275,10 @@ class DataUploader:
                 'storage_size_mb': stats.get('storageSize', 0) / (1024 * 1024),
                 'index_size_mb': stats.get('totalIndexSize', 0) / (1024 * 1024),
                 'avg_document_size': stats.get('avgObjSize', 0),
-                'unique_users': len(unique_users),
-                'unique_tracks': len(unique_tracks),
-                'unique_artists': len(unique_artists),
+                'unique_users': unique_counts["user.username"],
+                'unique_tracks': unique_counts["spotify_track_uri"],
+                'unique_artists': unique_counts["track.artist"],
+                'unique_counts_approximate': approximate,
                 'date_range': date_range[0] if date_range else None,
                 'sample_documents': len(sample_docs),
                 'indexes_count': len(list(migrator.collection.list_indexes()))
@@ -290,6 +302,8 @@ def main():
                        help='Use upsert mode for uploads')
     parser.add_argument('--no-splits', action='store_true',
                        help='Remove split files during optimization')
+    parser.add_argument('--exact-counts', action='store_true',
+                       help='Count unique values exactly with distinct() instead of HyperLogLog estimates')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Enable verbose logging')
     
@@ -330,7 +344,7 @@ def main():
             )
             
             # Verify upload
-            verification = uploader.verify_upload()
+            verification = uploader.verify_upload(approximate=not args.exact_counts)
             
             # Final report
             print("\n" + "="*80)
@@ -4,40 +4,85 @@ Spotify Audio Features Population Script for EchoTune AI
 Fetches missing audio features from Spotify Web API and updates the dataset
 """
 
+import numpy as np
 import pandas as pd
 import requests
 import time
 import json
 import os
 import sys
+import asyncio
+import random
 from typing import List, Dict, Optional
 import logging
 from pathlib import Path
 import base64
 from urllib.parse import urlencode
+import shutil
 import sqlite3
 from tqdm import tqdm
 
+# The token-bucket limiter is shared with the MCP server
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'mcp-server'))
+from rate_limiting import TokenBucketRateLimiter
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Cached audio features, one typed column each (Spotify API field names)
+AUDIO_FEATURE_FIELDS = [
+    ('danceability', 'REAL'),
+    ('energy', 'REAL'),
+    ('key', 'INTEGER'),
+    ('loudness', 'REAL'),
+    ('mode', 'INTEGER'),
+    ('speechiness', 'REAL'),
+    ('acousticness', 'REAL'),
+    ('instrumentalness', 'REAL'),
+    ('liveness', 'REAL'),
+    ('valence', 'REAL'),
+    ('tempo', 'REAL'),
+    ('time_signature', 'INTEGER'),
+    ('duration_ms', 'INTEGER'),
+]
+FEATURE_NAMES = [name for name, _ in AUDIO_FEATURE_FIELDS]
+FEATURE_EXPORT_VERSION = 1
+
+DEFAULT_CACHE_PATH = str(Path(__file__).resolve().parent.parent / 'data' / 'cache' / 'audio_features.db')
+
 class SpotifyAudioFeaturesPopulator:
     """Populates missing audio features using Spotify Web API"""
     
-    def __init__(self, client_id: str = None, client_secret: str = None):
+    def __init__(self, client_id: str = None, client_secret: str = None, cache_db_path: str = None):
         self.client_id = client_id or os.getenv('SPOTIFY_CLIENT_ID')
         self.client_secret = client_secret or os.getenv('SPOTIFY_CLIENT_SECRET')
         self.access_token = None
         self.token_expires_at = 0
         
+        self.api_base_url = 'https://api.spotify.com/v1'
+        
         # Rate limiting
         self.requests_per_second = 10  # Conservative rate limit
         self.requests_made = 0
         self.last_request_time = 0
         
-        # Cache database for API responses
-        self.cache_db_path = '/tmp/spotify_audio_features_cache.db'
+        # Async fetching: batches in flight at once, and retries per batch
+        self.use_async = True
+        self.max_concurrent_batches = int(os.getenv('AUDIO_FEATURES_CONCURRENCY', '8'))
+        self.max_retries = 5
+        self.retry_base_delay = 1.0
+        
+        # Cache database for API responses, kept open for the whole run.
+        # Entries expire after the TTL (0 keeps them forever); past the row
+        # limit (0 for no limit) the least recently read tracks are evicted.
+        self.cache_db_path = cache_db_path or os.getenv('AUDIO_FEATURES_CACHE_PATH') or DEFAULT_CACHE_PATH
+        self.cache_ttl_days = float(os.getenv('AUDIO_FEATURES_CACHE_TTL_DAYS', '30'))
+        self.cache_max_rows = int(os.getenv('AUDIO_FEATURES_CACHE_MAX_ROWS', '1000000'))
+        self.cache_query_chunk = 500  # Ids per IN (...) lookup, under SQLite's variable limit
+        self.cache_stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+        self._cache_conn = None
+        self._cache_rows_bound = 0  # Upper bound on the row count, so eviction rarely needs COUNT(*)
         self.init_cache_db()
         
         if not self.client_id or not self.client_secret:
@@ -47,50 +92,264 @@ class SpotifyAudioFeaturesPopulator:
             self.mock_mode = False
     
     def init_cache_db(self):
-        """Initialize SQLite cache database"""
-        conn = sqlite3.connect(self.cache_db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS audio_features_cache (
-                track_id TEXT PRIMARY KEY,
-                audio_features TEXT,
-                cached_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        """Initialize SQLite cache database, migrating older layouts and dropping expired entries"""
+        conn = self._cache_connection()
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(audio_features_cache)')]
         
-        conn.commit()
-        conn.close()
+        with conn:
+            if 'audio_features' in columns:
+                conn.execute('ALTER TABLE audio_features_cache RENAME TO audio_features_cache_json')
+            
+            feature_columns = ',\n'.join(f'                    {name} {kind}' for name, kind in AUDIO_FEATURE_FIELDS)
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS audio_features_cache (
+                    track_id TEXT PRIMARY KEY,
+{feature_columns},
+                    cached_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                ) WITHOUT ROWID
+            ''')
+            if columns and 'audio_features' not in columns and 'last_accessed' not in columns:
+                # Typed cache from before access tracking
+                conn.execute('ALTER TABLE audio_features_cache ADD COLUMN last_accessed TIMESTAMP')
+                conn.execute('UPDATE audio_features_cache SET last_accessed = cached_at')
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_audio_features_cache_last_accessed '
+                'ON audio_features_cache (last_accessed)'
+            )
+            
+            if 'audio_features' in columns:
+                rows = conn.execute('SELECT track_id, audio_features, cached_at FROM audio_features_cache_json')
+                migrated = [
+                    (track_id, *self._feature_values(json.loads(features)), cached_at, cached_at)
+                    for track_id, features, cached_at in rows if features
+                ]
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO audio_features_cache '
+                    f'(track_id, {", ".join(FEATURE_NAMES)}, cached_at, last_accessed) '
+                    f'VALUES ({", ".join("?" * (len(FEATURE_NAMES) + 3))})',
+                    migrated
+                )
+                conn.execute('DROP TABLE audio_features_cache_json')
+                logger.info(f"Migrated {len(migrated)} cached tracks to the typed cache schema")
+        
+        self.purge_expired()
+        self._cache_rows_bound = conn.execute('SELECT COUNT(*) FROM audio_features_cache').fetchone()[0]
+    
+    def _cache_connection(self) -> sqlite3.Connection:
+        """The persistent cache connection, opened on first use
+        
+        WAL lets readers and the writer proceed together, and with
+        synchronous=NORMAL a commit no longer waits for an fsync; the cache
+        can always be refilled from the API, so that durability is enough.
+        """
+        if self._cache_conn is None:
+            Path(self.cache_db_path).parent.mkdir(parents=True, exist_ok=True)
+            # Only ever used from one thread at a time (the event loop in async mode)
+            conn = sqlite3.connect(self.cache_db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-16000')  # 16 MB
+            conn.execute('PRAGMA mmap_size=268435456')  # 256 MB
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._cache_conn = conn
+        return self._cache_conn
+    
+    def close(self):
+        """Close the cache connection"""
+        if self._cache_conn is not None:
+            self._cache_conn.close()
+            self._cache_conn = None
+    
+    @staticmethod
+    def _feature_values(features: Dict) -> tuple:
+        """Feature values in AUDIO_FEATURE_FIELDS order (None where missing)"""
+        return tuple(features.get(name) for name in FEATURE_NAMES)
+    
+    def _ttl_cutoff(self) -> str:
+        """Oldest ``cached_at`` still within the TTL, as the UTC text SQLite's CURRENT_TIMESTAMP writes"""
+        if self.cache_ttl_days <= 0:
+            return ''
+        cutoff = time.gmtime(time.time() - self.cache_ttl_days * 86400)
+        return time.strftime('%Y-%m-%d %H:%M:%S', cutoff)
+    
+    def get_cached_features_bulk(self, track_ids: List[str]) -> Dict[str, Dict]:
+        """Get unexpired cached audio features for many tracks, one query per chunk of ids
+        
+        Hits have their ``last_accessed`` time bumped in one statement per
+        chunk, which is what size-based eviction orders by.
+        """
+        conn = self._cache_connection()
+        cached = {}
+        
+        with conn:
+            for i in range(0, len(track_ids), self.cache_query_chunk):
+                chunk = track_ids[i:i + self.cache_query_chunk]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT track_id, {", ".join(FEATURE_NAMES)} FROM audio_features_cache '
+                    f'WHERE track_id IN ({placeholders}) AND cached_at >= ?',
+                    [*chunk, self._ttl_cutoff()]
+                ).fetchall()
+                for track_id, *values in rows:
+                    cached[track_id] = {**dict(zip(FEATURE_NAMES, values)), 'id': track_id}
+                if rows:
+                    conn.execute(
+                        f'UPDATE audio_features_cache SET last_accessed = CURRENT_TIMESTAMP '
+                        f'WHERE track_id IN ({",".join("?" * len(rows))})',
+                        [row[0] for row in rows]
+                    )
+        
+        self.cache_stats['hits'] += len(cached)
+        self.cache_stats['misses'] += len(track_ids) - len(cached)
+        return cached
     
     def get_cached_features(self, track_id: str) -> Optional[Dict]:
         """Get cached audio features for a track"""
-        conn = sqlite3.connect(self.cache_db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'SELECT audio_features FROM audio_features_cache WHERE track_id = ?',
-            (track_id,)
-        )
-        
-        result = cursor.fetchone()
-        conn.close()
+        return self.get_cached_features_bulk([track_id]).get(track_id)
+    
+    def cache_features_bulk(self, features_by_track: Dict[str, Dict]):
+        """Cache audio features for many tracks in a single transaction, evicting past the row limit"""
+        if not features_by_track:
+            return
+        
+        conn = self._cache_connection()
+        with conn:
+            conn.executemany(
+                f'INSERT OR REPLACE INTO audio_features_cache (track_id, {", ".join(FEATURE_NAMES)}) '
+                f'VALUES ({", ".join("?" * (len(FEATURE_NAMES) + 1))})',
+                [(track_id, *self._feature_values(features)) for track_id, features in features_by_track.items()]
+            )
         
-        if result:
-            return json.loads(result[0])
-        return None
+        self._cache_rows_bound += len(features_by_track)
+        if self.cache_max_rows > 0 and self._cache_rows_bound > self.cache_max_rows:
+            self.evict_to_size()
+    
+    def purge_expired(self) -> int:
+        """Delete entries older than the TTL; returns how many were removed"""
+        if self.cache_ttl_days <= 0:
+            return 0
+        
+        conn = self._cache_connection()
+        with conn:
+            removed = conn.execute(
+                'DELETE FROM audio_features_cache WHERE cached_at < ?',
+                (self._ttl_cutoff(),)
+            ).rowcount
+        
+        if removed:
+            self.cache_stats['expired'] += removed
+            self._cache_rows_bound = max(0, self._cache_rows_bound - removed)
+            logger.info(f"Dropped {removed} expired cache entries (older than {self.cache_ttl_days:g} days)")
+        return removed
+    
+    def evict_to_size(self, max_rows: Optional[int] = None) -> int:
+        """Evict the least recently read entries beyond ``max_rows``; returns how many were removed"""
+        max_rows = self.cache_max_rows if max_rows is None else max_rows
+        conn = self._cache_connection()
+        count = conn.execute('SELECT COUNT(*) FROM audio_features_cache').fetchone()[0]
+        removed = 0
+        
+        if max_rows > 0 and count > max_rows:
+            with conn:
+                removed = conn.execute(
+                    'DELETE FROM audio_features_cache WHERE track_id IN ('
+                    'SELECT track_id FROM audio_features_cache ORDER BY last_accessed LIMIT ?)',
+                    (count - max_rows,)
+                ).rowcount
+            self.cache_stats['evictions'] += removed
+            logger.info(f"Evicted {removed} least recently used cache entries (limit {max_rows})")
+        
+        self._cache_rows_bound = count - removed
+        return removed
+    
+    def clear_cache(self) -> int:
+        """Invalidate every cached entry; returns how many were removed"""
+        conn = self._cache_connection()
+        with conn:
+            removed = conn.execute('DELETE FROM audio_features_cache').rowcount
+        self._cache_rows_bound = 0
+        logger.info(f"Cleared {removed} cache entries")
+        return removed
+    
+    def compact_cache(self) -> Dict[str, int]:
+        """Drop expired and over-limit entries, then checkpoint the WAL and VACUUM the database file"""
+        size_before = self._cache_file_size()
+        expired = self.purge_expired()
+        evicted = self.evict_to_size()
+        
+        conn = self._cache_connection()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        size_after = self._cache_file_size()
+        
+        logger.info(f"Compacted {self.cache_db_path}: {size_before / 1024 / 1024:.2f} MB -> "
+                    f"{size_after / 1024 / 1024:.2f} MB")
+        return {'expired': expired, 'evicted': evicted, 'rows': self._cache_rows_bound,
+                'bytes_before': size_before, 'bytes_after': size_after}
+    
+    def _cache_file_size(self) -> int:
+        """Bytes on disk for the cache database and its WAL"""
+        return sum(os.path.getsize(path) for path in (self.cache_db_path, self.cache_db_path + '-wal')
+                   if os.path.exists(path))
     
     def cache_features(self, track_id: str, features: Dict):
         """Cache audio features for a track"""
-        conn = sqlite3.connect(self.cache_db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'INSERT OR REPLACE INTO audio_features_cache (track_id, audio_features) VALUES (?, ?)',
-            (track_id, json.dumps(features))
+        self.cache_features_bulk({track_id: features})
+    
+    def export_feature_matrix(self, output_dir: str, chunk_rows: int = 100000) -> int:
+        """Export every cached track as a float32 matrix for ML jobs
+        
+        Writes ``features.npy`` (one row per track, columns in
+        AUDIO_FEATURE_FIELDS order, NaN where missing), ``track_ids.npy``
+        (row order, sorted) and ``meta.json`` into ``output_dir``, replacing
+        any previous export. Load it with ``load_feature_matrix``; the
+        matrix memory-maps. Returns the number of tracks exported.
+        """
+        conn = self._cache_connection()
+        count = conn.execute('SELECT COUNT(*) FROM audio_features_cache').fetchone()[0]
+        
+        target = Path(output_dir)
+        tmp = target.with_name(target.name + f'.{os.getpid()}.tmp')
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        
+        matrix = np.lib.format.open_memmap(tmp / 'features.npy', mode='w+', dtype=np.float32,
+                                           shape=(count, len(FEATURE_NAMES)))
+        track_ids = []
+        cursor = conn.execute(
+            f'SELECT track_id, {", ".join(FEATURE_NAMES)} FROM audio_features_cache ORDER BY track_id'
         )
-        
-        conn.commit()
-        conn.close()
+        row = 0
+        while row < count:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            block = np.array([values[1:] for values in rows], dtype=np.float64)  # None becomes NaN
+            matrix[row:row + len(rows)] = block
+            track_ids.extend(values[0] for values in rows)
+            row += len(rows)
+        matrix.flush()
+        del matrix
+        
+        np.save(tmp / 'track_ids.npy', np.asarray(track_ids, dtype=str))
+        with open(tmp / 'meta.json', 'w') as f:
+            json.dump({'version': FEATURE_EXPORT_VERSION, 'columns': FEATURE_NAMES, 'tracks': row}, f)
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(tmp, target)
+        
+        logger.info(f"Exported {row} cached feature vectors to {target}")
+        return row
+    
+    def _split_cached(self, track_ids: List[str]):
+        """Cached features for ``track_ids`` and the ids still to fetch, in order"""
+        cached_features = self.get_cached_features_bulk(track_ids)
+        uncached_track_ids = [tid for tid in track_ids if tid not in cached_features]
+        return cached_features, uncached_track_ids
     
     def get_access_token(self) -> str:
         """Get or refresh Spotify access token"""
@@ -173,15 +432,7 @@ class SpotifyAudioFeaturesPopulator:
             return {}
         
         # Check cache first
-        cached_features = {}
-        uncached_track_ids = []
-        
-        for track_id in valid_track_ids:
-            cached = self.get_cached_features(track_id)
-            if cached:
-                cached_features[track_id] = cached
-            else:
-                uncached_track_ids.append(track_id)
+        cached_features, uncached_track_ids = self._split_cached(valid_track_ids)
         
         if not uncached_track_ids:
             return cached_features
@@ -219,9 +470,9 @@ class SpotifyAudioFeaturesPopulator:
                 if features:  # API returns None for tracks not found
                     track_id = uncached_track_ids[i]
                     api_features[track_id] = features
-                    
-                    # Cache the result
-                    self.cache_features(track_id, features)
+            
+            # Cache the results
+            self.cache_features_bulk(api_features)
             
             # Combine cached and API results
             all_features = {**cached_features, **api_features}
@@ -235,6 +486,105 @@ class SpotifyAudioFeaturesPopulator:
             # Return cached features if API fails
             return cached_features
     
+    async def fetch_audio_features_async(self, track_ids: List[str], batch_size: int = 100) -> Dict[str, Dict]:
+        """Fetch audio features for any number of tracks, keeping several batches in flight
+        
+        All batches share one pooled HTTP session and one token-bucket rate
+        limiter. A 429 pauses the limiter for Retry-After seconds, so every
+        in-flight batch waits, not just the one that was throttled.
+        """
+        import aiohttp
+        
+        track_ids = list(dict.fromkeys(tid for tid in track_ids if tid))
+        batches = [track_ids[i:i + batch_size] for i in range(0, len(track_ids), batch_size)]
+        limiter = TokenBucketRateLimiter(self.requests_per_second, 1.0)
+        token_lock = asyncio.Lock()
+        semaphore = asyncio.Semaphore(self.max_concurrent_batches)
+        all_features = {}
+        
+        connector = aiohttp.TCPConnector(limit=self.max_concurrent_batches)
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            async def run(batch: List[str]):
+                async with semaphore:
+                    return batch, await self._fetch_batch_async(session, limiter, token_lock, batch)
+            
+            tasks = [asyncio.create_task(run(batch)) for batch in batches]
+            with tqdm(total=len(track_ids), desc="Fetching audio features") as pbar:
+                for done, future in enumerate(asyncio.as_completed(tasks), 1):
+                    batch, batch_features = await future
+                    all_features.update(batch_features)
+                    pbar.update(len(batch))
+                    
+                    # Progress report every 10 batches
+                    if done % 10 == 0:
+                        logger.info(f"Processed {done} / {len(batches)} batches")
+        
+        return all_features
+    
+    async def _get_access_token_async(self, token_lock: asyncio.Lock) -> str:
+        """Current access token; when it needs refreshing, only one batch requests a new one"""
+        if self.access_token and time.time() < self.token_expires_at:
+            return self.access_token
+        async with token_lock:
+            # get_access_token re-checks, so batches that queued here reuse the refreshed token
+            return await asyncio.to_thread(self.get_access_token)
+    
+    async def _fetch_batch_async(self, session, limiter: TokenBucketRateLimiter, token_lock: asyncio.Lock,
+                                 track_ids: List[str]) -> Dict[str, Dict]:
+        """Fetch one batch (max 100) through the shared session, retrying with jittered backoff"""
+        import aiohttp
+        
+        cached_features, uncached_track_ids = self._split_cached(track_ids)
+        
+        if not uncached_track_ids:
+            return cached_features
+        
+        url = f'{self.api_base_url}/audio-features'
+        params = {'ids': ','.join(uncached_track_ids)}
+        
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            self.requests_made += 1
+            token = await self._get_access_token_async(token_lock)
+            try:
+                async with session.get(url, params=params,
+                                       headers={'Authorization': f'Bearer {token}'}) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        break
+                    if response.status == 429:
+                        try:
+                            retry_after = max(0.0, float(response.headers.get('Retry-After', 60)))
+                        except ValueError:
+                            retry_after = 60.0
+                        logger.warning(f"Rate limited. Pausing all batches for {retry_after} seconds...")
+                        limiter.defer(retry_after)
+                        continue
+                    if response.status == 401:
+                        # Token expired early; get a new one on the next attempt
+                        self.access_token = None
+                    elif response.status < 500:
+                        logger.error(f"Error fetching audio features: HTTP {response.status}")
+                        return cached_features
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Error fetching audio features (attempt {attempt + 1}): {e}")
+            
+            # Exponential backoff with full jitter so retries do not arrive in lockstep
+            await asyncio.sleep(random.uniform(0, self.retry_base_delay * 2 ** attempt))
+        else:
+            logger.error(f"Giving up on a batch of {len(uncached_track_ids)} tracks after {self.max_retries + 1} attempts")
+            return cached_features
+        
+        api_features = {}
+        for track_id, features in zip(uncached_track_ids, data.get('audio_features', [])):
+            if features:  # API returns None for tracks not found
+                api_features[track_id] = features
+        self.cache_features_bulk(api_features)
+        
+        logger.debug(f"Fetched {len(api_features)} new features, {len(cached_features)} from cache")
+        return {**cached_features, **api_features}
+    
     def generate_mock_audio_features(self, track_ids: List[str]) -> Dict[str, Dict]:
         """Generate mock audio features for testing without API credentials"""
         import random
@@ -306,52 +656,55 @@ class SpotifyAudioFeaturesPopulator:
         batch_size = 100  # Spotify API limit
         all_features = {}
         
-        with tqdm(total=len(track_ids), desc="Fetching audio features") as pbar:
-            for i in range(0, len(track_ids), batch_size):
-                batch = track_ids[i:i + batch_size]
-                batch_features = self.fetch_audio_features_batch(batch)
-                all_features.update(batch_features)
-                pbar.update(len(batch))
+        if self.use_async and not self.mock_mode:
+            all_features = asyncio.run(self.fetch_audio_features_async(track_ids, batch_size))
+        else:
+            with tqdm(total=len(track_ids), desc="Fetching audio features") as pbar:
+                for i in range(0, len(track_ids), batch_size):
+                    batch = track_ids[i:i + batch_size]
+                    batch_features = self.fetch_audio_features_batch(batch)
+                    all_features.update(batch_features)
+                    pbar.update(len(batch))
                 
-                # Progress report every 10 batches
-                if (i // batch_size + 1) % 10 == 0:
-                    logger.info(f"Processed {i + len(batch)} / {len(track_ids)} tracks")
+                    # Progress report every 10 batches
+                    if (i // batch_size + 1) % 10 == 0:
+                        logger.info(f"Processed {i + len(batch)} / {len(track_ids)} tracks")
         
         logger.info(f"Successfully fetched features for {len(all_features)} tracks")
         
         # Update the DataFrame with fetched features
-        updated_count = 0
+        feature_mapping = {
+            'Danceability': 'danceability',
+            'Energy': 'energy',
+            'Key': 'key',
+            'Loudness': 'loudness',
+            'Mode': 'mode',
+            'Speechiness': 'speechiness',
+            'Acousticness': 'acousticness',
+            'Instrumentalness': 'instrumentalness',
+            'Liveness': 'liveness',
+            'Valence': 'valence',
+            'Tempo': 'tempo',
+            'Time Signature': 'time_signature'
+        }
         
-        for index, row in df.iterrows():
-            spotify_uri = row['spotify_track_uri']
-            if pd.isna(spotify_uri):
-                continue
-                
-            track_id = self.extract_track_id(spotify_uri)
-            if track_id in all_features:
-                features = all_features[track_id]
-                
-                # Update audio feature columns
-                feature_mapping = {
-                    'Danceability': 'danceability',
-                    'Energy': 'energy',
-                    'Key': 'key',
-                    'Loudness': 'loudness',
-                    'Mode': 'mode',
-                    'Speechiness': 'speechiness',
-                    'Acousticness': 'acousticness',
-                    'Instrumentalness': 'instrumentalness',
-                    'Liveness': 'liveness',
-                    'Valence': 'valence',
-                    'Tempo': 'tempo',
-                    'Time Signature': 'time_signature'
-                }
-                
-                for df_col, api_col in feature_mapping.items():
-                    if api_col in features and pd.isna(row[df_col]):
-                        df.at[index, df_col] = features[api_col]
-                
-                updated_count += 1
+        # Resolve each distinct URI once, then line the fetched features up with every row
+        uris = df['spotify_track_uri']
+        uri_track_ids = {uri: self.extract_track_id(uri) for uri in uris.dropna().unique()}
+        row_track_ids = uris.map(uri_track_ids)
+        
+        features = pd.DataFrame.from_dict(all_features, orient='index')
+        matched = row_track_ids.isin(features.index)
+        updated_count = int(matched.sum())
+        
+        columns = [df_col for df_col, api_col in feature_mapping.items()
+                   if df_col in df.columns and api_col in features.columns]
+        if updated_count and columns:
+            fetched = features[[feature_mapping[col] for col in columns]].reindex(row_track_ids[matched])
+            fetched.index = df.index[matched]
+            fetched.columns = columns
+            # Only cells that are still null take the fetched value
+            df[columns] = df[columns].fillna(fetched)
         
         logger.info(f"Updated {updated_count} records with audio features")
         
@@ -406,6 +759,14 @@ class SpotifyAudioFeaturesPopulator:
                 if len(values) > 0:
                     print(f"  {col}: avg={values.mean():.3f}, std={values.std():.3f}")
         
+        stats = self.cache_stats
+        lookups = stats['hits'] + stats['misses']
+        print(f"\nFeature Cache ({self.cache_db_path}):")
+        print(f"  Hits: {stats['hits']:,}  Misses: {stats['misses']:,}  "
+              f"Hit Rate: {(stats['hits'] / lookups * 100) if lookups else 0:.1f}%")
+        print(f"  Expired: {stats['expired']:,}  Evicted: {stats['evictions']:,}  "
+              f"Entries: {self._cache_rows_bound:,}")
+        
         print(f"\nEnhanced dataset saved to: {output_file}")
         
         if self.mock_mode:
@@ -415,6 +776,22 @@ class SpotifyAudioFeaturesPopulator:
         
         print("="*70)
 
+def load_feature_matrix(path: str):
+    """Load an ``export_feature_matrix`` directory
+    
+    Returns ``(track_ids, features, columns)``, where ``features`` is the
+    memory-mapped float32 matrix and ``track_ids`` a Series mapping each
+    track id to its row.
+    """
+    source = Path(path)
+    with open(source / 'meta.json') as f:
+        metadata = json.load(f)
+    if metadata.get('version') != FEATURE_EXPORT_VERSION:
+        raise ValueError(f"Unsupported feature export format in {source}")
+    track_ids = np.load(source / 'track_ids.npy')
+    index = pd.Series(np.arange(len(track_ids)), index=track_ids)
+    return index, np.load(source / 'features.npy', mmap_mode='r'), metadata['columns']
+
 def main():
     """Main function"""
     import argparse
@@ -427,6 +804,18 @@ def main():
                        help='Output CSV file path (default: input_with_audio_features.csv)')
     parser.add_argument('--mock', action='store_true',
                        help='Use mock mode (generate random features for testing)')
+    parser.add_argument('--sync', action='store_true',
+                       help='Fetch one batch at a time instead of several concurrently')
+    parser.add_argument('--concurrency', type=int,
+                       help='Batches in flight at once (default: AUDIO_FEATURES_CONCURRENCY or 8)')
+    parser.add_argument('--cache-path',
+                       help='Feature cache database (default: AUDIO_FEATURES_CACHE_PATH or data/cache/audio_features.db)')
+    parser.add_argument('--compact-cache', action='store_true',
+                       help='Drop expired and over-limit cache entries, VACUUM the cache and exit')
+    parser.add_argument('--clear-cache', action='store_true',
+                       help='Invalidate every cached entry before running')
+    parser.add_argument('--export-features', metavar='DIR',
+                       help='Export the feature cache as a memory-mappable NumPy matrix to DIR and exit')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Enable verbose logging')
     
@@ -435,18 +824,38 @@ def main():
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
+    if args.compact_cache or args.export_features:
+        populator = SpotifyAudioFeaturesPopulator(cache_db_path=args.cache_path)
+        try:
+            if args.clear_cache:
+                populator.clear_cache()
+            if args.compact_cache:
+                populator.compact_cache()
+            if args.export_features:
+                populator.export_feature_matrix(args.export_features)
+        finally:
+            populator.close()
+        return 0
+    
     # Check if input file exists
     if not os.path.exists(args.input):
         logger.error(f"Input file not found: {args.input}")
         return 1
     
+    populator = None
     try:
         # Initialize populator
-        populator = SpotifyAudioFeaturesPopulator()
+        populator = SpotifyAudioFeaturesPopulator(cache_db_path=args.cache_path)
         
+        if args.clear_cache:
+            populator.clear_cache()
         if args.mock:
             populator.mock_mode = True
             logger.info("Running in mock mode - will generate random audio features")
+        if args.sync:
+            populator.use_async = False
+        if args.concurrency:
+            populator.max_concurrent_batches = args.concurrency
         
         # Run the population process
         output_file = populator.populate_audio_features(args.input, args.output)
@@ -461,6 +870,9 @@ def main():
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        if populator is not None:
+            populator.close()
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Recommendation Precompute Job for EchoTune AI
+Scores the top-N candidate tracks for every user in user_features.csv with
+the collaborative-filtering model and stores them for the MCP server, which
+serves them directly and keeps them fresh in the background
+"""
+
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# The store and model live with the MCP server, which reads what this job writes
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'mcp-server'))
+from candidate_store import CANDIDATE_COUNT, default_dataset_path, model_id, refresh_store
+from collaborative_filtering import ImplicitALS, default_model_path
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Main function"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Precompute per-user recommendation candidates')
+    parser.add_argument('--model', '-m', default=default_model_path(),
+                       help='Model directory (default: CF_MODEL_PATH or ml_datasets/cf_model)')
+    parser.add_argument('--users', '-u', default=default_dataset_path('user_features.csv'),
+                       help='user_features.csv listing the users to precompute')
+    parser.add_argument('--interactions', '-i', default=default_dataset_path('user_track_interactions.csv'),
+                       help='Current interactions, so plays since training are reflected')
+    parser.add_argument('--output', '-o',
+                       default=os.getenv('CANDIDATE_STORE_PATH') or default_dataset_path('candidates'),
+                       help='Candidate store directory (default: CANDIDATE_STORE_PATH or ml_datasets/candidates)')
+    parser.add_argument('--count', '-n', type=int, default=CANDIDATE_COUNT,
+                       help='Candidates kept per user')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                       help='Enable verbose logging')
+    
+    args = parser.parse_args()
+    
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    
+    for path in (args.model, args.users):
+        if not path or not os.path.exists(path):
+            logger.error(f"Input not found: {path}")
+            return 1
+    
+    try:
+        model = ImplicitALS.load(args.model)
+        
+        start = time.perf_counter()
+        store = refresh_store(args.output, model, args.users, args.interactions, model_id(args.model),
+                              args.count)
+        logger.info(f"Precomputed candidates for {len(store)} users in {time.perf_counter() - start:.1f}s")
+        return 0
+        
+    except Exception as e:
+        logger.error(f"Error precomputing recommendations: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Collaborative-Filtering Training Script for EchoTune AI
+Fits an implicit-feedback ALS model on ml_datasets/user_track_interactions.csv
+and saves memory-mappable factors for the MCP server's get_recommendations
+"""
+
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# The model lives with the MCP server, which loads what this script saves
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'mcp-server'))
+from collaborative_filtering import ImplicitALS, USER_COLUMN, TRACK_COLUMN, WEIGHT_COLUMNS
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Main function"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Train the collaborative-filtering recommendation model')
+    parser.add_argument('--input', '-i',
+                       default='ml_datasets/user_track_interactions.csv',
+                       help='Interactions CSV from prepare_ml_datasets.py')
+    parser.add_argument('--output', '-o',
+                       default=os.getenv('CF_MODEL_PATH', 'ml_datasets/cf_model'),
+                       help='Model directory (default: CF_MODEL_PATH or ml_datasets/cf_model)')
+    parser.add_argument('--weight', choices=WEIGHT_COLUMNS,
+                       help='Interaction weight column (default: engagement_score, else play_count)')
+    parser.add_argument('--factors', type=int, default=64, help='Latent factors per user and track')
+    parser.add_argument('--iterations', type=int, default=15, help='ALS iterations')
+    parser.add_argument('--regularization', type=float, default=0.05, help='L2 regularization')
+    parser.add_argument('--alpha', type=float, default=10.0, help='Confidence scaling of interaction weights')
+    parser.add_argument('--workers', type=int, help='Solver threads (default: CPU count, at most 8)')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                       help='Enable verbose logging')
+    
+    args = parser.parse_args()
+    
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    
+    if not os.path.exists(args.input):
+        logger.error(f"Input file not found: {args.input}")
+        return 1
+    
+    try:
+        header = pd.read_csv(args.input, nrows=0).columns
+        columns = [column for column in (USER_COLUMN, TRACK_COLUMN, *WEIGHT_COLUMNS) if column in header]
+        interactions = pd.read_csv(args.input, usecols=columns)
+        logger.info(f"Loaded {len(interactions)} interactions from {args.input}")
+        
+        start = time.perf_counter()
+        model = ImplicitALS.from_interactions(
+            interactions, args.weight,
+            factors=args.factors, regularization=args.regularization, alpha=args.alpha,
+            iterations=args.iterations, workers=args.workers
+        )
+        logger.info(f"Training took {time.perf_counter() - start:.1f}s")
+        
+        model.save(args.output)
+        return 0
+        
+    except Exception as e:
+        logger.error(f"Error training collaborative-filtering model: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
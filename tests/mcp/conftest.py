@@ -0,0 +1,8 @@
+"""Make the flat mcp-server modules (and the scripts that share them) importable from the tests"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT / 'scripts'))
+sys.path.insert(0, str(ROOT / 'mcp-server'))
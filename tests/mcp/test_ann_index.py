@@ -0,0 +1,75 @@
+"""IVF index recall against brute force, inserts and save/load"""
+
+import numpy as np
+
+from ann_index import IVFIndex
+
+
+def clustered(seed, n=2000, dim=16, centers=20):
+    rng = np.random.default_rng(seed)
+    means = rng.normal(0, 5, (centers, dim))
+    return (means[rng.integers(0, centers, n)] + rng.normal(0, 1, (n, dim))).astype(np.float32)
+
+
+def brute_force(vectors, query, k):
+    distances = np.linalg.norm(vectors - query, axis=1)
+    return np.argsort(distances, kind='stable')[:k]
+
+
+def recall(index, vectors, queries, k=10, nprobe=None):
+    hits = 0
+    for query in queries:
+        ids, _ = index.search(query, k, nprobe=nprobe)
+        hits += len(set(ids.tolist()) & set(brute_force(vectors, query, k).tolist()))
+    return hits / (k * len(queries))
+
+
+def test_recall_against_brute_force():
+    vectors = clustered(0)
+    queries = clustered(1, n=50)
+    index = IVFIndex.build(vectors, nprobe=8)
+
+    assert len(index) == len(vectors)
+    assert recall(index, vectors, queries) >= 0.9
+    # Probing every list is an exhaustive scan
+    assert recall(index, vectors, queries, nprobe=index.n_lists) == 1.0
+
+
+def test_search_returns_sorted_euclidean_distances():
+    vectors = clustered(2, n=500)
+    index = IVFIndex.build(vectors)
+    ids, distances = index.search(vectors[7], k=5, nprobe=index.n_lists)
+
+    assert ids[0] == 7 and distances[0] == 0
+    assert np.all(np.diff(distances) >= 0)
+    np.testing.assert_allclose(distances, np.linalg.norm(vectors[ids] - vectors[7], axis=1), rtol=1e-5, atol=1e-5)
+
+
+def test_inserts_are_searchable_before_and_after_merge():
+    vectors = clustered(3, n=600)
+    index = IVFIndex.build(vectors[:500])
+    index.add(vectors[500:], np.arange(500, 600))
+
+    assert len(index) == 600
+    assert index.search(vectors[550], k=1)[0][0] == 550
+    index.merge_pending()
+    assert index.search(vectors[550], k=1, nprobe=index.n_lists)[0][0] == 550
+    assert recall(index, vectors, vectors[::60], nprobe=index.n_lists) == 1.0
+
+
+def test_save_load_round_trip(tmp_path):
+    vectors = clustered(4, n=800)
+    index = IVFIndex.build(vectors, ids=np.arange(800) + 1000, nprobe=4)
+    index.add(vectors[:1] + 100, [5])
+    index.metadata['model'] = 'test'
+    index.save(str(tmp_path / 'index.ivf'))
+    loaded = IVFIndex.load(str(tmp_path / 'index.ivf'))
+
+    assert len(loaded) == 801 and loaded.nprobe == 4 and loaded.metadata == {'model': 'test'}
+    for query in vectors[::100]:
+        np.testing.assert_array_equal(loaded.search(query, k=10)[0], index.search(query, k=10)[0])
+    assert loaded.search(vectors[0] + 100, k=1)[0][0] == 5
+    # A memory-mapped index still accepts inserts
+    loaded.add(vectors[:1] - 100, [6])
+    loaded.merge_pending()
+    assert loaded.search(vectors[0] - 100, k=1)[0][0] == 6
@@ -0,0 +1,115 @@
+"""Audio-feature cache: bulk reads and writes, TTL purge, LRU eviction and compaction"""
+
+import numpy as np
+import pytest
+
+from populate_audio_features import FEATURE_NAMES, SpotifyAudioFeaturesPopulator, load_feature_matrix
+
+
+def features(i):
+    return {name: float(i) for name in FEATURE_NAMES}
+
+
+@pytest.fixture
+def populator(tmp_path, monkeypatch):
+    monkeypatch.delenv('AUDIO_FEATURES_CACHE_TTL_DAYS', raising=False)
+    monkeypatch.delenv('AUDIO_FEATURES_CACHE_MAX_ROWS', raising=False)
+    populator = SpotifyAudioFeaturesPopulator(cache_db_path=str(tmp_path / 'audio_features.db'))
+    yield populator
+    populator.close()
+
+
+def rows(populator):
+    return populator._cache_connection().execute('SELECT COUNT(*) FROM audio_features_cache').fetchone()[0]
+
+
+def age(populator, track_ids, column, days):
+    """Move ``column`` of the given tracks ``days`` into the past"""
+    conn = populator._cache_connection()
+    with conn:
+        conn.executemany(f"UPDATE audio_features_cache SET {column} = datetime('now', ?) WHERE track_id = ?",
+                         [(f'-{days} days', track_id) for track_id in track_ids])
+
+
+def test_bulk_round_trip_and_stats(populator):
+    populator.cache_query_chunk = 3  # Exercise the chunked IN lookups
+    populator.cache_features_bulk({f't{i}': features(i) for i in range(10)})
+
+    cached, missing = populator._split_cached([f't{i}' for i in range(12)])
+    assert missing == ['t10', 't11']
+    assert cached['t4'] == {**features(4), 'id': 't4'}
+    assert populator.cache_stats['hits'] == 10 and populator.cache_stats['misses'] == 2
+
+
+def test_expired_entries_are_hidden_and_purged(populator):
+    populator.cache_ttl_days = 30
+    populator.cache_features_bulk({f't{i}': features(i) for i in range(5)})
+    age(populator, ['t0', 't1'], 'cached_at', 31)
+
+    assert sorted(populator.get_cached_features_bulk([f't{i}' for i in range(5)])) == ['t2', 't3', 't4']
+    assert populator.purge_expired() == 2
+    assert rows(populator) == 3 and populator.cache_stats['expired'] == 2
+
+    # A TTL of 0 keeps entries forever
+    populator.cache_ttl_days = 0
+    age(populator, ['t2'], 'cached_at', 3650)
+    assert populator.purge_expired() == 0
+    assert populator.get_cached_features('t2') is not None
+
+
+def test_expired_entries_are_purged_on_open(populator, tmp_path):
+    populator.cache_features_bulk({'old': features(1), 'new': features(2)})
+    age(populator, ['old'], 'cached_at', 60)
+    populator.close()
+
+    reopened = SpotifyAudioFeaturesPopulator(cache_db_path=str(tmp_path / 'audio_features.db'))
+    try:
+        assert rows(reopened) == 1 and reopened.get_cached_features('new') is not None
+    finally:
+        reopened.close()
+
+
+def test_eviction_drops_least_recently_read(populator):
+    populator.cache_features_bulk({f't{i}': features(i) for i in range(6)})
+    age(populator, [f't{i}' for i in range(6)], 'last_accessed', 2)
+    # Reading t0 and t1 makes them the most recently used
+    populator.get_cached_features_bulk(['t0', 't1'])
+
+    assert populator.evict_to_size(3) == 3
+    remaining = populator._cache_connection().execute('SELECT track_id FROM audio_features_cache').fetchall()
+    assert rows(populator) == 3 and {'t0', 't1'} <= {track_id for track_id, in remaining}
+    assert populator.cache_stats['evictions'] == 3
+
+
+def test_writes_past_the_row_limit_evict(populator):
+    populator.cache_max_rows = 5
+    populator.cache_features_bulk({f't{i}': features(i) for i in range(5)})
+    age(populator, [f't{i}' for i in range(5)], 'last_accessed', 1)
+    populator.cache_features_bulk({f'n{i}': features(i) for i in range(3)})
+
+    assert rows(populator) == 5
+    assert sorted(populator.get_cached_features_bulk([f'n{i}' for i in range(3)])) == ['n0', 'n1', 'n2']
+
+
+def test_compact_and_clear(populator):
+    populator.cache_max_rows = 0
+    populator.cache_features_bulk({f't{i}': features(i) for i in range(200)})
+    age(populator, ['t0'], 'cached_at', 365)
+    populator.cache_max_rows = 100
+
+    stats = populator.compact_cache()
+    assert stats['expired'] == 1 and stats['rows'] == rows(populator) <= 100
+    assert stats['bytes_after'] <= stats['bytes_before']
+
+    assert populator.clear_cache() == stats['rows']
+    assert rows(populator) == 0
+
+
+def test_export_feature_matrix(populator, tmp_path):
+    populator.cache_features_bulk({'b': features(2), 'a': {**features(1), 'tempo': None}})
+
+    assert populator.export_feature_matrix(str(tmp_path / 'features'), chunk_rows=1) == 2
+    index, matrix, columns = load_feature_matrix(str(tmp_path / 'features'))
+    assert columns == FEATURE_NAMES and index.index.tolist() == ['a', 'b']
+    np.testing.assert_array_equal(matrix[index['b']], np.full(len(FEATURE_NAMES), 2, dtype=np.float32))
+    assert np.isnan(matrix[index['a'], FEATURE_NAMES.index('tempo')])
@@ -0,0 +1,72 @@
+"""Batched recommendation calls for different users stay per-user"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import spotify_server
+
+TRACKS = [
+    {
+        'id': f't{i}',
+        'name': f'Track {i}',
+        'artists': [{'name': f'Artist {i}'}],
+        'album': {'name': f'Album {i}'},
+        'external_urls': {'spotify': f'https://open.spotify.com/track/t{i}'},
+        'preview_url': None,
+        'duration_ms': 200000,
+        'popularity': 50,
+    }
+    for i in range(6)
+]
+
+
+def make_handler(monkeypatch, tmp_path):
+    monkeypatch.setenv('SPOTIFY_CLIENT_ID', 'client')
+    monkeypatch.setenv('SPOTIFY_CLIENT_SECRET', 'secret')
+    monkeypatch.setenv('RECOMMENDATION_ENGINE', 'spotify')
+    monkeypatch.setenv('ML_DATASETS_DIR', str(tmp_path))
+    monkeypatch.setenv('TRACK_FEATURES_PATH', str(tmp_path / 'missing_track_features.csv'))
+    monkeypatch.setenv('CF_MODEL_PATH', str(tmp_path / 'missing_cf_model'))
+    monkeypatch.delenv('RECOMMENDATION_CACHE_PATH', raising=False)
+
+    handler = spotify_server.MCPHandler()
+    server = handler.spotify_server
+    server.access_token = 'token'
+    server.token_expires_at = datetime.now() + timedelta(hours=1)
+
+    api_calls = []
+
+    async def fake_api_get(path, params=None):
+        api_calls.append((path, params))
+        await asyncio.sleep(0.01)
+        return 200, {'tracks': TRACKS}
+
+    monkeypatch.setattr(server, '_api_get', fake_api_get)
+    return handler, api_calls
+
+
+def test_batched_users_with_same_query_get_their_own_skip_filtering(monkeypatch, tmp_path):
+    # Only user-b skips t0, and skips it every time
+    (tmp_path / 'skip_prediction_dataset.csv').write_text(
+        'user_id,track_uri,is_skip\n'
+        'user-b,spotify:track:t0,True\n'
+        'user-b,spotify:track:t0,True\n'
+    )
+    handler, api_calls = make_handler(monkeypatch, tmp_path)
+    query = {'limit': 5, 'seed_genres': ['pop']}
+    calls = [
+        {'tool': 'spotify_get_recommendations', 'parameters': {'user_id': 'user-a', **query}},
+        {'tool': 'spotify_get_recommendations', 'parameters': {'user_id': 'user-b', **query}},
+    ]
+
+    results = asyncio.run(handler.handle_tool_calls_batch(calls))
+
+    # One shared API fetch, but each user's call runs on its own
+    assert len(api_calls) == 1
+    assert [result['merged'] for result in results] == [False, False]
+
+    user_a, user_b = (result['result'] for result in results)
+    assert user_a['user_id'] == 'user-a'
+    assert user_b['user_id'] == 'user-b'
+    assert 't0' in [rec['track_id'] for rec in user_a['recommendations']]
+    assert 't0' not in [rec['track_id'] for rec in user_b['recommendations']]
@@ -0,0 +1,113 @@
+"""Candidate-store staleness digests and incremental refreshes"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from candidate_store import CandidateStore, interaction_digests, model_id, refresh_store
+from collaborative_filtering import ImplicitALS
+
+
+def interactions_for(n_users=12, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [(f"user{user}", f"spotify:track:t{track}", float(rng.integers(1, 10)))
+            for user in range(n_users) for track in rng.choice(30, 6, replace=False)]
+    return pd.DataFrame(rows, columns=['user_id', 'track_uri', 'weight'])
+
+
+@pytest.fixture(scope='module')
+def model():
+    return ImplicitALS.from_interactions(interactions_for(), weight_column='weight', factors=8, iterations=3,
+                                         workers=1)
+
+
+@pytest.fixture
+def recomputed(model, monkeypatch):
+    """Number of users scored by each refresh that scored any"""
+    calls = []
+    recommend_rows = model.recommend_rows
+
+    def counting(vectors, exclude=None, k=100, **kwargs):
+        calls.append(len(vectors))
+        return recommend_rows(vectors, exclude, k, **kwargs)
+
+    monkeypatch.setattr(model, 'recommend_rows', counting)
+    return calls
+
+
+def test_digests_change_only_for_the_changed_user():
+    interactions = interactions_for()
+    digests = interaction_digests(interactions)
+    assert len(digests) == 12
+    # Row order does not matter
+    assert interaction_digests(interactions.sample(frac=1, random_state=1)) == digests
+
+    changed = interactions.copy()
+    changed.loc[changed['user_id'] == 'user3', 'weight'] += 1
+    changed = pd.concat([changed, pd.DataFrame([['user5', 'spotify:track:t99', 1.0]], columns=changed.columns)])
+    new_digests = interaction_digests(changed)
+    assert {user for user in digests if new_digests[user] != digests[user]} == {'user3', 'user5'}
+
+
+def test_refresh_recomputes_only_changed_users(model, recomputed):
+    interactions = interactions_for()
+    users = [f"user{i}" for i in range(12)]
+    store = CandidateStore.empty(depth=10).refresh(model, users, interactions, 'model-a')
+    assert len(store) == 12 and recomputed == [12]
+
+    changed = interactions.copy()
+    changed.loc[changed['user_id'] == 'user3', 'weight'] *= 3
+    refreshed = store.refresh(model, users + ['user99'], changed, 'model-a')
+    # user99 has no interactions so cannot be scored; only user3 is recomputed
+    assert recomputed == [12, 1]
+    assert sorted(refreshed.users.tolist()) == sorted(users)
+    for user in users:
+        if user != 'user3':
+            assert refreshed.lookup(user) == store.lookup(user)
+    tracks, scores = refreshed.lookup('user3', k=5)
+    assert len(tracks) == 5 and scores == sorted(scores, reverse=True)
+
+    # Nothing is stale, so nothing is scored
+    assert refreshed.refresh(model, users, changed, 'model-a').lookup('user3') == refreshed.lookup('user3')
+    assert recomputed == [12, 1]
+
+
+def test_model_or_depth_change_rebuilds_everything(model, recomputed):
+    interactions = interactions_for()
+    users = [f"user{i}" for i in range(12)]
+    store = CandidateStore.empty(depth=10).refresh(model, users, interactions, 'model-a')
+
+    store.refresh(model, users, interactions, 'model-b')
+    deeper = store.refresh(model, users, interactions, 'model-a', depth=20)
+    assert recomputed == [12, 12, 12]
+    assert deeper.depth == 20
+
+
+def test_save_load_round_trip(model, tmp_path):
+    users = [f"user{i}" for i in range(12)]
+    store = CandidateStore.empty(depth=10).refresh(model, users, interactions_for(), 'model-a')
+    store.save(str(tmp_path / 'candidates'))
+    loaded = CandidateStore.load(str(tmp_path / 'candidates'))
+
+    assert loaded.model == 'model-a' and loaded.depth == 10
+    np.testing.assert_array_equal(loaded.digests, store.digests)
+    for user in users:
+        assert loaded.lookup(user, k=7) == store.lookup(user, k=7)
+    assert loaded.lookup('nobody') is None
+
+
+def test_refresh_store_reuses_saved_rows(model, tmp_path, recomputed):
+    model_path = tmp_path / 'cf_model'
+    model.save(str(model_path))
+    interactions = interactions_for()
+    interactions.rename(columns={'weight': 'play_count'}).to_csv(tmp_path / 'interactions.csv', index=False)
+    pd.DataFrame({'_id': [f"user{i}" for i in range(12)]}).to_csv(tmp_path / 'users.csv', index=False)
+    # The id does not depend on how the model directory is spelled
+    assert model_id(str(model_path)) == model_id(str(tmp_path / '.' / 'cf_model') + '/')
+
+    args = (str(tmp_path / 'candidates'), model, str(tmp_path / 'users.csv'), str(tmp_path / 'interactions.csv'),
+            model_id(str(model_path)), 10)
+    first = refresh_store(*args)
+    second = refresh_store(*args)
+    assert recomputed == [12]
+    assert second.lookup('user4') == first.lookup('user4')
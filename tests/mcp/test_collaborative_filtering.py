@@ -0,0 +1,59 @@
+"""ImplicitALS save/load round-trip"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from collaborative_filtering import ImplicitALS
+
+
+@pytest.fixture(scope='module')
+def model():
+    rng = np.random.default_rng(0)
+    rows = [(f"user{user}", f"spotify:track:t{track}", int(rng.integers(1, 20)))
+            for user in range(40) for track in rng.choice(60, 8, replace=False)]
+    interactions = pd.DataFrame(rows, columns=['user_id', 'track_uri', 'play_count'])
+    return ImplicitALS.from_interactions(interactions, factors=8, iterations=3, workers=1)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_load_round_trip(model, tmp_path, mmap):
+    model.save(str(tmp_path / 'cf_model'))
+    loaded = ImplicitALS.load(str(tmp_path / 'cf_model'), mmap=mmap)
+
+    assert (loaded.factors, loaded.regularization, loaded.alpha, loaded.iterations, loaded.cg_steps) == \
+        (model.factors, model.regularization, model.alpha, model.iterations, model.cg_steps)
+    np.testing.assert_array_equal(loaded.user_factors, model.user_factors)
+    np.testing.assert_array_equal(loaded.item_factors, model.item_factors)
+    assert loaded.users.tolist() == model.users.tolist()
+    assert loaded.tracks.tolist() == model.tracks.tolist()
+    np.testing.assert_array_equal(loaded.user_items.indptr, model.user_items.indptr)
+    np.testing.assert_array_equal(loaded.user_items.indices, model.user_items.indices)
+
+    for user in ('user0', 'user17'):
+        expected_rows, expected_scores = model.recommend(user, k=10)
+        rows, scores = loaded.recommend(user, k=10)
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_allclose(scores, expected_scores)
+        # Already-played tracks stay excluded after reloading
+        assert not set(rows.tolist()) & set(loaded.user_items.row(loaded.user_row(user))[0].tolist())
+    assert loaded.score(None, ['t1', 'unknown'], seed_tracks=['t2']) == \
+        model.score(None, ['t1', 'unknown'], seed_tracks=['t2'])
+
+
+def test_save_replaces_previous_model(model, tmp_path):
+    path = str(tmp_path / 'cf_model')
+    ImplicitALS(factors=4).save(path)
+    model.save(path)
+
+    assert len(ImplicitALS.load(path)) == len(model)
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_load_rejects_unknown_format(model, tmp_path):
+    path = tmp_path / 'cf_model'
+    model.save(str(path))
+    (path / 'meta.json').write_text('{"version": -1}')
+
+    with pytest.raises(ValueError):
+        ImplicitALS.load(str(path))
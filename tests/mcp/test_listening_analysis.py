@@ -0,0 +1,65 @@
+"""Incremental streaming aggregates match a full scan"""
+
+import os
+
+import listening_analysis
+from listening_analysis import aggregate_csv, aggregate_csv_incremental
+
+HEADER = 'ts,ms_played,spotify_track_uri,master_metadata_track_name,master_metadata_album_artist_name\n'
+
+
+def rows(start, stop):
+    return ''.join(
+        f'2024-01-{1 + i % 28:02d}T10:00:00Z,{1000 * i},spotify:track:t{i % 7},Track {i % 7},Artist {i % 3}\n'
+        for i in range(start, stop)
+    )
+
+
+def full_records(path):
+    columns = {column for columns in listening_analysis.ANALYSIS_COLUMNS.values() for column in columns}
+    return aggregate_csv(str(path), columns).records
+
+
+def test_last_row_without_trailing_newline_is_counted(tmp_path):
+    path = tmp_path / 'history.csv'
+    path.write_text(HEADER + rows(0, 10).rstrip('\n'))
+    assert full_records(path) == 10
+
+    aggregates, progress = aggregate_csv_incremental(str(path))
+    assert aggregates.records == 10
+    assert progress == {'previous_records': 0, 'new_records': 10}
+
+    # Calling again on the unchanged file neither drops nor double counts the last row
+    aggregates, progress = aggregate_csv_incremental(str(path))
+    assert aggregates.records == 10
+    assert progress['new_records'] == 0
+
+
+def test_unterminated_row_is_read_once_the_file_stops_changing(tmp_path):
+    path = tmp_path / 'history.csv'
+    path.write_text(HEADER + rows(0, 10))
+    assert aggregate_csv_incremental(str(path))[0].records == 10
+
+    # An append that has not finished its last line yet: only complete rows are taken
+    with open(path, 'a') as f:
+        f.write(rows(10, 15).rstrip('\n'))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert aggregate_csv_incremental(str(path))[0].records == 14
+
+    # Unchanged since that call, so the final row is complete after all
+    aggregates, progress = aggregate_csv_incremental(str(path))
+    assert aggregates.records == 15 == full_records(path)
+    assert progress == {'previous_records': 14, 'new_records': 1}
+
+
+def test_appended_rows_are_folded_in(tmp_path):
+    path = tmp_path / 'history.csv'
+    path.write_text(HEADER + rows(0, 50))
+    aggregate_csv_incremental(str(path))
+    with open(path, 'a') as f:
+        f.write(rows(50, 80))
+
+    aggregates, progress = aggregate_csv_incremental(str(path))
+    assert progress == {'previous_records': 50, 'new_records': 30}
+    assert aggregates.records == full_records(path) == 80
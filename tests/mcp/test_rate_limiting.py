@@ -0,0 +1,64 @@
+"""Token-bucket refill, Retry-After deferral and waiting"""
+
+import asyncio
+import types
+
+import pytest
+
+import rate_limiting
+from rate_limiting import TokenBucketRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A manual clock for the limiter module only (asyncio keeps the real one)"""
+    now = {'t': 1000.0}
+    monkeypatch.setattr(rate_limiting, 'time', types.SimpleNamespace(monotonic=lambda: now['t']))
+    return now
+
+
+def test_tokens_refill_at_the_configured_rate(clock):
+    limiter = TokenBucketRateLimiter(10, 1.0)
+    limiter.tokens = 0.0
+    clock['t'] += 0.5
+    assert limiter.remaining() == 5
+    clock['t'] += 10
+    assert limiter.remaining() == 10
+
+
+def test_no_burst_after_a_deferral(clock):
+    limiter = TokenBucketRateLimiter(10, 1.0)
+    limiter.defer(30)
+
+    clock['t'] += 15
+    assert limiter.remaining() == 0
+    # Right when the block ends nothing has refilled yet, however long it lasted
+    clock['t'] += 15
+    assert limiter.remaining() == 0
+    clock['t'] += 0.35
+    assert limiter.remaining() == 3
+
+
+def test_acquire_waits_for_the_next_token():
+    async def scenario():
+        limiter = TokenBucketRateLimiter(20, 1.0)
+        waits = [await limiter.acquire() for _ in range(22)]
+        return waits
+
+    waits = asyncio.run(scenario())
+    assert waits[:20] == [0.0] * 20
+    assert all(wait > 0 for wait in waits[20:])
+
+
+def test_acquire_after_defer_is_paced_not_burst():
+    async def scenario():
+        limiter = TokenBucketRateLimiter(50, 1.0)
+        limiter.defer(0.05)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(3):
+            await limiter.acquire()
+        return loop.time() - start
+
+    # The block plus three tokens at 50/s (about 0.06 s) rather than the block alone
+    assert asyncio.run(scenario()) >= 0.1
@@ -0,0 +1,38 @@
+"""Maximal-marginal-relevance ordering with a per-artist cap"""
+
+import numpy as np
+
+from reranking import mmr_order, rerank
+
+
+def order(artists, k, max_per_artist=2, diversity=0.3):
+    n = len(artists)
+    return mmr_order(np.linspace(1.0, 0.5, n), np.zeros((n, n)), k, diversity,
+                     np.asarray(artists, dtype=np.intp), max_per_artist).tolist()
+
+
+def test_artist_cap_is_respected_while_other_artists_remain():
+    picks = order([0, 1, 1, 1, 1, 2], k=4)
+    assert picks == [0, 1, 2, 5]
+
+
+def test_no_duplicates_once_every_remaining_artist_is_capped():
+    # Only artist 1 is left after the cap, so its tracks fill the rest in relevance order
+    assert order([0, 1, 1, 1], k=4) == [0, 1, 2, 3]
+    assert order([0, 1, 1, 1, 1, 2], k=5) == [0, 1, 2, 5, 3]
+
+
+def test_picks_are_unique_for_any_artist_layout():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(1, 12))
+        artists = rng.integers(0, 3, n)
+        picks = order(artists, k=n, max_per_artist=int(rng.integers(1, 3)))
+        assert sorted(picks) == list(range(n))
+
+
+def test_rerank_returns_each_record_once():
+    recs = [{"track_id": f"t{i}", "artist_name": "Same Artist" if i else "Other", "confidence_score": 1.0 - i / 10}
+            for i in range(6)]
+    result = rerank(recs, 5, max_per_artist=2)
+    assert len({rec["track_id"] for rec in result}) == len(result) == 5
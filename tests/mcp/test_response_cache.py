@@ -0,0 +1,91 @@
+"""ResponseCache TTL expiry, LRU eviction and SQLite persistence"""
+
+import asyncio
+import time
+
+from spotify_server import ResponseCache
+
+
+def test_entries_expire_after_the_ttl():
+    async def scenario():
+        cache = ResponseCache(max_size=10, ttl=0.05)
+        await cache.set('k', {'v': 1})
+        fresh = await cache.get('k')
+        await asyncio.sleep(0.1)
+        return fresh, await cache.get('k'), cache.stats
+
+    fresh, expired, stats = asyncio.run(scenario())
+    assert fresh == {'v': 1}
+    assert expired is None
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def scenario():
+        cache = ResponseCache(max_size=2, ttl=60)
+        await cache.set('a', 1)
+        await cache.set('b', 2)
+        await cache.get('a')  # b is now the least recently used
+        await cache.set('c', 3)
+        return [await cache.get(key) for key in 'abc'], cache.stats['evictions']
+
+    values, evictions = asyncio.run(scenario())
+    assert values == [1, None, 3]
+    assert evictions == 1
+
+
+def test_writes_are_batched_and_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'cache.db')
+
+    async def write():
+        cache = ResponseCache(max_size=10, ttl=60, path=path)
+        await asyncio.gather(*(cache.set(f'k{i}', i) for i in range(5)))
+        await cache.flush()
+        stats = dict(cache.stats)
+        cache.close()
+        return stats
+
+    async def read():
+        cache = ResponseCache(max_size=10, ttl=60, path=path)
+        values = [await cache.get(f'k{i}') for i in range(5)]
+        stats = dict(cache.stats)
+        cache.close()
+        return values, stats
+
+    write_stats = asyncio.run(write())
+    assert write_stats['disk_writes'] == 1
+
+    values, read_stats = asyncio.run(read())
+    assert values == list(range(5))
+    assert read_stats['disk_hits'] == 5
+
+
+def test_close_persists_queued_writes(tmp_path):
+    path = str(tmp_path / 'cache.db')
+
+    async def write():
+        cache = ResponseCache(max_size=10, ttl=60, path=path)
+        await cache.set('k', 'v')
+        cache.close()  # before the background flush had a chance to run
+
+    asyncio.run(write())
+    reopened = ResponseCache(max_size=10, ttl=60, path=path)
+    assert asyncio.run(reopened.get('k')) == 'v'
+    reopened.close()
+
+
+def test_expired_disk_entries_are_dropped_on_open(tmp_path):
+    path = str(tmp_path / 'cache.db')
+
+    async def write():
+        cache = ResponseCache(max_size=10, ttl=0.01, path=path)
+        await cache.set('k', 'v')
+        await cache.flush()
+        cache.close()
+
+    asyncio.run(write())
+    time.sleep(0.05)
+    reopened = ResponseCache(max_size=10, ttl=60, path=path)
+    assert asyncio.run(reopened.get('k')) is None
+    assert reopened._conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0] == 0
+    reopened.close()
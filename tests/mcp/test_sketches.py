@@ -0,0 +1,68 @@
+"""Merge accuracy of the SpaceSaving and HyperLogLog sketches"""
+
+from collections import Counter
+
+import numpy as np
+
+from sketches import HyperLogLog, SpaceSaving
+
+
+def zipf_stream(seed, size=20000, vocabulary=5000):
+    rng = np.random.default_rng(seed)
+    return [f"track-{value}" for value in rng.zipf(1.3, size) % vocabulary]
+
+
+def test_space_saving_merge_keeps_heavy_hitters_within_error():
+    left, right = zipf_stream(0), zipf_stream(1)
+    truth = Counter(left) + Counter(right)
+
+    a, b = SpaceSaving(capacity=200), SpaceSaving(capacity=200)
+    for item in left:
+        a.update(item)
+    for item in right:
+        b.update(item)
+    merged = a.merge(b)
+
+    assert merged.total == len(left) + len(right)
+    for item, estimate in merged.top():
+        # Counts are overestimates by at most the recorded error
+        assert truth[item] <= estimate <= truth[item] + merged.error(item)
+    threshold = merged.total / merged.capacity
+    for item, count in truth.items():
+        if count > threshold:
+            assert item in merged
+    expected = [item for item, _ in truth.most_common(10)]
+    assert [item for item, _ in merged.top(10)] == expected
+
+
+def test_space_saving_update_counts_matches_item_updates():
+    stream = zipf_stream(2)
+    chunked = SpaceSaving(capacity=100)
+    for start in range(0, len(stream), 5000):
+        chunked.update_counts(Counter(stream[start:start + 5000]).items())
+    truth = Counter(stream)
+
+    assert chunked.total == len(stream)
+    assert [item for item, _ in chunked.top(5)] == [item for item, _ in truth.most_common(5)]
+    assert SpaceSaving.from_dict(chunked.to_dict()).top() == chunked.top()
+
+
+def test_hyperloglog_merge_equals_single_sketch_and_is_accurate():
+    values = [f"user-{i}" for i in range(50000)]
+    halves = [HyperLogLog(error=0.02), HyperLogLog(error=0.02)]
+    # Overlapping halves: the union must not double count shared values
+    halves[0].update(values[:30000])
+    halves[1].update(values[20000:])
+    whole = HyperLogLog(error=0.02)
+    whole.update(values)
+
+    merged = halves[0].merge(halves[1])
+    assert np.array_equal(merged.registers, whole.registers)
+    assert abs(merged.count() - len(values)) <= 3 * merged.relative_error * len(values)
+
+
+def test_hyperloglog_small_counts_and_round_trip():
+    sketch = HyperLogLog()
+    sketch.update(["a", "b", "c", "a", None])
+    assert sketch.count() == 3
+    assert HyperLogLog.from_dict(sketch.to_dict()).count() == 3
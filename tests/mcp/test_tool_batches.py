@@ -0,0 +1,48 @@
+"""MCPHandler.handle_tool_calls_batch input handling and merging"""
+
+import asyncio
+
+import pytest
+
+import spotify_server
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.delenv('SPOTIFY_CLIENT_ID', raising=False)
+    monkeypatch.delenv('SPOTIFY_CLIENT_SECRET', raising=False)
+    return spotify_server.MCPHandler()
+
+
+def test_malformed_entries_fail_alone(handler):
+    calls = [
+        'health_check',
+        {'parameters': {}},
+        {'tool': 'health_check', 'parameters': ['not', 'an', 'object']},
+        {'tool': 'health_check', 'id': 'ok'},
+        {'name': 'health_check', 'arguments': {}, 'id': 'mcp-style'},
+    ]
+
+    results = asyncio.run(handler.handle_tool_calls_batch(calls))
+
+    assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+    assert [result['status'] for result in results[:3]] == ['error'] * 3
+    assert all('error' in result['result'] for result in results[:3])
+    assert results[3]['id'] == 'ok' and results[3]['result']['status'] != 'error'
+    assert results[4]['tool'] == 'health_check' and results[4]['merged']
+
+
+def test_side_effecting_calls_are_never_merged(handler):
+    created = []
+
+    async def create_playlist(**parameters):
+        created.append(parameters)
+        return {"status": "success"}
+
+    handler.spotify_server.create_playlist = create_playlist
+    call = {'tool': 'spotify_create_playlist', 'parameters': {'user_id': 'u', 'name': 'Mix', 'tracks': []}}
+
+    results = asyncio.run(handler.handle_tool_calls_batch([call, dict(call)]))
+
+    assert len(created) == 2
+    assert [result['merged'] for result in results] == [False, False]